@@ -1,38 +1,539 @@
 """ KTV POS System - Complete Application with Menu-Sale Integration ဗမာဘာသာဖြင့် ရေးသားထားသော KTV အရောင်းစနစ် """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, Response, stream_with_context, has_app_context, has_request_context, send_from_directory
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 import os
 import sqlite3
-from datetime import datetime, date, timedelta
+import queue
+import threading
+from datetime import datetime, date, timedelta, timezone
+import time
+import io
 import json
 import uuid
 from werkzeug.utils import secure_filename
 import hashlib
+import hmac
+import click
+import re
+import csv
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
+import atexit
+import gzip
+import mimetypes
+from urllib.parse import urljoin, urlparse
+from urllib.request import Request, urlopen
+from collections import OrderedDict
+from markupsafe import Markup, escape
+from jinja2 import FileSystemBytecodeCache
+from contextlib import contextmanager, ExitStack
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it uploads are stored as-is
+    Image = None
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:  # optional: asset bundles are then concatenated without minifying
+    rcssmin = rjsmin = None
+
+try:
+    import brotli
+except ImportError:  # optional: asset bundles then get .gz variants only
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no gunicorn either, so one process owns the metrics folder
+    fcntl = None
 
 app = Flask(__name__)
 app.secret_key = 'ktv_pos_system_secret_key_2026'
-app.config['DATABASE'] = 'ktv_pos.db'
+app.config['DATABASE'] = os.environ.get('KTV_POS_DATABASE', 'ktv_pos.db')
 app.config['UPLOAD_FOLDER'] = 'static/uploads/menu_images'
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB max file size
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+app.config['SHOP_TIMEZONE'] = timezone(timedelta(hours=6, minutes=30))  # Myanmar Time (no DST)
 
-# Ensure upload directory exists
+# Menu image variants (needs Pillow): content-hashed files served with immutable caching
+app.config['IMAGE_VARIANT_FOLDER'] = 'static/uploads/menu_images/variants'
+app.config['IMAGE_VARIANTS'] = {'thumb': 240, 'detail': 800}  # longest edge in pixels
+app.config['IMAGE_WEBP_QUALITY'] = 80
+
+# Compiled Jinja templates kept across restarts; defaults to '<DATABASE>-jinja'
+app.config['TEMPLATE_CACHE_DIR'] = None
+
+# Built CSS/JS bundles (flask build-assets), under the static folder
+app.config['ASSET_DIST_FOLDER'] = 'dist'
+
+# Ensure upload directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['IMAGE_VARIANT_FOLDER'], exist_ok=True)
 
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Database connection settings (applied once per pooled connection)
+app.config['DB_POOL_SIZE'] = 8
+app.config['DB_BUSY_TIMEOUT_MS'] = 5000
+app.config['DB_CACHE_SIZE_KB'] = 16 * 1024
+app.config['DB_MMAP_SIZE'] = 128 * 1024 * 1024
+
+# Live event stream settings
+app.config['EVENT_POLL_INTERVAL'] = 1.0  # seconds between change feed polls (wakes early on local writes)
+app.config['EVENT_KEEPALIVE'] = 5  # seconds between SSE keep-alive comments; a closed tab's slot frees on the next write
+app.config['EVENT_RETENTION'] = 3600  # seconds of change feed history kept for reconnecting clients
+# Each open stream holds a server thread; past this many per worker, pages poll /api/events/poll instead.
+# gunicorn.conf.py sizes its thread pool from the same KTV_POS_MAX_EVENT_STREAMS.
+app.config['MAX_EVENT_STREAMS'] = int(os.environ.get('KTV_POS_MAX_EVENT_STREAMS', 8))
+app.config['EVENT_STREAM_RETRY'] = 30  # seconds a refused page polls before trying a stream again
+
+# Logged-in users resolved per worker without touching the users table
+app.config['USER_CACHE_SIZE'] = 256
+app.config['USERS_VERSION_TTL'] = 5  # seconds a worker trusts its copy of the users version
+
+# Sale page cart autosave: queued edits per room are written at most once per interval
+app.config['ROOM_ORDER_FLUSH_INTERVAL'] = 0.5  # seconds
+app.config['ROOM_ORDER_FLUSH_RETRIES'] = 5  # failed writes put back before the edits are dropped
+
+# Dashboard counters are cached per worker; writes invalidate them, the TTL bounds anything else
+app.config['DASHBOARD_STATS_TTL'] = 5  # seconds
+
+# Request / SQL instrumentation
+app.config['SLOW_QUERY_MS'] = 100  # statements slower than this are logged with their route
+app.config['METRICS_FLUSH_INTERVAL'] = 1.0  # seconds between per-worker metric snapshots
+app.config['METRICS_DIR'] = None  # shared by all workers; defaults to '<DATABASE>-metrics'
+# /metrics and the /api/status totals need a login, or this bearer token (for a Prometheus scraper)
+app.config['METRICS_TOKEN'] = os.environ.get('KTV_POS_METRICS_TOKEN')
+
+# Streaming exports
+app.config['EXPORT_CHUNK_ROWS'] = 500  # rows fetched (and flushed to the client) per batch
+
+# Year-partitioned archive of old sales and stock ledger rows
+app.config['ARCHIVE_DIR'] = None  # one SQLite file per shop-local year; defaults to '<DATABASE>-archive'
+
+# ==================== INSTRUMENTATION ====================
+
+METRIC_TYPES = {
+    'ktv_http_requests_total': ('counter', 'HTTP requests by route, method and status'),
+    'ktv_http_request_duration_seconds': ('histogram', 'HTTP request latency by route'),
+    'ktv_sql_statements_total': ('counter', 'SQL statements executed, by route'),
+    'ktv_sql_duration_seconds_total': ('counter', 'Time spent executing SQL, by route'),
+    'ktv_sql_slow_statements_total': ('counter', 'Statements slower than SLOW_QUERY_MS, by route'),
+    'ktv_db_lock_waits_total': ('counter', 'BEGIN IMMEDIATE write-lock acquisitions'),
+    'ktv_db_lock_wait_seconds_total': ('counter', 'Time spent waiting for the write lock in BEGIN IMMEDIATE'),
+    'ktv_db_busy_errors_total': ('counter', 'Statements that failed with database is locked'),
+    'ktv_event_streams_refused_total': ('counter', '/api/events requests refused because MAX_EVENT_STREAMS were open'),
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Metrics:
+    """Per-worker counters and histograms, snapshotted to a shared folder so any worker can serve the total"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._token = f"{self._pid}-{int(time.time() * 1000)}"
+        self._counters = {}
+        self._histograms = {}
+        self._flushed_at = 0
+
+    def _check_fork(self):
+        # A forked worker starts from zero under its own snapshot file
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def inc(self, name, labels=(), value=1):
+        self._check_fork()
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        self._check_fork()
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(LATENCY_BUCKETS) + [0, 0]  # buckets, sum, count
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), values[:]] for (name, labels), values in self._histograms.items()]
+            }
+
+    def folder(self):
+        return app.config['METRICS_DIR'] or app.config['DATABASE'] + '-metrics'
+
+    def flush(self, force=False):
+        """Write this worker's snapshot at most once per METRICS_FLUSH_INTERVAL"""
+        self._check_fork()
+        now = time.monotonic()
+        if not force and now - self._flushed_at < app.config['METRICS_FLUSH_INTERVAL']:
+            return
+        self._flushed_at = now
+        snapshot = self.snapshot()
+        if not snapshot['counters'] and not snapshot['histograms']:
+            return  # CLI commands and idle workers leave no file behind
+        folder = self.folder()
+        os.makedirs(folder, exist_ok=True)
+        self._write(os.path.join(folder, f"worker-{self._token}.json"), snapshot)
+
+    def close(self):
+        """At exit: fold this worker's totals into retired.json and drop its snapshot file"""
+        self.flush(force=True)
+        folder = self.folder()
+        if os.path.isdir(folder):
+            self._retire(folder, f"worker-{self._token}.json")
+
+    @staticmethod
+    def _write(path, snapshot):
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _merge(path, counters, histograms):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, labels, value in data['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in data['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+
+    @staticmethod
+    def _worker_alive(filename):
+        """Whether the process that wrote worker-<pid>-<ms>.json still runs (assumed so off POSIX)"""
+        if fcntl is None:
+            return True
+        try:
+            os.kill(int(filename.split('-')[1]), 0)
+        except ProcessLookupError:
+            return False
+        except (ValueError, IndexError, OSError):
+            return True
+        return True
+
+    @contextmanager
+    def _folder_lock(self, folder):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(folder, 'retired.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _retire(self, folder, filename):
+        """Add a finished worker's snapshot to retired.json so the folder holds one file per live worker"""
+        path = os.path.join(folder, filename)
+        claimed = f"{path}.retiring-{os.getpid()}"
+        try:
+            os.rename(path, claimed)  # only one worker wins a dead snapshot
+        except FileNotFoundError:
+            return
+        with self._folder_lock(folder):
+            retired = os.path.join(folder, 'retired.json')
+            counters = {}
+            histograms = {}
+            self._merge(retired, counters, histograms)
+            self._merge(claimed, counters, histograms)
+            self._write(retired, {
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [[name, list(labels), values] for (name, labels), values in histograms.items()]
+            })
+        os.remove(claimed)
+
+    def collect(self):
+        """Sum retired totals and every live worker's latest snapshot (this worker's live values replace its own file)
+
+        Snapshots left by workers that died without retiring (SIGKILL, OOM) are folded into
+        retired.json here, so totals never go backwards and the folder does not grow.
+        """
+        self.flush(force=True)
+        counters = {}
+        histograms = {}
+        folder = self.folder()
+        if not os.path.isdir(folder):
+            return counters, histograms
+        own = f"worker-{self._token}.json"
+        for filename in os.listdir(folder):
+            if not (filename.startswith('worker-') and filename.endswith('.json')):
+                continue
+            if filename != own and not self._worker_alive(filename):
+                self._retire(folder, filename)
+                continue
+            self._merge(os.path.join(folder, filename), counters, histograms)
+        self._merge(os.path.join(folder, 'retired.json'), counters, histograms)
+        return counters, histograms
+
+    def render(self):
+        """Prometheus text exposition format"""
+        counters, histograms = self.collect()
+        by_name = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), values in histograms.items():
+            by_name.setdefault(name, []).append((labels, values))
+        
+        lines = []
+        for name in sorted(by_name):
+            kind, description = METRIC_TYPES.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name], key=lambda series: series[0]):
+                if kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, value):  # bucket counts are stored cumulative
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+metrics = Metrics()
+atexit.register(metrics.close)
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+def normalize_sql(sql):
+    """Collapse whitespace and literals so the same statement shape logs and groups as one query"""
+    sql = _SQL_LITERALS.sub('?', ' '.join(sql.split()))
+    return _SQL_PLACEHOLDER_LISTS.sub('(?, ...)', sql)
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'none'
+
+def record_sql(sql, seconds, failed=None):
+    """Account one statement to the current request and the worker metrics"""
+    route = current_route()
+    labels = (('route', route),)
+    metrics.inc('ktv_sql_statements_total', labels)
+    metrics.inc('ktv_sql_duration_seconds_total', labels, seconds)
+    if has_app_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0) + seconds
+    
+    head = sql.lstrip()[:20].upper()
+    if head.startswith('BEGIN IMMEDIATE') or head.startswith('BEGIN EXCLUSIVE'):
+        metrics.inc('ktv_db_lock_waits_total')
+        metrics.inc('ktv_db_lock_wait_seconds_total', (), seconds)
+    if isinstance(failed, sqlite3.OperationalError) and 'locked' in str(failed):
+        metrics.inc('ktv_db_busy_errors_total')
+    
+    if seconds * 1000 >= app.config['SLOW_QUERY_MS']:
+        metrics.inc('ktv_sql_slow_statements_total', labels)
+        app.logger.warning("Slow query %.1f ms on %s: %s", seconds * 1000, route, normalize_sql(sql))
+
+class TracingCursor(sqlite3.Cursor):
+    """Cursor that times every statement for the request and worker metrics"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        failed = None
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error as e:
+            failed = e
+            raise
+        finally:
+            record_sql(sql, time.perf_counter() - started, failed)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        failed = None
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error as e:
+            failed = e
+            raise
+        finally:
+            record_sql(sql, time.perf_counter() - started, failed)
+
+class TracingConnection(sqlite3.Connection):
+    """Connection whose cursors (and conn.execute shortcuts) are TracingCursors; commits are timed too"""
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        failed = None
+        try:
+            return super().commit()
+        except sqlite3.Error as e:
+            failed = e
+            raise
+        finally:
+            record_sql('COMMIT', time.perf_counter() - started, failed)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Route latency histogram and SQL totals; Server-Timing shows them per response"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = current_route()
+    metrics.inc('ktv_http_requests_total', (('route', route), ('method', request.method), ('status', str(response.status_code))))
+    metrics.observe('ktv_http_request_duration_seconds', (('route', route),), elapsed)
+    response.headers['Server-Timing'] = (
+        f'app;dur={elapsed * 1000:.1f}, '
+        f'sql;dur={g.get("sql_seconds", 0) * 1000:.1f};desc="{g.get("sql_statements", 0)} statements"'
+    )
+    metrics.flush()
+    return response
+
 # Database functions
+class ConnectionPool:
+    """Bounded per-worker pool of pre-configured SQLite connections"""
+
+    def __init__(self, database, size):
+        self.database = database
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _configure(self, conn):
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout = {int(app.config['DB_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA cache_size = -{int(app.config['DB_CACHE_SIZE_KB'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(app.config['DB_MMAP_SIZE'])}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.close()
+        return conn
+
+    def connect(self):
+        """Open a new configured connection (not tracked by the pool)"""
+        conn = sqlite3.connect(
+            self.database,
+            timeout=app.config['DB_BUSY_TIMEOUT_MS'] / 1000,
+            check_same_thread=False,
+            factory=TracingConnection
+        )
+        return self._configure(conn)
+
+    def _check_fork(self):
+        # Connections must never cross a fork (gunicorn preload); drop inherited ones
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue(maxsize=self.size)
+                    self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn, discard=False):
+        self._check_fork()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            discard = True
+        if not discard:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_db_pool = None
+
+def get_pool():
+    global _db_pool
+    if _db_pool is None or _db_pool.database != app.config['DATABASE']:
+        if _db_pool is not None:
+            _db_pool.close_all()
+        _db_pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'])
+    return _db_pool
+
 def get_db():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Return the connection bound to the current app context"""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception=None):
+    """Return the context's connection to the pool, rolling back unfinished work"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn, discard=isinstance(exception, sqlite3.DatabaseError))
+    if g.pop('change_events_emitted', False):
+        invalidate_dashboard_stats()
+        change_feed.notify()
 
 def init_db():
-    conn = get_db()
+    conn = get_pool().connect()
     cursor = conn.cursor()
     
     # Users table
@@ -200,11 +701,11 @@ def init_db():
     
     cursor.execute("SELECT COUNT(*) FROM categories")
     if cursor.fetchone()[0] == 0:
-        for i, (name, display_name, icon_class, color_code) in enumerate(categories):
-            cursor.execute(
-                "INSERT INTO categories (name, display_name, icon_class, color_code, sort_order) VALUES (?, ?, ?, ?, ?)",
-                (name, display_name, icon_class, color_code, i)
-            )
+        cursor.executemany(
+            "INSERT INTO categories (name, display_name, icon_class, color_code, sort_order) VALUES (?, ?, ?, ?, ?)",
+            [(name, display_name, icon_class, color_code, i)
+             for i, (name, display_name, icon_class, color_code) in enumerate(categories)]
+        )
     
     # Insert sample menu items
     cursor.execute("SELECT COUNT(*) FROM menu_items")
@@ -229,16 +730,14 @@ def init_db():
             ('ဟိုတယ်အခန်း', 'room', 20000, 0, 5, 'active', 'ခု')
         ]
         
-        for name, category_name, sale_price, cost_price, stock, status, unit in sample_items:
-            cursor.execute("SELECT id FROM categories WHERE name = ?", (category_name,))
-            category_result = cursor.fetchone()
-            
-            if category_result:
-                category_id = category_result[0]
-                cursor.execute(
-                    """INSERT INTO menu_items (name, category_id, sale_price, cost_price, stock, min_stock, unit, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (name, category_id, sale_price, cost_price, stock, 5, unit, status)
-                )
+        cursor.execute("SELECT name, id FROM categories")
+        category_ids = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.executemany(
+            """INSERT INTO menu_items (name, category_id, sale_price, cost_price, stock, min_stock, unit, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(name, category_ids[category_name], sale_price, cost_price, stock, 5, unit, status)
+             for name, category_name, sale_price, cost_price, stock, status, unit in sample_items
+             if category_name in category_ids]
+        )
     
     # Insert sample rooms
     cursor.execute("SELECT COUNT(*) FROM rooms")
@@ -261,8 +760,555 @@ def init_db():
             )
     
     conn.commit()
+    run_migrations(conn)
     conn.close()
 
+# ==================== SCHEMA MIGRATIONS ====================
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register an ordered schema migration step"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def get_schema_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def run_migrations(conn):
+    """Apply every pending migration, each in its own transaction"""
+    current = get_schema_version(conn)
+    conn.commit()
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another worker may have migrated while we waited for the lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            func(conn.cursor())
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
+
+@migration(1, 'Hot-path indexes for room orders, sales and sale items')
+def _migration_hot_path_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_room_orders_room_status ON room_orders (room_id, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items (sale_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_menu_item ON sale_items (menu_item_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_room ON sales (room_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_date_time ON sales (sale_date, sale_time)")
+
+@migration(2, 'Indexes for menu listing, room status and stock ledger')
+def _migration_menu_room_stock_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_items_status_category ON menu_items (status, category_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_items_category ON menu_items (category_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_transactions_item_date ON stock_transactions (menu_item_id, transaction_date)")
+
+@migration(3, 'Sortable sold_at timestamp on sales')
+def _migration_sales_sold_at(cursor):
+    cursor.execute("ALTER TABLE sales ADD COLUMN sold_at INTEGER")
+    # Legacy sale_date/sale_time were written with CURRENT_DATE/CURRENT_TIME, i.e. UTC
+    cursor.execute("""
+        UPDATE sales SET sold_at = CAST(strftime('%s', sale_date || ' ' || COALESCE(sale_time, '00:00:00')) AS INTEGER)
+        WHERE sold_at IS NULL
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_sold_at ON sales (sold_at)")
+    cursor.execute("DROP INDEX IF EXISTS idx_sales_date_time")
+
+@migration(4, 'Sale line cost snapshot and daily sales rollup tables')
+def _migration_sales_rollups(cursor):
+    cursor.execute("ALTER TABLE sale_items ADD COLUMN unit_cost INTEGER DEFAULT 0")
+    cursor.execute("""
+        UPDATE sale_items SET unit_cost = COALESCE(
+            (SELECT cost_price FROM menu_items WHERE menu_items.id = sale_items.menu_item_id), 0)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_sales_summary (
+            sale_day TEXT PRIMARY KEY, -- shop-local YYYY-MM-DD
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            subtotal INTEGER NOT NULL DEFAULT 0,
+            tax_amount INTEGER NOT NULL DEFAULT 0,
+            service_charge INTEGER NOT NULL DEFAULT 0,
+            discount INTEGER NOT NULL DEFAULT 0,
+            total_amount INTEGER NOT NULL DEFAULT 0,
+            customer_count INTEGER NOT NULL DEFAULT 0,
+            cost_amount INTEGER NOT NULL DEFAULT 0,
+            max_bill INTEGER NOT NULL DEFAULT 0,
+            room_sessions INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_item_sales (
+            sale_day TEXT NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            item_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            sales_amount INTEGER NOT NULL DEFAULT 0,
+            cost_amount INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (sale_day, menu_item_id)
+        )
+    """)
+    rebuild_sales_rollups(cursor)
+
+@migration(5, 'Normalized room_order_items replacing the order_data JSON blob')
+def _migration_room_order_items(cursor):
+    cursor.execute("ALTER TABLE room_orders ADD COLUMN apply_tax INTEGER DEFAULT 1")
+    cursor.execute("ALTER TABLE room_orders ADD COLUMN apply_service INTEGER DEFAULT 1")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS room_order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_order_id INTEGER NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            item_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (room_order_id, menu_item_id),
+            FOREIGN KEY (room_order_id) REFERENCES room_orders (id),
+            FOREIGN KEY (menu_item_id) REFERENCES menu_items (id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_room_order_items_menu_item ON room_order_items (menu_item_id)")
+    
+    cursor.execute("SELECT id, order_data FROM room_orders WHERE status = 'pending'")
+    for order_id, order_data in cursor.fetchall():
+        try:
+            blob_items = json.loads(order_data or '[]')
+        except ValueError:
+            blob_items = []
+        rows = {}
+        for item in blob_items if isinstance(blob_items, list) else []:
+            try:
+                item_id = int(item['id'])
+                quantity = int(item.get('quantity', 1))
+                price = int(item.get('price', 0))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if quantity <= 0:
+                continue
+            if item_id in rows:
+                rows[item_id][3] += quantity
+            else:
+                rows[item_id] = [order_id, item_id, item.get('name') or 'Unknown', quantity, price]
+        cursor.executemany("""
+            INSERT INTO room_order_items (room_order_id, menu_item_id, item_name, quantity, unit_price)
+            VALUES (?, ?, ?, ?, ?)
+        """, [tuple(row) for row in rows.values()])
+        cursor.execute("UPDATE room_orders SET order_data = '[]' WHERE id = ?", (order_id,))
+
+@migration(6, 'Menu catalog and stock version counters')
+def _migration_data_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.executemany("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 1)", [('menu',), ('stock',)])
+    cursor.execute("ALTER TABLE menu_items ADD COLUMN stock_version INTEGER DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_items_stock_version ON menu_items (stock_version)")
+
+@migration(7, 'Change feed for live room and stock events')
+def _migration_change_events(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL, -- room_status, room_order, stock, menu
+            payload TEXT NOT NULL, -- JSON
+            created_at INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_events_created ON change_events (created_at)")
+
+@migration(9, 'Users version counter for cached logins')
+def _migration_users_version(cursor):
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('users', 1)")
+
+@migration(10, 'Stock ledger index by transaction date for exports')
+def _migration_stock_ledger_date_index(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_transactions_date ON stock_transactions (transaction_date)")
+
+@migration(11, 'Stock snapshots for point-in-time inventory and reconciliation')
+def _migration_stock_snapshots(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            taken_at TIMESTAMP NOT NULL, -- UTC, same format as stock_transactions.transaction_date
+            last_transaction_id INTEGER NOT NULL, -- ledger rows up to this id are included
+            item_count INTEGER DEFAULT 0,
+            total_value INTEGER DEFAULT 0,
+            drift_items INTEGER DEFAULT 0,
+            note TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_snapshots_taken ON stock_snapshots (taken_at)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+            snapshot_id INTEGER NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            stock INTEGER NOT NULL, -- menu_items.stock when the snapshot was taken
+            expected_stock INTEGER, -- previous snapshot + ledger (NULL for the first snapshot)
+            unit_cost INTEGER DEFAULT 0,
+            PRIMARY KEY (snapshot_id, menu_item_id),
+            FOREIGN KEY (snapshot_id) REFERENCES stock_snapshots (id)
+        )
+    """)
+
+@migration(8, 'Resized menu image variants')
+def _migration_image_variants(cursor):
+    cursor.execute("ALTER TABLE menu_items ADD COLUMN image_variants TEXT")  # JSON: {variant: {webp, png, width, height}}
+
+@migration(12, 'Year-partitioned archive of old sales and stock ledger')
+def _migration_archive_partitions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            year INTEGER PRIMARY KEY, -- shop-local calendar year, stored in ARCHIVE_DIR/sales_<year>.db
+            sales_count INTEGER DEFAULT 0,
+            sale_item_count INTEGER DEFAULT 0,
+            ledger_count INTEGER DEFAULT 0,
+            archived_before INTEGER NOT NULL, -- epoch cutoff of the run that last moved rows into this year
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+@migration(13, 'Purchase receipt headers for batch stock receiving')
+def _migration_stock_receipts(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_receipts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            supplier TEXT,
+            reference TEXT, -- supplier invoice / delivery note number
+            notes TEXT,
+            line_count INTEGER DEFAULT 0,
+            total_cost INTEGER DEFAULT 0,
+            staff_id INTEGER,
+            received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (staff_id) REFERENCES users (id)
+        )
+    """)
+
+@migration(15, 'Covering indexes for keyset-paginated sales history')
+def _migration_sales_history_indexes(cursor):
+    # id right after sold_at lets (sold_at, id) keyset pages walk the index without a sort; the
+    # trailing columns are the history filters, checked in the index before any table row is read
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sales_history
+        ON sales (sold_at, id, payment_status, payment_method, total_amount, room_id, staff_id, bill_number)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_room_sold_at ON sales (room_id, sold_at)")
+    cursor.execute("DROP INDEX IF EXISTS idx_sales_sold_at")
+    cursor.execute("DROP INDEX IF EXISTS idx_sales_room")
+
+@migration(16, 'Trigram full-text index over menu item names for search')
+def _migration_menu_search(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_items_name ON menu_items (name)")
+    try:
+        # trigram matches any substring, so Myanmar names (no word breaks) search like English ones
+        cursor.execute("CREATE VIRTUAL TABLE menu_items_fts USING fts5(name, description, tokenize = 'trigram')")
+    except sqlite3.OperationalError:
+        # SQLite older than 3.34 / without FTS5: menu search falls back to LIKE
+        return
+    cursor.execute("""
+        INSERT INTO menu_items_fts (rowid, name, description)
+        SELECT id, name, COALESCE(description, '') FROM menu_items
+    """)
+    cursor.execute("""
+        CREATE TRIGGER menu_items_fts_insert AFTER INSERT ON menu_items BEGIN
+            INSERT INTO menu_items_fts (rowid, name, description) VALUES (new.id, new.name, COALESCE(new.description, ''));
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER menu_items_fts_update AFTER UPDATE OF id, name, description ON menu_items BEGIN
+            DELETE FROM menu_items_fts WHERE rowid = old.id;
+            INSERT INTO menu_items_fts (rowid, name, description) VALUES (new.id, new.name, COALESCE(new.description, ''));
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER menu_items_fts_delete AFTER DELETE ON menu_items BEGIN
+            DELETE FROM menu_items_fts WHERE rowid = old.id;
+        END
+    """)
+
+@migration(17, 'Bump the users version counter from triggers on any users write')
+def _migration_users_version_triggers(cursor):
+    # Role changes and deletes made outside the app (sqlite3 shell, scripts) must log sessions out too
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS users_version_{event.lower()} AFTER {event} ON users BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'users';
+            END
+        """)
+
+@migration(18, 'Sale page edit batches applied to each pending room order')
+def _migration_room_order_edits(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS room_order_edits (
+            room_order_id INTEGER NOT NULL,
+            client_id TEXT NOT NULL,
+            client_seq INTEGER NOT NULL,
+            PRIMARY KEY (room_order_id, client_id, client_seq)
+        )
+    """)
+    # Replaces rooms.order_seq, a wall-clock cart counter that a retired migration 14 added;
+    # SQLite before 3.35 cannot drop columns, and nothing reads it any more
+    columns = {row['name'] for row in cursor.execute("PRAGMA table_info(rooms)").fetchall()}
+    if 'order_seq' in columns and sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute("ALTER TABLE rooms DROP COLUMN order_seq")
+
+@migration(19, 'Keyset indexes for menu search sorted by stock and by price')
+def _migration_menu_sort_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_items_stock_id ON menu_items (stock, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_items_price_id ON menu_items (sale_price, id)")
+
+@migration(20, 'Customer count and notes saved with each pending room order')
+def _migration_room_order_details(cursor):
+    cursor.execute("ALTER TABLE room_orders ADD COLUMN customer_count INTEGER DEFAULT 1")
+    cursor.execute("ALTER TABLE room_orders ADD COLUMN notes TEXT")
+
+# Hot queries whose plans must stay index-driven:
+# (name, sql, params, tables that may be walked in index order, e.g. ORDER BY ... LIMIT)
+HOT_QUERIES = [
+    ('pending_room_order',
+     "SELECT * FROM room_orders WHERE room_id = ? AND status = 'pending'", (1,), ()),
+    ('item_sale_count',
+     "SELECT COUNT(*) FROM sale_items WHERE menu_item_id = ?", (1,), ()),
+    ('room_sales_count',
+     "SELECT COUNT(*) FROM sales WHERE room_id = ?", (1,), ()),
+    ('daily_report_sales',
+     "SELECT id FROM sales WHERE sold_at >= ? AND sold_at < ? ORDER BY sold_at, id", (0, 86400), ()),
+    ('monthly_rollup',
+     "SELECT * FROM daily_sales_summary WHERE sale_day >= ? AND sale_day < ?", ('2026-01-01', '2026-02-01'), ()),
+    ('pending_orders_with_item',
+     """SELECT ro.id FROM room_order_items roi
+        JOIN room_orders ro ON ro.id = roi.room_order_id
+        WHERE roi.menu_item_id = ? AND ro.status = 'pending'""", (1,), ()),
+    ('room_order_lines',
+     "SELECT * FROM room_order_items WHERE room_order_id = ? ORDER BY id", (1,), ()),
+    ('stock_delta',
+     "SELECT id, stock FROM menu_items WHERE stock_version > ?", (1,), ()),
+    ('change_feed',
+     "SELECT id, event_type, payload FROM change_events WHERE id > ? ORDER BY id LIMIT 200", (1,), ()),
+    ('sale_line_items',
+     "SELECT * FROM sale_items WHERE sale_id = ?", (1,), ()),
+    ('active_menu_items',
+     """SELECT mi.id, mi.name FROM menu_items mi
+        LEFT JOIN categories c ON mi.category_id = c.id
+        WHERE mi.status = 'active' ORDER BY c.sort_order, mi.name""", (), ()),
+    ('category_item_count',
+     "SELECT COUNT(*) FROM menu_items WHERE category_id = ?", (1,), ()),
+    ('occupied_rooms',
+     "SELECT COUNT(*) FROM rooms WHERE status = 'occupied'", (), ()),
+    ('today_sales',
+     "SELECT COALESCE(SUM(total_amount), 0) FROM sales WHERE sold_at >= ? AND sold_at < ?", (0, 86400), ()),
+    ('stock_ledger_tail',
+     "SELECT menu_item_id, SUM(quantity) FROM stock_transactions WHERE id > ? GROUP BY menu_item_id", (1,), ('stock_transactions',)),
+    ('stock_snapshot_lines',
+     "SELECT * FROM stock_snapshot_items WHERE snapshot_id = ? AND menu_item_id = ?", (1, 1), ()),
+    ('stock_ledger_range',
+     "SELECT id FROM stock_transactions WHERE transaction_date >= ? AND transaction_date < ? ORDER BY transaction_date, id",
+     ('2026-01-01', '2026-02-01'), ()),
+    ('recent_sales',
+     """SELECT s.*, r.room_name, u.full_name as staff_name FROM sales s
+        LEFT JOIN rooms r ON s.room_id = r.id
+        LEFT JOIN users u ON s.staff_id = u.id
+        ORDER BY s.sold_at DESC, s.id DESC LIMIT 10""", (), ('s',)),
+    ('sales_history_page',
+     """SELECT id FROM sales WHERE sold_at >= ? AND sold_at < ? AND sold_at <= ? AND (sold_at < ? OR id < ?)
+        AND payment_status = ? ORDER BY sold_at DESC, id DESC LIMIT 51""", (0, 86400, 100, 100, 1, 'paid'), ()),
+    ('room_sales_history_page',
+     "SELECT id FROM sales WHERE room_id = ? ORDER BY sold_at DESC, id DESC LIMIT 51", (1,), ()),
+    ('menu_search_page',
+     "SELECT id FROM menu_items WHERE (name, id) > (?, ?) ORDER BY name, id LIMIT 51", ('', 0), ()),
+    ('menu_search_by_stock',
+     "SELECT id FROM menu_items WHERE (stock, id) > (?, ?) ORDER BY stock, id LIMIT 51", (0, 0), ()),
+    ('menu_search_by_price',
+     "SELECT id FROM menu_items WHERE (sale_price, id) > (?, ?) ORDER BY sale_price, id LIMIT 51", (0, 0), ()),
+]
+
+def check_query_plans(conn):
+    """Return (name, plan detail) for every hot query that regressed to a table SCAN"""
+    regressions = []
+    for name, sql, params, ordered_scans in HOT_QUERIES:
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[3]
+            if not detail.startswith('SCAN '):
+                continue
+            if detail.split()[1] in ordered_scans and ' INDEX ' in detail:
+                continue
+            regressions.append((name, detail))
+    return regressions
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations to the configured database"""
+    if not os.path.exists(app.config['DATABASE']):
+        init_db()
+    conn = get_pool().connect()
+    try:
+        applied = run_migrations(conn)
+        for version, description in applied:
+            print(f"✅ Migration {version}: {description}")
+        print(f"Schema version: {get_schema_version(conn)}")
+    finally:
+        conn.close()
+
+@app.cli.command('rebuild-rollups')
+@click.option('--start', 'start_day', default=None, help='First shop-local day (YYYY-MM-DD)')
+@click.option('--end', 'end_day', default=None, help='Last shop-local day (YYYY-MM-DD)')
+def rebuild_rollups_command(start_day, end_day):
+    """Recompute daily sales rollups from raw sales"""
+    start_day = datetime.strptime(start_day, '%Y-%m-%d').date() if start_day else None
+    end_day = datetime.strptime(end_day, '%Y-%m-%d').date() if end_day else None
+    conn = get_pool().connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_sales_rollups(conn.cursor(), start_day, end_day)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"✅ Rollups rebuilt for {start_day or 'beginning'} .. {end_day or 'today'}")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any registered hot query is planned as a full table scan"""
+    conn = get_pool().connect()
+    try:
+        regressions = check_query_plans(conn)
+    finally:
+        conn.close()
+    for name, detail in regressions:
+        print(f"❌ {name}: {detail}")
+    if regressions:
+        raise SystemExit(1)
+    print(f"✅ {len(HOT_QUERIES)} hot queries use indexes")
+
+# ==================== SHOP TIME HELPERS ====================
+
+def shop_now():
+    """Current time in the shop's local timezone"""
+    return datetime.now(app.config['SHOP_TIMEZONE'])
+
+def shop_day_bounds(start_day, end_day=None):
+    """Half-open epoch range [start, end) covering local days start_day..end_day inclusive"""
+    tz = app.config['SHOP_TIMEZONE']
+    end_day = end_day or start_day
+    start = datetime.combine(start_day, datetime.min.time(), tzinfo=tz)
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    return int(start.timestamp()), int(end.timestamp())
+
+def today_bounds():
+    return shop_day_bounds(shop_now().date())
+
+def shop_utc_offset_seconds():
+    return int(app.config['SHOP_TIMEZONE'].utcoffset(None).total_seconds())
+
+# ==================== SALES ROLLUPS ====================
+
+def record_sale_rollup(cursor, sale_day, sale, line_items):
+    """Add one checked-out sale to the daily rollups (call inside the checkout transaction)
+
+    sale: dict with subtotal, tax, service_charge, discount, total, customer_count, room_id
+    line_items: iterable of (menu_item_id, item_name, quantity, total_price, cost_amount)
+    """
+    line_items = list(line_items)
+    cost = sum(line[4] for line in line_items)
+    cursor.execute("""
+        INSERT INTO daily_sales_summary (sale_day, sales_count, subtotal, tax_amount, service_charge,
+                                         discount, total_amount, customer_count, cost_amount, max_bill, room_sessions)
+        VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sale_day) DO UPDATE SET
+            sales_count = sales_count + 1,
+            subtotal = subtotal + excluded.subtotal,
+            tax_amount = tax_amount + excluded.tax_amount,
+            service_charge = service_charge + excluded.service_charge,
+            discount = discount + excluded.discount,
+            total_amount = total_amount + excluded.total_amount,
+            customer_count = customer_count + excluded.customer_count,
+            cost_amount = cost_amount + excluded.cost_amount,
+            max_bill = MAX(max_bill, excluded.max_bill),
+            room_sessions = room_sessions + excluded.room_sessions
+    """, (
+        sale_day, sale['subtotal'], sale['tax'], sale['service_charge'], sale.get('discount', 0),
+        sale['total'], sale['customer_count'], cost, sale['total'], 1 if sale.get('room_id') else 0
+    ))
+    cursor.executemany("""
+        INSERT INTO daily_item_sales (sale_day, menu_item_id, item_name, quantity, sales_amount, cost_amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sale_day, menu_item_id) DO UPDATE SET
+            item_name = excluded.item_name,
+            quantity = quantity + excluded.quantity,
+            sales_amount = sales_amount + excluded.sales_amount,
+            cost_amount = cost_amount + excluded.cost_amount
+    """, [(sale_day,) + tuple(line) for line in line_items])
+
+def rebuild_sales_rollups(cursor, start_day=None, end_day=None):
+    """Recompute the daily rollups from raw sales for local days start_day..end_day (all history if omitted)"""
+    offset = shop_utc_offset_seconds()
+    if start_day or end_day:
+        start, _ = shop_day_bounds(start_day or date(1970, 1, 2))
+        _, end = shop_day_bounds(end_day or shop_now().date())
+        day_from = datetime.fromtimestamp(start, app.config['SHOP_TIMEZONE']).strftime('%Y-%m-%d')
+        day_to = datetime.fromtimestamp(end, app.config['SHOP_TIMEZONE']).strftime('%Y-%m-%d')
+    else:
+        start, end = -2 ** 62, 2 ** 62
+        day_from, day_to = '0000-00-00', '9999-99-99'
+    boundary = archive_boundary(cursor) if get_schema_version(cursor.connection) >= 12 else 0  # rollups predate archiving
+    if start < boundary:
+        # Archived days keep their rollups: their raw sales no longer live in this database
+        start = boundary
+        day_from = datetime.fromtimestamp(boundary, app.config['SHOP_TIMEZONE']).strftime('%Y-%m-%d')
+    
+    cursor.execute("DELETE FROM daily_sales_summary WHERE sale_day >= ? AND sale_day < ?", (day_from, day_to))
+    cursor.execute("DELETE FROM daily_item_sales WHERE sale_day >= ? AND sale_day < ?", (day_from, day_to))
+    
+    cursor.execute("""
+        INSERT INTO daily_sales_summary (sale_day, sales_count, subtotal, tax_amount, service_charge,
+                                         discount, total_amount, customer_count, cost_amount, max_bill, room_sessions)
+        SELECT DATE(s.sold_at + ?, 'unixepoch') AS sale_day,
+               COUNT(*), SUM(s.subtotal), SUM(COALESCE(s.tax_amount, 0)), SUM(COALESCE(s.service_charge, 0)),
+               SUM(COALESCE(s.discount, 0)), SUM(s.total_amount), SUM(COALESCE(s.customer_count, 0)),
+               SUM(COALESCE((SELECT SUM(si.quantity * si.unit_cost) FROM sale_items si WHERE si.sale_id = s.id), 0)),
+               MAX(s.total_amount), SUM(s.room_id IS NOT NULL)
+        FROM sales s
+        WHERE s.sold_at >= ? AND s.sold_at < ?
+        GROUP BY sale_day
+    """, (offset, start, end))
+    
+    cursor.execute("""
+        INSERT INTO daily_item_sales (sale_day, menu_item_id, item_name, quantity, sales_amount, cost_amount)
+        SELECT DATE(s.sold_at + ?, 'unixepoch') AS sale_day, si.menu_item_id, MAX(si.item_name),
+               SUM(si.quantity), SUM(si.total_price), SUM(si.quantity * si.unit_cost)
+        FROM sales s
+        JOIN sale_items si ON si.sale_id = s.id
+        WHERE s.sold_at >= ? AND s.sold_at < ? AND si.menu_item_id IS NOT NULL
+        GROUP BY sale_day, si.menu_item_id
+    """, (offset, start, end))
+
 # User class for Flask-Login
 class User(UserMixin):
     def __init__(self, user_dict):
@@ -271,20 +1317,197 @@ class User(UserMixin):
         self.full_name = user_dict['full_name']
         self.role = user_dict['role']
 
+_user_cache = OrderedDict()  # user id -> (users version, User or None)
+_user_cache_lock = threading.Lock()
+_users_version = (None, 0.0)  # (users version, monotonic expiry), swapped as one tuple
+
+def current_users_version():
+    """users version counter, re-read at most once per USERS_VERSION_TTL per worker
+
+    The users triggers bump the counter on every write, including ones made outside the app,
+    so a changed role or deleted user stops matching sessions and cache entries within the TTL.
+    """
+    global _users_version
+    version, expires = _users_version
+    if version is None or expires <= time.monotonic():
+        version = get_data_version(get_db().cursor(), 'users')
+        _users_version = (version, time.monotonic() + app.config['USERS_VERSION_TTL'])
+    return version
+
 @login_manager.user_loader
 def load_user(user_id):
+    """Rebuild the user from the signed session, falling back to the per-worker cache, then the DB"""
+    user_id = int(user_id)
+    version = current_users_version()
+    
+    if session.get('user_id') == user_id and session.get('users_version') == version:
+        return User({
+            'id': user_id,
+            'username': session['username'],
+            'full_name': session['full_name'],
+            'role': session['role']
+        })
+    
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] == version:
+            _user_cache.move_to_end(user_id)
+            return cached[1]
+    
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    if user:
-        return User(dict(user))
-    return None
+    cursor.execute("SELECT id, username, full_name, role FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    user = User(dict(row)) if row else None
+    
+    with _user_cache_lock:
+        _user_cache[user_id] = (version, user)
+        _user_cache.move_to_end(user_id)
+        while len(_user_cache) > app.config['USER_CACHE_SIZE']:
+            _user_cache.popitem(last=False)
+    return user
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+# ==================== MENU IMAGES ====================
+
+def static_relative_path(path):
+    """Filesystem path under static/ -> the path stored in menu_items.image_path"""
+    return os.path.relpath(path, 'static').replace(os.sep, '/')
+
+def save_image_variants(data):
+    """Write thumb/detail WebP + PNG variants of an uploaded image, named by its content hash
+
+    Returns {variant: {'webp', 'png', 'width', 'height'}} with paths relative to static/.
+    Files that already exist (same source bytes, same size) are reused, not re-encoded.
+    Raises ValueError if the data is not a readable image.
+    """
+    if Image is None:
+        raise RuntimeError('Pillow is not installed')
+    
+    try:
+        source = Image.open(io.BytesIO(data))
+        source.load()
+    except Exception as e:
+        raise ValueError('Not a valid image file') from e
+    
+    source = ImageOps.exif_transpose(source)
+    source = source.convert('RGBA' if 'A' in source.getbands() or 'transparency' in source.info else 'RGB')
+    
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    folder = app.config['IMAGE_VARIANT_FOLDER']
+    variants = {}
+    for name, size in app.config['IMAGE_VARIANTS'].items():
+        image = source.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        
+        webp_path = os.path.join(folder, f"{digest}-{size}.webp")
+        png_path = os.path.join(folder, f"{digest}-{size}.png")
+        if not os.path.exists(webp_path):
+            image.save(webp_path + '.tmp', 'WEBP', quality=app.config['IMAGE_WEBP_QUALITY'])
+            os.replace(webp_path + '.tmp', webp_path)
+        if not os.path.exists(png_path):
+            image.save(png_path + '.tmp', 'PNG', optimize=True)
+            os.replace(png_path + '.tmp', png_path)
+        
+        variants[name] = {
+            'webp': static_relative_path(webp_path),
+            'png': static_relative_path(png_path),
+            'width': image.width,
+            'height': image.height
+        }
+    return variants
+
+def apply_image_urls(item):
+    """Set image_url (and images.<variant>.webp/png URLs when variants exist) on a menu item dict"""
+    variants = item.pop('image_variants', None)
+    variants = json.loads(variants) if variants else None
+    if variants:
+        item['images'] = {
+            name: {
+                'webp': f"/static/{variant['webp']}",
+                'png': f"/static/{variant['png']}",
+                'width': variant['width'],
+                'height': variant['height']
+            }
+            for name, variant in variants.items()
+        }
+        item['image_url'] = item['images']['detail']['png'] if 'detail' in item['images'] else f"/static/{item['image_path']}"
+    elif item.get('image_path'):
+        item['image_url'] = f"/static/{item['image_path']}"
+    else:
+        item['image_url'] = "/static/images/default_food.png"
+    return item
+
+def remove_unused_image_files(cursor, image_path, image_variants):
+    """Delete an item's previous image files unless another menu item still points at them"""
+    paths = set()
+    if image_path:
+        paths.add(image_path)
+    if image_variants:
+        for variant in json.loads(image_variants).values():
+            paths.update((variant['webp'], variant['png']))
+    
+    for path in paths:
+        cursor.execute("""
+            SELECT 1 FROM menu_items WHERE image_path = ? OR instr(image_variants, ?) > 0 LIMIT 1
+        """, (path, json.dumps(path)))
+        if cursor.fetchone():
+            continue
+        full_path = os.path.join('static', path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+
+@app.after_request
+def cache_image_variants(response):
+    """Variant filenames change whenever their content does, so browsers may keep them forever"""
+    if response.status_code == 200 and request.path.startswith('/' + app.config['IMAGE_VARIANT_FOLDER'] + '/'):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.cli.command('backfill-images')
+def backfill_images_command():
+    """Generate image variants for every file in the upload folder (including subfolders)"""
+    if Image is None:
+        print("❌ Pillow is not installed (pip install Pillow)")
+        raise SystemExit(1)
+    
+    variant_folder = os.path.abspath(app.config['IMAGE_VARIANT_FOLDER'])
+    processed = {}
+    failed = 0
+    for root, dirs, files in os.walk(app.config['UPLOAD_FOLDER']):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != variant_folder)
+        for filename in sorted(files):
+            if not allowed_file(filename):
+                continue
+            path = os.path.join(root, filename)
+            try:
+                with open(path, 'rb') as f:
+                    processed[static_relative_path(path)] = save_image_variants(f.read())
+            except ValueError as e:
+                failed += 1
+                print(f"⚠️ {path}: {e}")
+    
+    conn = get_pool().connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.executemany(
+            "UPDATE menu_items SET image_variants = ? WHERE image_path = ?",
+            [(json.dumps(variants), image_path) for image_path, variants in processed.items()]
+        )
+        updated = cursor.rowcount
+        if updated:
+            bump_menu_version(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"✅ {len(processed)} images processed, {updated} menu items updated, {failed} skipped")
+
 # Custom Jinja2 filter for low stock calculation
 def low_stock_items_filter(items):
     count = 0
@@ -328,17 +1551,2214 @@ def calculate_order_totals(order_items, apply_tax=True, apply_service=True):
         'total': total
     }
 
-# Context processor for date/time
-@app.context_processor
-def inject_current_datetime():
-    return {
-        'current_date': datetime.now().strftime("%d-%m-%Y"),
-        'current_time': datetime.now().strftime("%H:%M")
-    }
+# ==================== ROOM ORDER HELPERS ====================
 
-# ==================== ROUTES ====================
+def get_pending_room_order(cursor, room_id):
+    cursor.execute(
+        "SELECT * FROM room_orders WHERE room_id = ? AND status = 'pending' ORDER BY created_at DESC LIMIT 1",
+        (room_id,)
+    )
+    return cursor.fetchone()
 
-@app.route('/')
+def get_or_create_pending_room_order(cursor, room_id, apply_tax=True, apply_service=True):
+    """Return the room's pending order id, opening one (and occupying the room) if needed (call inside BEGIN IMMEDIATE)"""
+    order = get_pending_room_order(cursor, room_id)
+    if order:
+        return order['id']
+    cursor.execute("""
+        INSERT INTO room_orders (room_id, order_data, subtotal, tax, service_charge, total_amount, status, apply_tax, apply_service)
+        VALUES (?, '[]', 0, 0, 0, 0, 'pending', ?, ?)
+    """, (room_id, int(bool(apply_tax)), int(bool(apply_service))))
+    order_id = cursor.lastrowid
+    cursor.execute("UPDATE rooms SET status = 'occupied' WHERE id = ?", (room_id,))
+    emit_room_status(cursor, room_id, 'occupied')
+    return order_id
+
+def check_order_stock(menu_item, quantity):
+    """Refuse to put more of an item on a room order than is in stock"""
+    if quantity > menu_item['stock']:
+        raise ValueError(
+            f"Insufficient stock for item {menu_item['name']}. Available: {menu_item['stock']}, Requested: {quantity}"
+        )
+
+def adjust_room_order_totals(cursor, order_id, subtotal_delta=0, apply_tax=None, apply_service=None):
+    """Apply a subtotal delta and recompute tax/service/total in place (5% tax, 10% service)"""
+    cursor.execute("""
+        UPDATE room_orders SET
+            subtotal = subtotal + ?,
+            apply_tax = COALESCE(?, apply_tax),
+            apply_service = COALESCE(?, apply_service),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, (
+        subtotal_delta,
+        None if apply_tax is None else int(bool(apply_tax)),
+        None if apply_service is None else int(bool(apply_service)),
+        order_id
+    ))
+    cursor.execute("""
+        UPDATE room_orders SET
+            tax = CASE WHEN apply_tax THEN CAST(subtotal * 0.05 AS INTEGER) ELSE 0 END,
+            service_charge = CASE WHEN apply_service THEN CAST(subtotal * 0.10 AS INTEGER) ELSE 0 END
+        WHERE id = ?
+    """, (order_id,))
+    cursor.execute("UPDATE room_orders SET total_amount = subtotal + tax + service_charge WHERE id = ?", (order_id,))
+
+def set_room_order_item_quantity(cursor, order_id, menu_item_id, quantity, name=None, unit_price=None):
+    """Set one line's quantity (0 removes it) and return (line dict or None, subtotal delta)"""
+    cursor.execute(
+        "SELECT * FROM room_order_items WHERE room_order_id = ? AND menu_item_id = ?",
+        (order_id, menu_item_id)
+    )
+    line = cursor.fetchone()
+    old_amount = line['quantity'] * line['unit_price'] if line else 0
+    
+    if quantity <= 0:
+        if line:
+            cursor.execute("DELETE FROM room_order_items WHERE id = ?", (line['id'],))
+        return None, -old_amount
+    
+    if line:
+        unit_price = line['unit_price']
+        name = line['item_name']
+        cursor.execute("UPDATE room_order_items SET quantity = ? WHERE id = ?", (quantity, line['id']))
+    else:
+        cursor.execute("""
+            INSERT INTO room_order_items (room_order_id, menu_item_id, item_name, quantity, unit_price)
+            VALUES (?, ?, ?, ?, ?)
+        """, (order_id, menu_item_id, name, quantity, unit_price))
+    
+    item = {
+        'id': menu_item_id,
+        'name': name,
+        'price': unit_price,
+        'quantity': quantity,
+        'total': quantity * unit_price
+    }
+    return item, item['total'] - old_amount
+
+def get_room_order_items(cursor, order_id):
+    """Order lines in the shape sale.js keeps in its cart"""
+    cursor.execute("""
+        SELECT menu_item_id, item_name, unit_price, quantity
+        FROM room_order_items
+        WHERE room_order_id = ?
+        ORDER BY id
+    """, (order_id,))
+    return [{
+        'id': row['menu_item_id'],
+        'name': row['item_name'],
+        'price': row['unit_price'],
+        'quantity': row['quantity'],
+        'total': row['unit_price'] * row['quantity']
+    } for row in cursor.fetchall()]
+
+def get_room_order_summary(cursor, order):
+    """A pending room_orders row with its lines, as /api/get_room_order and the sale page bootstrap return it"""
+    return {
+        'id': order['id'],
+        'room_id': order['room_id'],
+        'order_data': get_room_order_items(cursor, order['id']),
+        'subtotal': order['subtotal'],
+        'tax': order['tax'],
+        'service_charge': order['service_charge'],
+        'total_amount': order['total_amount'],
+        'apply_tax': bool(order['apply_tax']),
+        'apply_service': bool(order['apply_service']),
+        'customer_count': order['customer_count'],
+        'notes': order['notes'] or '',
+        'created_at': order['created_at']
+    }
+
+def clear_pending_room_orders(cursor, room_id):
+    cursor.execute("""
+        DELETE FROM room_order_items WHERE room_order_id IN (
+            SELECT id FROM room_orders WHERE room_id = ? AND status = 'pending'
+        )
+    """, (room_id,))
+    cursor.execute("""
+        DELETE FROM room_order_edits WHERE room_order_id IN (
+            SELECT id FROM room_orders WHERE room_id = ? AND status = 'pending'
+        )
+    """, (room_id,))
+    cursor.execute("DELETE FROM room_orders WHERE room_id = ? AND status = 'pending'", (room_id,))
+
+def get_room_board(cursor):
+    """Every room with its pending-order summary in a single grouped query"""
+    cursor.execute("""
+        SELECT r.id, r.room_number, r.room_name, r.room_type, r.hourly_rate, r.status, r.capacity,
+               r.notes, r.created_at,
+               COUNT(ro.id) AS pending_orders,
+               MAX(ro.id) AS order_id,
+               MIN(ro.created_at) AS order_opened_at,
+               COALESCE(SUM(ro.total_amount), 0) AS order_total,
+               COALESCE(SUM(oi.item_count), 0) AS order_item_count
+        FROM rooms r
+        LEFT JOIN room_orders ro ON ro.room_id = r.id AND ro.status = 'pending'
+        LEFT JOIN (
+            SELECT room_order_id, SUM(quantity) AS item_count
+            FROM room_order_items
+            GROUP BY room_order_id
+        ) oi ON oi.room_order_id = ro.id
+        GROUP BY r.id
+        ORDER BY r.room_number
+    """)
+    
+    now = datetime.utcnow()
+    board = []
+    for row in cursor.fetchall():
+        room = dict(row)
+        summary = {key: room.pop(key) for key in (
+            'pending_orders', 'order_id', 'order_opened_at', 'order_total', 'order_item_count'
+        )}
+        room['pending_orders'] = summary['pending_orders']
+        room['pending_order'] = None
+        if summary['order_id']:
+            try:
+                opened = datetime.strptime(summary['order_opened_at'], '%Y-%m-%d %H:%M:%S')
+                elapsed_minutes = max(0, int((now - opened).total_seconds() // 60))
+            except (TypeError, ValueError):
+                elapsed_minutes = None
+            room['pending_order'] = {
+                'id': summary['order_id'],
+                'item_count': summary['order_item_count'],
+                'total_amount': summary['order_total'],
+                'opened_at': summary['order_opened_at'],
+                'elapsed_minutes': elapsed_minutes
+            }
+        board.append(room)
+    return board
+
+def room_order_summary(cursor, order_id):
+    cursor.execute(
+        "SELECT id, room_id, subtotal, tax, service_charge, total_amount, apply_tax, apply_service FROM room_orders WHERE id = ?",
+        (order_id,)
+    )
+    order = dict(cursor.fetchone())
+    order['apply_tax'] = bool(order['apply_tax'])
+    order['apply_service'] = bool(order['apply_service'])
+    return order
+
+# ==================== LIVE CHANGE FEED ====================
+
+class ChangeFeed:
+    """In-process wakeups for event streams; the events themselves live in change_events"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def notify(self):
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, seq, timeout):
+        """Block until a local write is announced after seq, or timeout; return the latest seq"""
+        with self._cond:
+            if self._seq == seq:
+                self._cond.wait(timeout)
+            return self._seq
+
+change_feed = ChangeFeed()
+
+def emit_event(cursor, event_type, payload):
+    """Append an event to the change feed inside the caller's write transaction"""
+    now = int(time.time())
+    cursor.execute(
+        "INSERT INTO change_events (event_type, payload, created_at) VALUES (?, ?, ?)",
+        (event_type, json.dumps(payload, ensure_ascii=False), now)
+    )
+    if cursor.lastrowid % 500 == 0:
+        cursor.execute("DELETE FROM change_events WHERE created_at < ?", (now - app.config['EVENT_RETENTION'],))
+    if has_app_context():
+        g.change_events_emitted = True
+
+def emit_room_status(cursor, room_id, status):
+    emit_event(cursor, 'room_status', {'room_id': room_id, 'status': status})
+
+def emit_room_order(cursor, room_id):
+    """Publish the room's current pending-order summary (None once the order is gone)"""
+    cursor.execute("""
+        SELECT ro.id, ro.total_amount, ro.created_at, COALESCE(SUM(roi.quantity), 0) AS item_count
+        FROM room_orders ro
+        LEFT JOIN room_order_items roi ON roi.room_order_id = ro.id
+        WHERE ro.room_id = ? AND ro.status = 'pending'
+        GROUP BY ro.id
+        ORDER BY ro.created_at DESC
+        LIMIT 1
+    """, (room_id,))
+    order = cursor.fetchone()
+    emit_event(cursor, 'room_order', {
+        'room_id': room_id,
+        'pending_order': {
+            'id': order['id'],
+            'item_count': order['item_count'],
+            'total_amount': order['total_amount'],
+            'opened_at': order['created_at']
+        } if order else None
+    })
+
+# ==================== ROOM ORDER WRITE COALESCING ====================
+
+def normalize_order_items(order_items):
+    """Validate a full cart from the sale page -> [{'id', 'name', 'quantity', 'price'}]"""
+    if not isinstance(order_items, list):
+        raise ValueError('order_items must be a list')
+    items = []
+    for item in order_items:
+        try:
+            items.append({
+                'id': int(item['id']),
+                'name': item.get('name', 'Unknown'),
+                'quantity': int(item['quantity']),
+                'price': int(item['price'])
+            })
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError('Each order item needs a numeric id, quantity and price') from e
+    return items
+
+def set_room_order_details(cursor, order_id, customer_count=None, notes=None):
+    """Save the sale page's customer count and notes on a pending order; None leaves a field as it is"""
+    if customer_count is not None or notes is not None:
+        cursor.execute(
+            "UPDATE room_orders SET customer_count = COALESCE(?, customer_count), notes = COALESCE(?, notes) WHERE id = ?",
+            (customer_count, notes, order_id)
+        )
+
+def write_room_order(cursor, room_id, order_items, apply_tax=True, apply_service=True):
+    """Replace every line of the room's pending order with a full cart; returns the order id"""
+    order_id = get_or_create_pending_room_order(cursor, room_id, apply_tax, apply_service)
+    
+    lines = {}
+    for item in order_items:
+        if item['id'] in lines:
+            lines[item['id']][3] += item['quantity']
+        else:
+            lines[item['id']] = [order_id, item['id'], item.get('name', 'Unknown'), item['quantity'], item['price']]
+    
+    cursor.execute("DELETE FROM room_order_items WHERE room_order_id = ?", (order_id,))
+    cursor.executemany("""
+        INSERT INTO room_order_items (room_order_id, menu_item_id, item_name, quantity, unit_price)
+        VALUES (?, ?, ?, ?, ?)
+    """, [tuple(line) for line in lines.values() if line[3] > 0])
+    
+    subtotal = sum(line[3] * line[4] for line in lines.values() if line[3] > 0)
+    cursor.execute("UPDATE room_orders SET subtotal = 0 WHERE id = ?", (order_id,))
+    adjust_room_order_totals(cursor, order_id, subtotal, apply_tax, apply_service)
+    
+    # Update room status to occupied
+    cursor.execute("UPDATE rooms SET status = 'occupied' WHERE id = ? AND status != 'occupied'", (room_id,))
+    if cursor.rowcount:
+        emit_room_status(cursor, room_id, 'occupied')
+    emit_room_order(cursor, room_id)
+    return order_id
+
+def parse_room_order_edit(data):
+    """Validate a batch of cart edits from the sale page
+
+    Body: {item_id, quantity} for one item or {changes: [{id, quantity}], clear} for a batch,
+    quantities being deltas, plus optional apply_tax / apply_service / customer_count / notes and, for
+    queued autosaves, order_id (the pending order the edits were made against, null if none yet),
+    client_id and client_seq.
+    """
+    changes = data.get('changes')
+    if changes is None:
+        changes = [{'id': data.get('item_id'), 'quantity': data.get('quantity', 1)}] if data.get('item_id') else []
+    if not isinstance(changes, list):
+        raise ValueError('changes must be a list')
+    deltas = {}
+    for change in changes:
+        try:
+            item_id = int(change['id'])
+            deltas[item_id] = deltas.get(item_id, 0) + int(change['quantity'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError('Each change needs a numeric id and quantity') from e
+    
+    edit = {
+        'order_id': data.get('order_id'),
+        'client_id': data.get('client_id'),
+        'client_seq': data.get('client_seq'),
+        'clear': bool(data.get('clear')),
+        'changes': deltas,
+        'apply_tax': data.get('apply_tax'),
+        'apply_service': data.get('apply_service'),
+        'customer_count': data.get('customer_count'),
+        'notes': data.get('notes')
+    }
+    try:
+        for key in ('order_id', 'client_seq', 'customer_count'):
+            if edit[key] is not None:
+                edit[key] = int(edit[key])
+    except (TypeError, ValueError) as e:
+        raise ValueError('order_id, client_seq and customer_count must be numbers') from e
+    if edit['notes'] is not None:
+        edit['notes'] = str(edit['notes'])
+    if (edit['client_id'] is None) != (edit['client_seq'] is None):
+        raise ValueError('client_id and client_seq are sent together')
+    return edit
+
+def room_order_quantities(cursor, order_id, item_ids):
+    """-> ({menu_item_id: menu_items row}, {menu_item_id: quantity on the order}) for some items"""
+    placeholders = ','.join('?' * len(item_ids))
+    cursor.execute(f"SELECT id, name, sale_price, stock FROM menu_items WHERE id IN ({placeholders})", item_ids)
+    menu_items = {row['id']: row for row in cursor.fetchall()}
+    cursor.execute(f"""
+        SELECT menu_item_id, quantity FROM room_order_items
+        WHERE room_order_id = ? AND menu_item_id IN ({placeholders})
+    """, [order_id] + item_ids)
+    return menu_items, {row['menu_item_id']: row['quantity'] for row in cursor.fetchall()}
+
+def check_room_order_edit_stock(cursor, order_id, edit, queued=(False, {})):
+    """Refuse an edit whose increases, on top of the order and edits still queued for it, exceed stock"""
+    item_ids = [item_id for item_id, delta in edit['changes'].items() if delta > 0]
+    if not item_ids:
+        return
+    menu_items, quantities = room_order_quantities(cursor, order_id, item_ids)
+    cleared, queued_deltas = queued
+    for item_id in item_ids:
+        if item_id not in menu_items:
+            raise ValueError(f'Menu item {item_id} not found')
+        if edit['clear']:
+            quantity = edit['changes'][item_id]
+        else:
+            base = 0 if cleared else quantities.get(item_id, 0)
+            quantity = base + queued_deltas.get(item_id, 0) + edit['changes'][item_id]
+        check_order_stock(menu_items[item_id], quantity)
+
+def apply_room_order_edit(cursor, room_id, edit):
+    """Apply one batch of cart edits to the room's pending order (call inside BEGIN IMMEDIATE)
+
+    Returns 'applied', 'duplicate' (this client_seq was already applied to the order) or 'stale'
+    (the order the edits were made against is no longer the room's pending order).
+    Raises ValueError if an increase exceeds stock.
+    """
+    order = get_pending_room_order(cursor, room_id)
+    if not order or order['id'] != edit['order_id']:
+        return 'stale'
+    order_id = order['id']
+    
+    if edit['client_id'] is not None:
+        # Deltas are not idempotent: a batch resent after a lost response must count once
+        cursor.execute(
+            "INSERT OR IGNORE INTO room_order_edits (room_order_id, client_id, client_seq) VALUES (?, ?, ?)",
+            (order_id, edit['client_id'], edit['client_seq'])
+        )
+        if not cursor.rowcount:
+            return 'duplicate'
+    
+    if edit['clear']:
+        cursor.execute("DELETE FROM room_order_items WHERE room_order_id = ?", (order_id,))
+        cursor.execute("UPDATE room_orders SET subtotal = 0 WHERE id = ?", (order_id,))
+    
+    subtotal_delta = 0
+    if edit['changes']:
+        menu_items, quantities = room_order_quantities(cursor, order_id, list(edit['changes']))
+        for item_id, delta in edit['changes'].items():
+            menu_item = menu_items.get(item_id)
+            if menu_item is None and delta > 0:
+                continue  # deleted from the menu since; lines already on the order can still go down
+            quantity = max(0, quantities.get(item_id, 0) + delta)
+            if delta > 0:
+                check_order_stock(menu_item, quantity)
+            _, line_delta = set_room_order_item_quantity(
+                cursor, order_id, item_id, quantity,
+                menu_item['name'] if menu_item else None,
+                menu_item['sale_price'] if menu_item else None
+            )
+            subtotal_delta += line_delta
+    
+    adjust_room_order_totals(cursor, order_id, subtotal_delta, edit['apply_tax'], edit['apply_service'])
+    set_room_order_details(cursor, order_id, edit['customer_count'], edit['notes'])
+    emit_room_order(cursor, room_id)
+    return 'applied'
+
+class RoomOrderWriteBuffer:
+    """Per-worker queue of sale page cart edits per room, written at most once per ROOM_ORDER_FLUSH_INTERVAL
+
+    A burst of +1 taps becomes one write transaction; all rooms due at the same time share it.
+    Edits are acknowledged once queued, so until their flush other workers serve the order
+    without them (reads on this worker flush the room first), and a worker killed with SIGKILL
+    loses them; a clean shutdown flushes. A batch that fails to write goes back ahead of newer
+    edits, keeping their order, and is retried up to ROOM_ORDER_FLUSH_RETRIES times.
+    """
+
+    def __init__(self):
+        self._pending = {}  # room_id -> [queued_at, failed attempts, [edit, ...] in arrival order]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, room_id, edit):
+        """Queue an edit; returns False if the same client_seq for the order is already queued"""
+        with self._cond:
+            entry = self._pending.setdefault(room_id, [time.monotonic(), 0, []])
+            for queued in entry[2]:
+                if (queued['order_id'], queued['client_id'], queued['client_seq']) == \
+                        (edit['order_id'], edit['client_id'], edit['client_seq']):
+                    return False
+            entry[2].append(edit)
+            if self._thread is None or self._pid != os.getpid():
+                # Started lazily so a preloaded app forks before any flusher thread exists
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='room-order-flusher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def queued_changes(self, room_id, order_id):
+        """(cleared, {menu_item_id: delta}) of the edits queued here for one order"""
+        cleared = False
+        deltas = {}
+        with self._cond:
+            edits = list(self._pending[room_id][2]) if room_id in self._pending else []
+        for edit in edits:
+            if edit['order_id'] != order_id:
+                continue
+            if edit['clear']:
+                cleared = True
+                deltas = {}
+            for item_id, delta in edit['changes'].items():
+                deltas[item_id] = deltas.get(item_id, 0) + delta
+        return cleared, deltas
+
+    def take(self, room_id=None):
+        """Remove and return queued edits (one room, or all)"""
+        with self._cond:
+            if room_id is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {room_id: self._pending.pop(room_id)} if room_id in self._pending else {}
+        return batch
+
+    def flush(self, room_id=None):
+        """Write queued edits now (before reading a room's order, and at shutdown); False if that failed"""
+        return self._write(self.take(room_id))
+
+    def _run(self):
+        interval = app.config['ROOM_ORDER_FLUSH_INTERVAL']
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                wait = min(entry[0] for entry in self._pending.values()) + interval - now
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                batch = {room_id: entry for room_id, entry in self._pending.items() if entry[0] + interval <= now}
+                for room_id in batch:
+                    del self._pending[room_id]
+            self._write(batch)
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front of anything queued since, retrying after another interval"""
+        now = time.monotonic()
+        with self._cond:
+            for room_id, (_, attempts, edits) in batch.items():
+                if attempts + 1 >= app.config['ROOM_ORDER_FLUSH_RETRIES']:
+                    app.logger.error('Dropping %d room %s order edits after %d failed writes', len(edits), room_id, attempts + 1)
+                    continue
+                entry = self._pending.setdefault(room_id, [now, 0, []])
+                entry[1] = max(entry[1], attempts + 1)
+                entry[2][:0] = edits
+            self._cond.notify()
+
+    def _write(self, batch):
+        if not batch:
+            return True
+        with app.app_context():
+            conn = get_db()
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for room_id, (_, _, edits) in batch.items():
+                    for edit in edits:
+                        # Stock can run out between queueing and writing; that edit alone is dropped
+                        cursor.execute("SAVEPOINT room_order_edit")
+                        try:
+                            result = apply_room_order_edit(cursor, room_id, edit)
+                        except ValueError as e:
+                            cursor.execute("ROLLBACK TO room_order_edit")
+                            result = str(e)
+                        cursor.execute("RELEASE room_order_edit")
+                        if result not in ('applied', 'duplicate'):
+                            app.logger.warning('Room %s order edit from %s not applied: %s', room_id, edit['client_id'], result)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                app.logger.exception('Room order flush failed for rooms %s', sorted(batch))
+                self._requeue(batch)
+                return False
+        return True
+
+room_order_writes = RoomOrderWriteBuffer()
+atexit.register(room_order_writes.flush)
+
+# ==================== MENU CATALOG CACHE ====================
+
+def get_data_version(cursor, name):
+    cursor.execute("SELECT version FROM data_versions WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(cursor, name):
+    """Increment a shared version counter inside the caller's write transaction"""
+    cursor.execute("UPDATE data_versions SET version = version + 1 WHERE name = ?", (name,))
+    return get_data_version(cursor, name)
+
+def bump_menu_version(cursor):
+    version = bump_data_version(cursor, 'menu')
+    emit_event(cursor, 'menu', {'version': version})
+    return version
+
+def mark_stock_changed(cursor, item_ids):
+    """Stamp items with a new stock version so /api/menu_stock can serve them as a delta"""
+    version = bump_data_version(cursor, 'stock')
+    cursor.executemany(
+        "UPDATE menu_items SET stock_version = ? WHERE id = ?",
+        [(version, item_id) for item_id in item_ids]
+    )
+    cursor.execute("SELECT id, stock FROM menu_items WHERE stock_version = ?", (version,))
+    emit_event(cursor, 'stock', {
+        'version': version,
+        'stock': {row['id']: row['stock'] for row in cursor.fetchall()}
+    })
+    return version
+
+_catalog_cache = (None, None, None)  # (version, body, etag), replaced as a whole so readers never mix versions
+_catalog_lock = threading.Lock()
+
+def build_menu_catalog(cursor):
+    """Active menu items for the sale page, without volatile stock counts"""
+    cursor.execute("""
+        SELECT mi.id, mi.name, mi.sale_price as price, mi.unit,
+               c.name as category, c.display_name as category_display,
+               c.icon_class as category_icon, c.color_code as category_color,
+               mi.status, mi.image_path, mi.image_variants, mi.cost_price
+        FROM menu_items mi
+        LEFT JOIN categories c ON mi.category_id = c.id
+        WHERE mi.status = 'active'
+        ORDER BY c.sort_order, mi.name
+    """)
+    
+    items = []
+    for row in cursor.fetchall():
+        item = dict(row)
+        # Ensure all required fields exist with proper names for sale page
+        item['category'] = item.get('category', 'other')
+        item['category_name'] = item.get('category', 'other')  # Add category_name for compatibility
+        item['category_icon'] = item.get('category_icon', 'fas fa-box')
+        item['category_color'] = item.get('category_color', '#6c757d')
+        
+        # Image URLs (resized variants when available)
+        apply_image_urls(item)
+        
+        # Ensure price field exists (some templates might use 'sale_price' instead of 'price')
+        item['sale_price'] = item.get('price', 0)
+        
+        items.append(item)
+    return items
+
+def get_menu_catalog(cursor):
+    """Return (version, body, etag) for the current menu version, rebuilding only when it changes"""
+    global _catalog_cache
+    version = get_data_version(cursor, 'menu')
+    cached = _catalog_cache
+    if cached[0] == version:
+        return cached
+    
+    with _catalog_lock:
+        if _catalog_cache[0] != version:
+            items = build_menu_catalog(cursor)
+            body = json.dumps(
+                {'success': True, 'version': version, 'items': items},
+                ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+            etag = f"menu-{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+            _catalog_cache = (version, body, etag)
+        return _catalog_cache
+
+def current_user_info():
+    return {
+        'id': current_user.id,
+        'username': current_user.username,
+        'full_name': current_user.full_name,
+        'role': current_user.role
+    }
+
+def get_sale_bootstrap(cursor, room):
+    """What sale.js needs before the first tap, embedded in the page instead of fetched separately
+
+    The catalog itself is not embedded: the page caches it by ETag and only refetches
+    /api/menu_items when `menu.etag` differs. Stock levels are always current, and `events_since`
+    lets the page subscribe to /api/events without missing changes made after the render.
+    """
+    # Read the event position first: anything that changes after it is replayed to the page
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM change_events")
+    events_since = cursor.fetchone()[0]
+    menu_version, _, menu_etag = get_menu_catalog(cursor)
+    stock_version = get_data_version(cursor, 'stock')
+    cursor.execute("SELECT id, stock FROM menu_items WHERE status = 'active'")
+    stock = {row['id']: row['stock'] for row in cursor.fetchall()}
+    
+    order = None
+    if room:
+        room_order_writes.flush(room['id'])
+        pending = get_pending_room_order(cursor, room['id'])
+        if pending:
+            order = get_room_order_summary(cursor, pending)
+    
+    return {
+        'room': dict(room) if room else None,
+        'order': order,
+        'user': current_user_info(),
+        'menu': {'version': menu_version, 'etag': menu_etag},
+        'stock': {'version': stock_version, 'full': True, 'stock': stock},  # /api/menu_stock shape
+        'events_since': events_since
+    }
+
+# Context processor for date/time
+@app.context_processor
+def inject_current_datetime():
+    return {
+        'current_date': datetime.now().strftime("%d-%m-%Y"),
+        'current_time': datetime.now().strftime("%H:%M")
+    }
+
+# ==================== DASHBOARD STATS ====================
+
+# Every write that can move a dashboard counter (checkout, room orders and status, stock, menu
+# edits) emits a change event, and close_db() invalidates the cache once that write is done.
+DASHBOARD_STATS_SQL = """
+    SELECT s.today_sales, s.today_customers, r.total_rooms, r.occupied_rooms, m.low_stock_items
+    FROM (
+        SELECT COALESCE(SUM(total_amount), 0) AS today_sales, COALESCE(SUM(customer_count), 0) AS today_customers
+        FROM sales WHERE sold_at >= ? AND sold_at < ?
+    ) s, (
+        SELECT COUNT(*) AS total_rooms, COALESCE(SUM(status = 'occupied'), 0) AS occupied_rooms FROM rooms
+    ) r, (
+        SELECT COUNT(*) AS low_stock_items FROM menu_items WHERE stock <= min_stock AND status = 'active'
+    ) m
+"""
+
+_dashboard_stats = {'key': None, 'stats': None, 'expires': 0.0, 'generation': 0}
+_dashboard_stats_lock = threading.Lock()
+
+def dashboard_stamp_path():
+    return app.config['DATABASE'] + '-dashboard'
+
+def invalidate_dashboard_stats():
+    """Drop this worker's cached counters and touch the stamp so the other workers drop theirs"""
+    # Under the lock, so a refresh in progress finishes under the old generation and is never reused
+    with _dashboard_stats_lock:
+        _dashboard_stats['generation'] += 1
+    with open(dashboard_stamp_path(), 'a'):
+        os.utime(dashboard_stamp_path())
+
+def get_dashboard_stats(cursor):
+    """today_sales, today_customers, total_rooms, occupied_rooms and low_stock_items in one query,
+    cached for DASHBOARD_STATS_TTL seconds or until a write invalidates them"""
+    try:
+        stamp = os.stat(dashboard_stamp_path()).st_mtime_ns
+    except FileNotFoundError:
+        stamp = 0
+    day_start, day_end = today_bounds()
+    key = (day_start, stamp, _dashboard_stats['generation'])
+    if _dashboard_stats['key'] == key and _dashboard_stats['expires'] > time.monotonic():
+        return _dashboard_stats['stats']
+    
+    # Many tabs refreshing at once: one of them recomputes, the rest reuse its result
+    with _dashboard_stats_lock:
+        key = (day_start, stamp, _dashboard_stats['generation'])
+        if _dashboard_stats['key'] != key or _dashboard_stats['expires'] <= time.monotonic():
+            cursor.execute(DASHBOARD_STATS_SQL, (day_start, day_end))
+            stats = dict(cursor.fetchone())
+            _dashboard_stats.update(key=key, stats=stats, expires=time.monotonic() + app.config['DASHBOARD_STATS_TTL'])
+        return _dashboard_stats['stats']
+
+# ==================== MENU SEARCH ====================
+
+MENU_SEARCH_SORTS = {
+    'name': 'mi.name',
+    'stock': 'mi.stock',
+    'price': 'mi.sale_price',
+}
+LOW_STOCK_SQL = "mi.stock > 0 AND mi.stock <= COALESCE(NULLIF(mi.min_stock, 0), 5)"
+MENU_SEARCH_STOCK_FILTERS = {
+    'low': LOW_STOCK_SQL,
+    'out': "mi.stock <= 0",
+}
+MENU_SEARCH_MAX_LIMIT = 200
+FTS_MIN_TERM_LENGTH = 3  # trigram tokens: shorter terms cannot use the index
+
+MENU_SEARCH_SQL = """
+    SELECT mi.*, c.name as category_name, c.display_name as category_display,
+           c.icon_class as category_icon, c.color_code as category_color
+    FROM menu_items mi
+    LEFT JOIN categories c ON mi.category_id = c.id
+    WHERE {where}
+    ORDER BY {sort}, mi.id
+    LIMIT ?
+"""
+
+def menu_fts_available(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'menu_items_fts'")
+    return cursor.fetchone() is not None
+
+def like_pattern(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def parse_menu_search(cursor, args):
+    """Query args -> {'sort', 'after', 'conditions', 'params'}; raises ValueError on bad input
+
+    q is matched as substrings of the name or description (every whitespace-separated term must
+    match), category is a category name, status a menu_items status, stock 'low' or 'out', sort one
+    of MENU_SEARCH_SORTS and after the next_cursor of the previous page.
+    """
+    filters = {'sort': args.get('sort') or 'name', 'after': None, 'conditions': [], 'params': []}
+    if filters['sort'] not in MENU_SEARCH_SORTS:
+        raise ValueError(f"Invalid sort: {filters['sort']}")
+    
+    phrases = []
+    use_fts = menu_fts_available(cursor)
+    for term in (args.get('q') or '').split():
+        if use_fts and len(term) >= FTS_MIN_TERM_LENGTH:
+            phrases.append('"' + term.replace('"', '""') + '"')
+        else:
+            filters['conditions'].append("(mi.name LIKE ? ESCAPE '\\' OR mi.description LIKE ? ESCAPE '\\')")
+            filters['params'].extend((like_pattern(term),) * 2)
+    if phrases:
+        filters['conditions'].append("mi.id IN (SELECT rowid FROM menu_items_fts WHERE menu_items_fts MATCH ?)")
+        filters['params'].append(' AND '.join(phrases))
+    
+    category = args.get('category')
+    if category and category != 'all':
+        filters['conditions'].append("c.name = ?")
+        filters['params'].append(category)
+    status = args.get('status')
+    if status and status != 'all':
+        if status not in MENU_ITEM_STATUSES:
+            raise ValueError(f'Invalid status: {status}')
+        filters['conditions'].append("mi.status = ?")
+        filters['params'].append(status)
+    stock = args.get('stock')
+    if stock and stock != 'all':
+        if stock not in MENU_SEARCH_STOCK_FILTERS:
+            raise ValueError(f'Invalid stock filter: {stock}')
+        filters['conditions'].append(MENU_SEARCH_STOCK_FILTERS[stock])
+    
+    if args.get('after'):
+        try:
+            value, item_id = json.loads(args['after'])
+            item_id = int(item_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+        filters['after'] = (value, item_id)
+        filters['conditions'].append(f"({MENU_SEARCH_SORTS[filters['sort']]}, mi.id) > (?, ?)")
+        filters['params'].extend((value, item_id))
+    return filters
+
+def menu_search_page(cursor, filters, limit=50):
+    """One page of menu items in (sort column, id) keyset order; returns (items, next cursor or None)"""
+    sort = MENU_SEARCH_SORTS[filters['sort']]
+    cursor.execute(
+        MENU_SEARCH_SQL.format(where=' AND '.join(filters['conditions']) or '1', sort=sort),
+        tuple(filters['params']) + (limit + 1,)
+    )
+    items = [apply_image_urls(dict(row)) for row in cursor.fetchall()]
+    
+    next_cursor = None
+    if len(items) > limit:
+        del items[limit:]
+        last = items[-1]
+        next_cursor = json.dumps([last[sort.split('.')[1]], last['id']], ensure_ascii=False)
+    return items, next_cursor
+
+def menu_stock_stats(cursor):
+    """Counts across the whole menu for the menu and stocks page headers"""
+    cursor.execute(f"""
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(mi.status = 'active'), 0) AS active,
+               COALESCE(SUM(mi.status = 'active' AND {LOW_STOCK_SQL}), 0) AS low_stock,
+               COALESCE(SUM(mi.status = 'active' AND mi.stock <= 0), 0) AS out_of_stock,
+               COALESCE(SUM(mi.stock * mi.sale_price), 0) AS stock_value
+        FROM menu_items mi
+    """)
+    return dict(cursor.fetchone())
+
+# ==================== EXPORTS ====================
+
+def export_sales_query(start, end):
+    """Sales joined with their line items (one row per line) for an epoch range, per partition"""
+    return """
+        SELECT s.id AS sale_id, s.bill_number, s.sale_date, s.sale_time, r.room_name,
+               u.full_name AS staff_name, s.payment_method, s.payment_status, s.customer_count,
+               s.subtotal, s.tax_amount, s.service_charge, s.discount, s.total_amount,
+               si.menu_item_id, si.item_name, si.quantity, si.unit_price, si.total_price, si.unit_cost
+        FROM {sales} s
+        LEFT JOIN {sale_items} si ON si.sale_id = s.id
+        LEFT JOIN rooms r ON s.room_id = r.id
+        LEFT JOIN users u ON s.staff_id = u.id
+        WHERE s.sold_at >= ? AND s.sold_at < ?
+        ORDER BY s.sold_at, s.id, si.id
+    """, (start, end)
+
+def export_stock_transactions_query(start, end):
+    """Stock ledger with item names; transaction_date is stored in UTC, local_time is shop time"""
+    return f"""
+        SELECT st.id AS transaction_id, st.transaction_date,
+               datetime(st.transaction_date, '{shop_utc_offset_seconds():+d} seconds') AS local_time,
+               st.menu_item_id, mi.name AS item_name, c.display_name AS category,
+               st.transaction_type, st.quantity, st.unit_price, st.total_amount,
+               st.reference_id, st.notes, u.full_name AS staff_name
+        FROM {{stock_transactions}} st
+        LEFT JOIN menu_items mi ON st.menu_item_id = mi.id
+        LEFT JOIN categories c ON mi.category_id = c.id
+        LEFT JOIN users u ON st.staff_id = u.id
+        WHERE st.transaction_date >= ? AND st.transaction_date < ?
+        ORDER BY st.transaction_date, st.id
+    """, (epoch_to_utc(start), epoch_to_utc(end))
+
+EXPORTS = {
+    'sales': export_sales_query,
+    'stock_transactions': export_stock_transactions_query,
+}
+
+def iter_export_rows(dataset, start_day, end_day):
+    """Yield the header, then rows in fetchmany batches on a dedicated connection
+
+    Archived years are streamed first, one attached year file at a time (so long ranges never hit
+    SQLite's attached database limit), then the hot database from one read snapshot.
+    """
+    start, end = shop_day_bounds(start_day, end_day)
+    template, params = EXPORTS[dataset](start, end)
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        years, boundary = archive_years(conn.cursor(), start, end)
+        header = None
+        for year in years + [None]:
+            with ExitStack() as stack:
+                if year is None:
+                    tables = MAIN_TABLES
+                else:
+                    tables = archive_tables(stack.enter_context(attached_archive(conn, year)), boundary)
+                conn.execute("BEGIN")  # one consistent snapshot per partition
+                cursor = conn.execute(template.format(**tables), params)
+                stack.callback(cursor.close)
+                if header is None:
+                    header = [column[0] for column in cursor.description]
+                    yield header
+                while True:
+                    rows = cursor.fetchmany(app.config['EXPORT_CHUNK_ROWS'])
+                    if not rows:
+                        break
+                    yield from (tuple(row) for row in rows)
+                conn.rollback()
+    except BaseException:
+        pool.release(conn, discard=True)  # may still have a year file attached
+        raise
+    pool.release(conn)
+
+def stream_csv(rows):
+    """UTF-8 CSV (with BOM so Excel shows Myanmar text) in roughly EXPORT_CHUNK_ROWS-row chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % app.config['EXPORT_CHUNK_ROWS'] == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+class _ChunkSink:
+    """Write-only, unseekable file for zipfile; drained into response chunks as the archive grows"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+_XLSX_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = xml_escape(_XLSX_ILLEGAL_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def stream_xlsx(rows, sheet_name='Export'):
+    """Single-sheet .xlsx written as a streaming zip (inline strings, no shared-string table to buffer)"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ))
+        archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{xml_escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        ))
+        yield sink.drain()
+        
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for row in rows:
+                sheet.write(('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>').encode('utf-8'))
+                if sink.size >= 64 * 1024:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+def parse_export_range(start, end):
+    """YYYY-MM-DD strings (either may be empty) -> (start_day, end_day); defaults to all history up to today"""
+    start_day = datetime.strptime(start, '%Y-%m-%d').date() if start else date(2000, 1, 1)
+    end_day = datetime.strptime(end, '%Y-%m-%d').date() if end else shop_now().date()
+    if end_day < start_day:
+        raise ValueError('End date is before start date')
+    return start_day, end_day
+
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(sorted(EXPORTS)))
+@click.option('--start', default=None, help='First shop-local day (YYYY-MM-DD), default all history')
+@click.option('--end', default=None, help='Last shop-local day (YYYY-MM-DD), default today')
+@click.option('--format', 'export_format', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Output file (default stdout)')
+def export_command(dataset, start, end, export_format, output):
+    """Stream sales (with line items) or the stock ledger to CSV/XLSX"""
+    start_day, end_day = parse_export_range(start, end)
+    writer, _ = EXPORT_FORMATS[export_format]
+    for chunk in writer(iter_export_rows(dataset, start_day, end_day)):
+        output.write(chunk)
+
+# ==================== MENU IMPORT / EXPORT ====================
+
+MENU_IMPORT_FIELDS = ('id', 'name', 'category', 'sale_price', 'cost_price', 'stock', 'min_stock',
+                      'unit', 'image', 'description', 'status')
+MENU_INT_FIELDS = ('sale_price', 'cost_price', 'stock', 'min_stock')
+MENU_ITEM_STATUSES = ('active', 'inactive', 'out_of_stock')
+MENU_ITEM_DEFAULTS = {'cost_price': 0, 'stock': 0, 'min_stock': 5, 'unit': 'ခု', 'image_path': None,
+                      'image_variants': None, 'description': '', 'status': 'active'}
+MENU_ITEM_COLUMNS = ('name', 'category_id', 'sale_price', 'cost_price', 'stock', 'min_stock', 'unit',
+                     'image_path', 'image_variants', 'description', 'status')
+
+def read_menu_file(data, file_format):
+    """CSV or JSON text/bytes -> list of row dicts; empty cells are dropped (keep the current value)"""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if file_format == 'json':
+        rows = json.loads(text)
+        if isinstance(rows, dict):
+            rows = rows.get('items')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('JSON must be a list of items or {"items": [...]}')
+    elif file_format == 'csv':
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ValueError(f'Unsupported format: {file_format}')
+    return [
+        {key.strip(): value.strip() if isinstance(value, str) else value
+         for key, value in row.items() if key and value is not None and str(value).strip() != ''}
+        for row in rows
+    ]
+
+def upload_image_path(filename):
+    """Filename relative to UPLOAD_FOLDER -> menu_items.image_path, or None if no such image"""
+    folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    path = os.path.abspath(os.path.join(folder, filename))
+    if not path.startswith(folder + os.sep) or not allowed_file(path) or not os.path.isfile(path):
+        return None
+    return static_relative_path(os.path.relpath(path, os.path.abspath('.')))
+
+def plan_menu_import(cursor, rows):
+    """Validate every row against the current menu before anything is written
+
+    Rows match an item by `id`, else by exact name; unmatched rows create items.
+    Returns (plan, errors): plan = {'create': [item], 'update': [{'id', 'item', 'changes'}], 'unchanged': n}.
+    """
+    cursor.execute("SELECT id, name, display_name FROM categories")
+    categories = {}
+    for row in cursor.fetchall():
+        categories[row['name'].lower()] = row['id']
+        if row['display_name']:
+            categories.setdefault(row['display_name'].lower(), row['id'])
+    
+    cursor.execute(f"SELECT id, {', '.join(MENU_ITEM_COLUMNS)} FROM menu_items")
+    existing = {row['id']: dict(row) for row in cursor.fetchall()}
+    by_name = {}
+    for item in existing.values():
+        by_name.setdefault(item['name'].strip().lower(), []).append(item['id'])
+    
+    plan = {'create': [], 'update': [], 'unchanged': 0}
+    errors = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        problems = []
+        unknown = sorted(set(row) - set(MENU_IMPORT_FIELDS))
+        if unknown:
+            problems.append(f"Unknown column(s): {', '.join(unknown)}")
+        
+        fields = {}
+        for field in MENU_INT_FIELDS:
+            if field in row:
+                try:
+                    fields[field] = int(str(row[field]).replace(',', ''))
+                except ValueError:
+                    problems.append(f'{field} must be a whole number')
+                    continue
+                if fields[field] < 0:
+                    problems.append(f'{field} cannot be negative')
+        for field in ('name', 'unit', 'description'):
+            if field in row:
+                fields[field] = str(row[field])
+        if 'status' in row:
+            fields['status'] = str(row['status']).lower()
+            if fields['status'] not in MENU_ITEM_STATUSES:
+                problems.append(f"status must be one of {', '.join(MENU_ITEM_STATUSES)}")
+        if 'category' in row:
+            fields['category_id'] = categories.get(str(row['category']).lower())
+            if fields['category_id'] is None:
+                problems.append(f"Unknown category: {row['category']}")
+        if 'image' in row:
+            fields['image_path'] = upload_image_path(str(row['image']))
+            if fields['image_path'] is None:
+                problems.append(f"Image not found in {app.config['UPLOAD_FOLDER']}: {row['image']}")
+        
+        target = None
+        if 'id' in row:
+            try:
+                target = int(row['id'])
+            except ValueError:
+                target = -1
+            if target not in existing:
+                problems.append(f"No menu item #{row['id']}")
+        elif 'name' in row:
+            matches = by_name.get(fields['name'].strip().lower(), [])
+            if len(matches) > 1:
+                problems.append(f"Several items are named {fields['name']}; give the id")
+            elif matches:
+                target = matches[0]
+        if target is None:
+            missing = [field for field in ('name', 'category', 'sale_price') if field not in row]
+            if missing:
+                problems.append(f"New items need {', '.join(missing)}")
+        
+        key = target if target is not None else fields.get('name', '').strip().lower()
+        if key in seen:
+            problems.append('Duplicate of an earlier row')
+        seen.add(key)
+        
+        if problems:
+            errors.append({'row': number, 'name': row.get('name'), 'errors': problems})
+        elif target is not None:
+            current = existing[target]
+            changes = {field: [current[field], value] for field, value in fields.items() if current[field] != value}
+            if changes:
+                plan['update'].append({'id': target, 'item': {**current, **fields}, 'changes': changes})
+            else:
+                plan['unchanged'] += 1
+        else:
+            plan['create'].append({**MENU_ITEM_DEFAULTS, **fields})
+    return plan, errors
+
+def menu_image_variants(plan):
+    """{image_path: variants JSON} for images the plan newly assigns (resized before taking the write lock)"""
+    paths = {item['image_path'] for item in plan['create'] if item['image_path']}
+    paths.update(update['item']['image_path'] for update in plan['update'] if 'image_path' in update['changes'])
+    variants = {}
+    for image_path in paths:
+        variants[image_path] = None
+        if Image is not None:
+            with open(os.path.join('static', image_path), 'rb') as f:
+                try:
+                    variants[image_path] = json.dumps(save_image_variants(f.read()))
+                except ValueError:
+                    pass  # served as-is, like an upload without Pillow
+    return variants
+
+def apply_menu_import(cursor, plan, staff_id, variants):
+    """Write a validated plan with one executemany per statement (call inside BEGIN IMMEDIATE)"""
+    cursor.execute("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'menu_items'), 0),
+                   COALESCE((SELECT MAX(id) FROM menu_items), 0))
+    """)
+    next_id = cursor.fetchone()[0] + 1
+    ledger = []
+    
+    created = []
+    for item_id, item in enumerate(plan['create'], start=next_id):
+        item['id'] = item_id
+        if item['image_path']:
+            item['image_variants'] = variants.get(item['image_path'])
+        created.append((item_id,) + tuple(item[column] for column in MENU_ITEM_COLUMNS))
+        if item['stock'] > 0:
+            ledger.append((item_id, 'purchase', item['stock'], item['cost_price'],
+                           item['stock'] * item['cost_price'], staff_id, 'Bulk import'))
+    cursor.executemany(f"""
+        INSERT INTO menu_items (id, {', '.join(MENU_ITEM_COLUMNS)})
+        VALUES ({', '.join('?' * (len(MENU_ITEM_COLUMNS) + 1))})
+    """, created)
+    
+    updated = []
+    replaced_images = []
+    for update in plan['update']:
+        item, changes = update['item'], update['changes']
+        if 'image_path' in changes:
+            replaced_images.append((changes['image_path'][0], item['image_variants']))
+            item['image_variants'] = variants.get(item['image_path'])
+        updated.append(tuple(item[column] for column in MENU_ITEM_COLUMNS) + (update['id'],))
+        if 'stock' in changes:
+            old_stock, new_stock = changes['stock']
+            ledger.append((update['id'], 'adjustment', new_stock - old_stock, item['cost_price'],
+                           abs(new_stock - old_stock) * item['cost_price'], staff_id,
+                           f'Bulk import from {old_stock} to {new_stock}'))
+    cursor.executemany(f"""
+        UPDATE menu_items SET {', '.join(column + ' = ?' for column in MENU_ITEM_COLUMNS)},
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, updated)
+    
+    cursor.executemany("""
+        INSERT INTO stock_transactions (menu_item_id, transaction_type, quantity, unit_price, total_amount, staff_id, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, ledger)
+    
+    for image_path, image_variants in replaced_images:
+        remove_unused_image_files(cursor, image_path, image_variants)
+    if created or updated:
+        bump_menu_version(cursor)
+    if ledger:
+        mark_stock_changed(cursor, [line[0] for line in ledger])
+
+def import_menu(conn, rows, staff_id=None, dry_run=False):
+    """Validate, then (unless dry_run or invalid) apply the rows in one transaction; returns (plan, errors)"""
+    cursor = conn.cursor()
+    plan, errors = plan_menu_import(cursor, rows)
+    if errors or dry_run:
+        return plan, errors
+    variants = menu_image_variants(plan)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        plan, errors = plan_menu_import(cursor, rows)  # re-check against the now locked menu
+        if errors:
+            conn.rollback()
+            return plan, errors
+        apply_menu_import(cursor, plan, staff_id, variants)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return plan, errors
+
+def menu_import_summary(plan, errors):
+    """JSON-friendly dry-run diff"""
+    return {
+        'created': [{'name': item['name'], 'category_id': item['category_id'], 'sale_price': item['sale_price'],
+                     'stock': item['stock']} for item in plan['create']],
+        'updated': [{'id': update['id'], 'name': update['item']['name'], 'changes': update['changes']}
+                    for update in plan['update']],
+        'unchanged': plan['unchanged'],
+        'errors': errors
+    }
+
+def iter_menu_export_rows(cursor):
+    """Header plus one row per item, in the columns plan_menu_import reads back"""
+    upload_prefix = static_relative_path(app.config['UPLOAD_FOLDER']) + '/'
+    cursor.execute("""
+        SELECT mi.id, mi.name, c.name AS category, mi.sale_price, mi.cost_price, mi.stock, mi.min_stock,
+               mi.unit, mi.image_path, mi.description, mi.status
+        FROM menu_items mi
+        LEFT JOIN categories c ON mi.category_id = c.id
+        ORDER BY c.sort_order, mi.name
+    """)
+    yield list(MENU_IMPORT_FIELDS)
+    for row in cursor.fetchall():
+        image = row['image_path']
+        if image and image.startswith(upload_prefix):
+            image = image[len(upload_prefix):]
+        yield (row['id'], row['name'], row['category'], row['sale_price'], row['cost_price'], row['stock'],
+               row['min_stock'], row['unit'], image, row['description'], row['status'])
+
+def menu_export_json(rows):
+    header = next(rows)
+    return json.dumps({'items': [dict(zip(header, row)) for row in rows]}, ensure_ascii=False, indent=2)
+
+def menu_file_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in ('csv', 'json'):
+        raise ValueError('Menu files must be .csv or .json')
+    return extension
+
+@app.cli.command('import-menu')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Only validate and print the changes')
+def import_menu_command(path, dry_run):
+    """Create or update menu items from a CSV/JSON file in one transaction"""
+    with open(path, 'rb') as f:
+        rows = read_menu_file(f.read(), menu_file_format(path))
+    conn = get_pool().connect()
+    try:
+        plan, errors = import_menu(conn, rows, dry_run=dry_run)
+    finally:
+        conn.close()
+    for error in errors:
+        print(f"❌ Row {error['row']} ({error['name'] or '-'}): {'; '.join(error['errors'])}")
+    if errors:
+        raise SystemExit(1)
+    for item in plan['create']:
+        print(f"+ {item['name']} ({item['sale_price']:,} Ks, stock {item['stock']})")
+    for update in plan['update']:
+        changes = ', '.join(f"{field} {old} -> {new}" for field, (old, new) in update['changes'].items())
+        print(f"~ #{update['id']} {update['item']['name']}: {changes}")
+    verb = 'Would apply' if dry_run else '✅ Applied'
+    print(f"{verb}: {len(plan['create'])} new, {len(plan['update'])} updated, {plan['unchanged']} unchanged")
+
+@app.cli.command('export-menu')
+@click.option('--format', 'export_format', type=click.Choice(['csv', 'json', 'xlsx']), default='csv')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Output file (default stdout)')
+def export_menu_command(export_format, output):
+    """Write the menu in the format import-menu reads"""
+    conn = get_pool().connect()
+    try:
+        rows = iter_menu_export_rows(conn.cursor())
+        if export_format == 'json':
+            output.write(menu_export_json(rows).encode('utf-8'))
+        else:
+            for chunk in EXPORT_FORMATS[export_format][0](rows):
+                output.write(chunk)
+    finally:
+        conn.close()
+
+# ==================== STOCK MOVEMENTS ====================
+
+# Batch types accepted by /api/update_stock -> stock_transactions.transaction_type
+STOCK_MOVEMENT_TYPES = {'receipt': 'purchase', 'adjustment': 'adjustment', 'wastage': 'wastage'}
+
+def parse_stock_lines(data):
+    """Request JSON -> [(item_id, transaction_type, delta, unit_cost or None, reason)]
+
+    Accepts {"lines": [{item_id, quantity, type?, reason?, unit_cost?}], "type": ...} or one bare line
+    (the menu page's {item_id, quantity, reason}). Receipts must add stock; wastage always removes it.
+    """
+    default_type = data.get('type') or ('receipt' if data.get('receipt') else 'adjustment')
+    lines = data.get('lines')
+    if lines is None:
+        lines = [data]
+    if not isinstance(lines, list) or not lines:
+        raise ValueError('lines must be a non-empty list')
+    
+    parsed = []
+    for number, line in enumerate(lines, start=1):
+        movement = line.get('type') or default_type
+        if movement not in STOCK_MOVEMENT_TYPES:
+            raise ValueError(f"Line {number}: type must be one of {', '.join(STOCK_MOVEMENT_TYPES)}")
+        try:
+            item_id = int(line.get('item_id'))
+            quantity = int(line.get('quantity', line.get('delta')))
+            unit_cost = int(line['unit_cost']) if line.get('unit_cost') not in (None, '') else None
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Line {number}: item_id, quantity and unit_cost must be whole numbers') from e
+        if quantity == 0:
+            raise ValueError(f'Line {number}: quantity cannot be zero')
+        if movement == 'receipt' and quantity < 0:
+            raise ValueError(f'Line {number}: received quantity must be positive')
+        if unit_cost is not None and unit_cost < 0:
+            raise ValueError(f'Line {number}: unit_cost cannot be negative')
+        delta = -abs(quantity) if movement == 'wastage' else quantity
+        reason = ' '.join(part for part in (line.get('reason'), line.get('notes')) if part) or None
+        parsed.append((item_id, STOCK_MOVEMENT_TYPES[movement], delta, unit_cost, reason))
+    return parsed
+
+def apply_stock_movements(cursor, lines, staff_id, receipt=None):
+    """Apply parsed lines set-wise (call inside BEGIN IMMEDIATE); returns {item_id: new stock} and the receipt id
+
+    One executemany for the stock updates and one for the ledger rows, whatever the batch size.
+    Receipt lines with a unit cost also become the item's cost price.
+    """
+    item_ids = sorted({line[0] for line in lines})
+    placeholders = ', '.join('?' * len(item_ids))
+    cursor.execute(f"SELECT id, name, stock, cost_price FROM menu_items WHERE id IN ({placeholders})", item_ids)
+    items = {row['id']: row for row in cursor.fetchall()}
+    missing = [str(item_id) for item_id in item_ids if item_id not in items]
+    if missing:
+        raise ValueError(f"Menu item(s) not found: {', '.join(missing)}")
+    
+    new_stock = {item_id: items[item_id]['stock'] for item_id in item_ids}
+    new_cost = {}
+    for item_id, transaction_type, delta, unit_cost, _ in lines:
+        new_stock[item_id] += delta
+        if transaction_type == 'purchase' and unit_cost is not None:
+            new_cost[item_id] = unit_cost
+    short = [f"{items[item_id]['name']} ({stock})" for item_id, stock in new_stock.items() if stock < 0]
+    if short:
+        raise ValueError(f"Stock cannot go below zero: {', '.join(short)}")
+    
+    # Ledger value at the line's unit cost, else the item's current cost price
+    costs = [unit_cost if unit_cost is not None else items[item_id]['cost_price'] or 0
+             for item_id, _, _, unit_cost, _ in lines]
+    
+    receipt_id = None
+    if receipt is not None:
+        cursor.execute("""
+            INSERT INTO stock_receipts (supplier, reference, notes, line_count, total_cost, staff_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            receipt.get('supplier'), receipt.get('reference'), receipt.get('notes'), len(lines),
+            sum(line[2] * cost for line, cost in zip(lines, costs) if line[1] == 'purchase'),
+            staff_id
+        ))
+        receipt_id = cursor.lastrowid
+    
+    cursor.executemany(
+        "UPDATE menu_items SET stock = stock + ?, cost_price = COALESCE(?, cost_price), updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        [(new_stock[item_id] - items[item_id]['stock'], new_cost.get(item_id), item_id) for item_id in item_ids]
+    )
+    cursor.executemany("""
+        INSERT INTO stock_transactions (menu_item_id, transaction_type, quantity, unit_price, total_amount, reference_id, staff_id, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (item_id, transaction_type, abs(delta) if transaction_type == 'wastage' else delta,
+         cost, abs(delta) * cost, receipt_id, staff_id, reason)
+        for (item_id, transaction_type, delta, _, reason), cost in zip(lines, costs)
+    ])
+    
+    mark_stock_changed(cursor, item_ids)
+    if any(cost != items[item_id]['cost_price'] for item_id, cost in new_cost.items()):
+        bump_menu_version(cursor)  # cost_price is part of the cached catalog
+    return new_stock, receipt_id
+
+# ==================== STOCK SNAPSHOTS ====================
+
+# Signed effect of a ledger row on menu_items.stock (sales and wastage are recorded as positive quantities)
+STOCK_DELTA_SQL = "CASE transaction_type WHEN 'sale' THEN -quantity WHEN 'wastage' THEN -ABS(quantity) ELSE quantity END"
+
+def utc_timestamp(moment):
+    """Aware datetime -> 'YYYY-MM-DD HH:MM:SS' UTC, the format CURRENT_TIMESTAMP writes"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_shop_timestamp(value):
+    """Shop-local 'YYYY-MM-DD' (start of day) or 'YYYY-MM-DDTHH:MM[:SS]' -> aware datetime"""
+    value = value.strip().replace(' ', 'T')
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=app.config['SHOP_TIMEZONE'])
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid timestamp: {value}')
+
+def get_latest_stock_snapshot(cursor):
+    cursor.execute("SELECT * FROM stock_snapshots ORDER BY id DESC LIMIT 1")
+    return cursor.fetchone()
+
+def ledger_deltas_since(cursor, last_transaction_id):
+    """{menu_item_id: stock delta} for ledger rows after a snapshot (a primary key range scan)"""
+    cursor.execute(f"""
+        SELECT menu_item_id, SUM({STOCK_DELTA_SQL}) AS delta
+        FROM stock_transactions
+        WHERE id > ?
+        GROUP BY menu_item_id
+    """, (last_transaction_id,))
+    return {row['menu_item_id']: row['delta'] for row in cursor.fetchall()}
+
+def take_stock_snapshot(cursor, note=None):
+    """Record every item's stock and cost (call inside a BEGIN IMMEDIATE transaction)
+
+    Also stores what the previous snapshot plus the ledger says the stock should be,
+    so drift is visible per snapshot.
+    """
+    previous = get_latest_stock_snapshot(cursor)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stock_transactions")
+    last_transaction_id = cursor.fetchone()[0]
+    
+    cursor.execute("""
+        INSERT INTO stock_snapshots (taken_at, last_transaction_id, note)
+        VALUES (?, ?, ?)
+    """, (utc_timestamp(shop_now()), last_transaction_id, note))
+    snapshot_id = cursor.lastrowid
+    
+    if previous:
+        cursor.execute(f"""
+            INSERT INTO stock_snapshot_items (snapshot_id, menu_item_id, stock, expected_stock, unit_cost)
+            SELECT ?, mi.id, mi.stock, COALESCE(p.stock, 0) + COALESCE(l.delta, 0), COALESCE(mi.cost_price, 0)
+            FROM menu_items mi
+            LEFT JOIN stock_snapshot_items p ON p.snapshot_id = ? AND p.menu_item_id = mi.id
+            LEFT JOIN (
+                SELECT menu_item_id, SUM({STOCK_DELTA_SQL}) AS delta
+                FROM stock_transactions
+                WHERE id > ?
+                GROUP BY menu_item_id
+            ) l ON l.menu_item_id = mi.id
+        """, (snapshot_id, previous['id'], previous['last_transaction_id']))
+    else:
+        cursor.execute("""
+            INSERT INTO stock_snapshot_items (snapshot_id, menu_item_id, stock, expected_stock, unit_cost)
+            SELECT ?, id, stock, NULL, COALESCE(cost_price, 0) FROM menu_items
+        """, (snapshot_id,))
+    
+    cursor.execute("""
+        UPDATE stock_snapshots SET
+            item_count = (SELECT COUNT(*) FROM stock_snapshot_items WHERE snapshot_id = ?),
+            total_value = (SELECT COALESCE(SUM(stock * unit_cost), 0) FROM stock_snapshot_items WHERE snapshot_id = ?),
+            drift_items = (SELECT COUNT(*) FROM stock_snapshot_items WHERE snapshot_id = ? AND expected_stock != stock)
+        WHERE id = ?
+    """, (snapshot_id, snapshot_id, snapshot_id, snapshot_id))
+    
+    cursor.execute("SELECT * FROM stock_snapshots WHERE id = ?", (snapshot_id,))
+    return dict(cursor.fetchone())
+
+def stock_at(cursor, moment):
+    """Per-item stock and cost value at a moment, replayed from the nearest snapshot
+
+    Forward from the last snapshot before `moment`, or backward from the first one after it,
+    whichever is closer, so the ledger scanned is bounded by the distance to that snapshot.
+    Returns (items, snapshot dict with 'direction', or None if there are no snapshots at all).
+    """
+    at = utc_timestamp(moment)
+    cursor.execute("SELECT * FROM stock_snapshots WHERE taken_at <= ? ORDER BY taken_at DESC, id DESC LIMIT 1", (at,))
+    before = cursor.fetchone()
+    cursor.execute("SELECT * FROM stock_snapshots WHERE taken_at > ? ORDER BY taken_at, id LIMIT 1", (at,))
+    after = cursor.fetchone()
+    
+    def taken_at(snapshot):
+        return datetime.strptime(snapshot['taken_at'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    
+    def distance(snapshot):
+        return abs((taken_at(snapshot) - moment).total_seconds())
+    
+    if before and (not after or distance(before) <= distance(after)):
+        snapshot, direction, sign = before, 'forward', ''
+        where = "transaction_date >= ? AND transaction_date <= ? AND id > ?"
+        params = (snapshot['taken_at'], at, snapshot['last_transaction_id'])
+        span = (taken_at(snapshot).timestamp(), moment.timestamp() + 1)
+    elif after:
+        snapshot, direction, sign = after, 'backward', '-'
+        where = "transaction_date > ? AND transaction_date <= ? AND id <= ?"
+        params = (at, snapshot['taken_at'], snapshot['last_transaction_id'])
+        span = (moment.timestamp(), taken_at(snapshot).timestamp() + 1)
+    else:
+        # No snapshot yet: the whole ledger up to the moment
+        snapshot, direction, sign = None, 'ledger', ''
+        where = "transaction_date <= ?"
+        params = (at,)
+        span = (-2 ** 62, moment.timestamp() + 1)
+    
+    # Old ledger rows may have been archived; only the years the replay crosses get attached
+    deltas = {}
+    for tables in sales_partitions(cursor.connection, *span):
+        cursor.execute(f"""
+            SELECT menu_item_id, {sign}SUM({STOCK_DELTA_SQL}) AS delta
+            FROM {tables['stock_transactions']}
+            WHERE {where}
+            GROUP BY menu_item_id
+        """, params)
+        for row in cursor.fetchall():
+            deltas[row['menu_item_id']] = deltas.get(row['menu_item_id'], 0) + row['delta']
+    
+    cursor.execute("""
+        SELECT mi.id, mi.name, c.display_name AS category, si.stock AS base_stock,
+               COALESCE(si.unit_cost, mi.cost_price, 0) AS unit_cost
+        FROM menu_items mi
+        LEFT JOIN categories c ON mi.category_id = c.id
+        LEFT JOIN stock_snapshot_items si ON si.snapshot_id = ? AND si.menu_item_id = mi.id
+        ORDER BY c.sort_order, mi.name
+    """, (snapshot['id'] if snapshot else None,))
+    
+    items = []
+    for row in cursor.fetchall():
+        stock = (row['base_stock'] or 0) + deltas.get(row['id'], 0)
+        if row['base_stock'] is None and row['id'] not in deltas:
+            continue  # item did not exist (or had no stock history) at that moment
+        items.append({
+            'id': row['id'],
+            'name': row['name'],
+            'category': row['category'],
+            'stock': stock,
+            'unit_cost': row['unit_cost'],
+            'value': stock * row['unit_cost']
+        })
+    
+    if snapshot:
+        snapshot = dict(snapshot)
+        snapshot['direction'] = direction
+    return items, snapshot
+
+def reconcile_stock(cursor):
+    """Items whose menu_items.stock differs from latest snapshot + ledger since (bounded by that ledger tail)"""
+    snapshot = get_latest_stock_snapshot(cursor)
+    if not snapshot:
+        return None, []
+    deltas = ledger_deltas_since(cursor, snapshot['last_transaction_id'])
+    cursor.execute("""
+        SELECT mi.id, mi.name, mi.stock, si.stock AS snapshot_stock
+        FROM menu_items mi
+        LEFT JOIN stock_snapshot_items si ON si.snapshot_id = ? AND si.menu_item_id = mi.id
+    """, (snapshot['id'],))
+    drift = []
+    for row in cursor.fetchall():
+        expected = (row['snapshot_stock'] or 0) + deltas.get(row['id'], 0)
+        if row['stock'] != expected:
+            drift.append({
+                'id': row['id'],
+                'name': row['name'],
+                'stock': row['stock'],
+                'expected_stock': expected,
+                'drift': row['stock'] - expected
+            })
+    return dict(snapshot), drift
+
+@app.cli.command('stock-snapshot')
+@click.option('--note', default='Daily close', show_default=True)
+def stock_snapshot_command(note):
+    """Snapshot every item's stock and cost (run daily at close, e.g. from cron)"""
+    conn = get_pool().connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        snapshot = take_stock_snapshot(conn.cursor(), note)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"✅ Snapshot {snapshot['id']}: {snapshot['item_count']} items, value {snapshot['total_value']:,} Ks, "
+          f"{snapshot['drift_items']} drifted since the previous snapshot")
+
+@app.cli.command('reconcile-stock')
+def reconcile_stock_command():
+    """Fail if menu_items.stock differs from the latest snapshot plus the ledger since"""
+    conn = get_pool().connect()
+    try:
+        snapshot, drift = reconcile_stock(conn.cursor())
+    finally:
+        conn.close()
+    if snapshot is None:
+        print("⚠️ No stock snapshot yet; run flask stock-snapshot first")
+        raise SystemExit(1)
+    for item in drift:
+        print(f"❌ #{item['id']} {item['name']}: stock {item['stock']}, expected {item['expected_stock']} ({item['drift']:+d})")
+    if drift:
+        raise SystemExit(1)
+    print(f"✅ Stock matches snapshot {snapshot['id']} ({snapshot['taken_at']} UTC) plus ledger")
+
+# ==================== SALES ARCHIVE ====================
+
+# Closed sales (with their line items) and stock ledger rows older than a cutoff move out of the hot
+# database into one SQLite file per shop-local year. Rollups stay in the hot database, so dashboards and
+# monthly reports never touch the archive; queries over raw rows go through sales_partitions(), which
+# attaches only the years a date range needs, one at a time.
+ARCHIVED_TABLES = ('sales', 'sale_items', 'stock_transactions')
+ARCHIVE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sales_history "
+    "ON sales (sold_at, id, payment_status, payment_method, total_amount, room_id, staff_id, bill_number)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sale_items_sale ON sale_items (sale_id)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_stock_transactions_date ON stock_transactions (transaction_date)",
+)
+CLOSED_SALE_SQL = "COALESCE(payment_status, 'paid') != 'pending'"
+MAIN_TABLES = {table: 'main.' + table for table in ARCHIVED_TABLES}
+
+def archive_path(year):
+    return os.path.join(app.config['ARCHIVE_DIR'] or app.config['DATABASE'] + '-archive', f"sales_{year}.db")
+
+def archive_boundary(cursor):
+    """Epoch before which closed sales and ledger rows live in the archive (0 if nothing is archived)"""
+    cursor.execute("SELECT COALESCE(MAX(archived_before), 0) FROM archive_partitions")
+    return cursor.fetchone()[0]
+
+def epoch_to_utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def shop_year(epoch):
+    return datetime.fromtimestamp(epoch, app.config['SHOP_TIMEZONE']).year
+
+def shop_year_bounds(year):
+    return shop_day_bounds(date(year, 1, 1), date(year, 12, 31))
+
+def archive_years(cursor, start, end):
+    """Archived years holding rows in [start, end) epochs, oldest first"""
+    boundary = archive_boundary(cursor)
+    if start >= boundary:
+        return [], boundary
+    cursor.execute("SELECT year FROM archive_partitions ORDER BY year")
+    years = []
+    for row in cursor.fetchall():
+        year_start, year_end = shop_year_bounds(row['year'])
+        if year_start < min(end, boundary) and year_end > start:
+            years.append(row['year'])
+    return years, boundary
+
+def sync_archive_schema(conn, schema):
+    """Create (or add missing columns to) the archived tables in an attached year file"""
+    for table in ARCHIVED_TABLES:
+        columns = conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+        existing = {row['name'] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+        definitions = []
+        for column in columns:
+            definition = f"{column['name']} {column['type']}"
+            if column['pk']:
+                definition += ' PRIMARY KEY'
+            elif column['dflt_value'] is not None:
+                definition += f" DEFAULT {column['dflt_value']}"
+            definitions.append((column['name'], definition))
+        if not existing:
+            conn.execute(f"CREATE TABLE {schema}.{table} ({', '.join(d for _, d in definitions)})")
+            continue
+        for name, definition in definitions:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {definition}")
+    for sql in ARCHIVE_INDEXES:
+        conn.execute(sql.format(schema=schema))
+
+@contextmanager
+def attached_archive(conn, year, create=False):
+    """Attach one year file for the duration of the block (outside any transaction)"""
+    path = archive_path(year)
+    if not create and not os.path.exists(path):
+        raise FileNotFoundError(f'Archive partition for {year} is missing: {path}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    schema = f"archive_{year}"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+    try:
+        sync_archive_schema(conn, schema)
+        yield schema
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"DETACH DATABASE {schema}")
+
+def archived_row_exists(conn, table, column, value):
+    """Whether any archived year holds a row of table with column = value; attaches the years one at a time"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT year FROM archive_partitions ORDER BY year DESC")
+    for row in cursor.fetchall():
+        with attached_archive(conn, row['year']) as schema:
+            if conn.execute(f"SELECT 1 FROM {schema}.{table} WHERE {column} = ? LIMIT 1", (value,)).fetchone():
+                return True
+    return False
+
+def archive_tables(schema, boundary):
+    """FROM-clause sources for one year file; rows at or past the boundary are copies from an unfinished run"""
+    return {
+        'sales': f"(SELECT * FROM {schema}.sales WHERE sold_at < {int(boundary)})",
+        'sale_items': f"{schema}.sale_items",
+        'stock_transactions': f"(SELECT * FROM {schema}.stock_transactions WHERE transaction_date < '{epoch_to_utc(boundary)}')",
+    }
+
+def sales_partitions(conn, start, end):
+    """Yield table sources (oldest first, hot database last) covering [start, end) epochs
+
+    Each source maps 'sales', 'sale_items' and 'stock_transactions' to a FROM-clause expression.
+    Archive years are attached one at a time, only while their source is in use, so a range over
+    any number of years stays under SQLite's attached database limit: run each source's query
+    before moving on, and iterate to the end so the last year is detached.
+    """
+    years, boundary = archive_years(conn.cursor(), start, end)
+    for year in years:
+        with attached_archive(conn, year) as schema:
+            yield archive_tables(schema, boundary)
+    yield MAIN_TABLES
+
+def archive_sales(conn, cutoff_day):
+    """Move closed sales, their line items and stock ledger rows from before cutoff_day into the year files
+
+    Each year is copied and committed into its file first; the hot rows are then deleted and the
+    boundary raised in one transaction. Readers ignore archived rows past the boundary, so an
+    interrupted run never shows a row twice and can simply be run again.
+    Returns [(year, sales, sale items, ledger rows)] moved.
+    """
+    cursor = conn.cursor()
+    cutoff, _ = shop_day_bounds(cutoff_day)
+    if cutoff > today_bounds()[0]:
+        raise ValueError('Cutoff must not be after today')
+    if cutoff <= archive_boundary(cursor):
+        return []
+    ledger_cutoff = epoch_to_utc(cutoff)
+    snapshot = get_latest_stock_snapshot(cursor)
+    if snapshot and snapshot['taken_at'] < ledger_cutoff:
+        # Snapshot drift checks replay the ledger after the latest snapshot from the hot database
+        raise ValueError(f"Cutoff is after the latest stock snapshot ({snapshot['taken_at']} UTC); take a snapshot first")
+    
+    cursor.execute(f"SELECT MIN(sold_at) FROM sales WHERE sold_at < ? AND {CLOSED_SALE_SQL}", (cutoff,))
+    first_sale = cursor.fetchone()[0]
+    cursor.execute("SELECT MIN(transaction_date) FROM stock_transactions WHERE transaction_date < ?", (ledger_cutoff,))
+    first_ledger = cursor.fetchone()[0]
+    firsts = [shop_year(first_sale)] if first_sale is not None else []
+    if first_ledger:
+        firsts.append(datetime.strptime(first_ledger[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+                      .astimezone(app.config['SHOP_TIMEZONE']).year)
+    if not firsts:
+        return []
+    
+    moved = []
+    for year in range(min(firsts), shop_year(cutoff - 1) + 1):
+        year_start, year_end = shop_year_bounds(year)
+        lo, hi = year_start, min(year_end, cutoff)
+        with attached_archive(conn, year, create=True) as schema:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                counts = [year]
+                for table, where, params in (
+                    ('sales', f"sold_at >= ? AND sold_at < ? AND {CLOSED_SALE_SQL}", (lo, hi)),
+                    ('sale_items', f"sale_id IN (SELECT id FROM main.sales WHERE sold_at >= ? AND sold_at < ? AND {CLOSED_SALE_SQL})", (lo, hi)),
+                    ('stock_transactions', "transaction_date >= ? AND transaction_date < ?", (epoch_to_utc(lo), epoch_to_utc(hi))),
+                ):
+                    columns = ', '.join(row['name'] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                    cursor.execute(f"""
+                        INSERT OR REPLACE INTO {schema}.{table} ({columns})
+                        SELECT {columns} FROM main.{table} WHERE {where}
+                    """, params)
+                    counts.append(cursor.rowcount)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        moved.append(tuple(counts))
+    
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(f"DELETE FROM sale_items WHERE sale_id IN (SELECT id FROM sales WHERE sold_at < ? AND {CLOSED_SALE_SQL})", (cutoff,))
+        cursor.execute(f"DELETE FROM sales WHERE sold_at < ? AND {CLOSED_SALE_SQL}", (cutoff,))
+        cursor.execute("DELETE FROM stock_transactions WHERE transaction_date < ?", (ledger_cutoff,))
+        cursor.executemany("""
+            INSERT INTO archive_partitions (year, sales_count, sale_item_count, ledger_count, archived_before)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (year) DO UPDATE SET
+                sales_count = sales_count + excluded.sales_count,
+                sale_item_count = sale_item_count + excluded.sale_item_count,
+                ledger_count = ledger_count + excluded.ledger_count,
+                archived_before = excluded.archived_before,
+                archived_at = CURRENT_TIMESTAMP
+        """, [counts + (cutoff,) for counts in moved])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return moved
+
+@app.cli.command('archive-sales')
+@click.option('--before', 'cutoff', required=True, help='Archive closed sales and ledger rows before this shop-local day (YYYY-MM-DD)')
+@click.option('--vacuum', is_flag=True, help='VACUUM the hot database afterwards to give the space back')
+def archive_sales_command(cutoff, vacuum):
+    """Move old sales and stock ledger rows into per-year archive databases"""
+    cutoff_day = datetime.strptime(cutoff, '%Y-%m-%d').date()
+    conn = get_pool().connect()
+    try:
+        moved = archive_sales(conn, cutoff_day)
+        if vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    for year, sales, sale_items, ledger in moved:
+        print(f"✅ {year}: {sales} sales, {sale_items} sale items, {ledger} ledger rows -> {archive_path(year)}")
+    if not moved:
+        print(f"Nothing to archive before {cutoff_day}")
+
+# ==================== SALES HISTORY ====================
+
+SALES_HISTORY_FILTERS = {
+    # query arg: (condition on the sales table, converter)
+    'room_id': ('room_id = ?', int),
+    'staff_id': ('staff_id = ?', int),
+    'payment_method': ('payment_method = ?', str),
+    'payment_status': ('payment_status = ?', str),
+    'min_total': ('total_amount >= ?', int),
+    'max_total': ('total_amount <= ?', int),
+}
+SALES_HISTORY_MAX_LIMIT = 200
+
+SALES_HISTORY_SQL = """
+    SELECT s.id, s.bill_number, s.sold_at, s.sale_date, s.sale_time, s.room_id, r.room_name,
+           s.staff_id, u.full_name AS staff_name, s.customer_count, s.subtotal, s.tax_amount,
+           s.service_charge, s.discount, s.total_amount, s.payment_method, s.payment_status, s.notes
+    FROM (
+        SELECT id FROM {sales}
+        WHERE {where}
+        ORDER BY sold_at DESC, id DESC
+        LIMIT ?
+    ) page
+    JOIN {sales} s ON s.id = page.id
+    LEFT JOIN rooms r ON s.room_id = r.id
+    LEFT JOIN users u ON s.staff_id = u.id
+    ORDER BY s.sold_at DESC, s.id DESC
+"""
+
+def parse_sales_filters(args):
+    """Query args -> {'start', 'end', 'before', 'conditions', 'params'}; raises ValueError on bad input
+
+    start/end are shop-local days (YYYY-MM-DD), bill is a bill number prefix and before is the
+    next_cursor of the previous page.
+    """
+    filters = {'start': None, 'end': None, 'before': None, 'conditions': [], 'params': []}
+    if args.get('start') or args.get('end'):
+        filters['start'], filters['end'] = shop_day_bounds(*parse_export_range(args.get('start'), args.get('end')))
+        filters['conditions'].append('sold_at >= ? AND sold_at < ?')
+        filters['params'].extend((filters['start'], filters['end']))
+    for name, (condition, convert) in SALES_HISTORY_FILTERS.items():
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            filters['params'].append(convert(value))
+        except ValueError as e:
+            raise ValueError(f'Invalid {name}: {value}') from e
+        filters['conditions'].append(condition)
+    bill = (args.get('bill') or '').strip().upper()
+    if bill:
+        filters['conditions'].append('substr(bill_number, 1, ?) = ?')
+        filters['params'].extend((len(bill), bill))
+    if args.get('before'):
+        try:
+            sold_at, sale_id = (int(part) for part in args['before'].split(':'))
+        except ValueError as e:
+            raise ValueError('Invalid cursor') from e
+        filters['before'] = (sold_at, sale_id)
+        filters['conditions'].append('sold_at <= ? AND (sold_at < ? OR id < ?)')
+        filters['params'].extend((sold_at, sold_at, sale_id))
+    return filters
+
+def sales_history_page(conn, filters, limit=50):
+    """One page of sales, newest first; returns (sales, next cursor or None)
+
+    Pages are keyset cursors on (sold_at, id), so any page costs one index range walk. The hot
+    database is read first; archive years are attached one at a time, newest first, and only while
+    rows from them could still land on the page.
+    """
+    cursor = conn.cursor()
+    start = filters['start'] or 0
+    end = filters['end'] if filters['end'] is not None else float('inf')
+    if filters['before']:
+        end = min(end, filters['before'][0] + 1)
+    years, boundary = archive_years(cursor, start, end)
+    where = ' AND '.join(filters['conditions']) or '1'
+    params = tuple(filters['params']) + (limit + 1,)
+    
+    def read(tables):
+        cursor.execute(SALES_HISTORY_SQL.format(where=where, **tables), params)
+        rows.extend(dict(row) for row in cursor.fetchall())
+        rows.sort(key=lambda row: (row['sold_at'], row['id']), reverse=True)
+        del rows[limit + 1:]
+    
+    rows = []
+    read(MAIN_TABLES)
+    for year in years[::-1]:
+        # Everything in this year file is older than both its year end and the boundary
+        if len(rows) > limit and rows[limit]['sold_at'] >= min(shop_year_bounds(year)[1], boundary):
+            break
+        # Detached again before the next year, so any number of years stays under SQLite's attach limit
+        with attached_archive(conn, year) as schema:
+            read(archive_tables(schema, boundary))
+    
+    next_cursor = None
+    if len(rows) > limit:
+        del rows[limit:]
+        next_cursor = f"{rows[-1]['sold_at']}:{rows[-1]['id']}"
+    return rows, next_cursor
+
+def find_sale(conn, sale_id):
+    """A sale with its line items from the hot database or whichever archive year holds it, else None"""
+    cursor = conn.cursor()
+    sale_sql = """
+        SELECT s.*, r.room_name, u.full_name AS staff_name FROM {sales} s
+        LEFT JOIN rooms r ON s.room_id = r.id
+        LEFT JOIN users u ON s.staff_id = u.id
+        WHERE s.id = ?
+    """
+    items_sql = """
+        SELECT id, menu_item_id, item_name, quantity, unit_price, total_price, unit_cost
+        FROM {sale_items} WHERE sale_id = ? ORDER BY id
+    """
+    
+    def read(tables):
+        cursor.execute(sale_sql.format(**tables), (sale_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        sale = dict(row)
+        cursor.execute(items_sql.format(**tables), (sale_id,))
+        sale['items'] = [dict(item) for item in cursor.fetchall()]
+        return sale
+    
+    sale = read(MAIN_TABLES)
+    if sale is not None:
+        return sale
+    boundary = archive_boundary(cursor)
+    cursor.execute("SELECT year FROM archive_partitions ORDER BY year DESC")
+    for year in [row['year'] for row in cursor.fetchall()]:
+        with attached_archive(conn, year) as schema:
+            sale = read(archive_tables(schema, boundary))
+        if sale is not None:
+            return sale
+    return None
+
+# ==================== STATIC ASSETS ====================
+
+# Bundle name -> files under static/ concatenated (in order) into one fingerprinted file
+ASSET_BUNDLES = {
+    'base.css': ['css/base.css'],
+    'base.js': ['js/utils.js', 'js/base.js'],
+    'dashboard.css': ['css/dashboard.css'],
+    'dashboard.js': ['js/dashboard.js'],
+    'login.css': ['css/login.css'],
+    'login.js': ['js/login.js'],
+    'menu.css': ['css/menu.css'],
+    'menu.js': ['js/menu.js'],
+    'reports.css': ['css/reports.css'],
+    'reports.js': ['js/reports.js'],
+    'rooms.css': ['css/style.css', 'css/rooms.css'],
+    'rooms.js': ['js/events.js', 'js/rooms.js'],
+    'sale.css': ['css/style.css', 'css/sale.css', 'css/index.css'],
+    'sale.js': ['js/events.js', 'js/sale.js'],
+    'stocks.css': ['css/stocks.css'],
+    'stocks.js': ['js/stocks.js'],
+    'fontawesome.css': ['vendor/fontawesome/css/all.min.css'],
+    'noto-sans-myanmar.css': ['vendor/noto-sans-myanmar/noto-sans-myanmar.css'],
+    'sweetalert2.js': ['vendor/sweetalert2/sweetalert2.all.min.js'],
+    'chart.js': ['vendor/chartjs/chart.umd.js'],
+}
+
+# Third-party files served from static/vendor: file -> where `flask vendor-assets` fetches it from.
+# Until a file has been fetched, pages link this URL instead.
+VENDOR_ASSETS = {
+    'vendor/fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    'vendor/noto-sans-myanmar/noto-sans-myanmar.css':
+        'https://fonts.googleapis.com/css2?family=Noto+Sans+Myanmar:wght@300;400;500;600;700&display=swap',
+    'vendor/sweetalert2/sweetalert2.all.min.js': 'https://cdn.jsdelivr.net/npm/sweetalert2@11/dist/sweetalert2.all.min.js',
+    'vendor/chartjs/chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4/dist/chart.umd.js',
+}
+
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+# Google Fonts only serves woff2 to browsers it recognizes
+VENDOR_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+_asset_manifest = {}
+
+def asset_dist_dir():
+    return os.path.join(app.static_folder, app.config['ASSET_DIST_FOLDER'])
+
+def static_file_exists(filename):
+    return os.path.isfile(os.path.join(app.static_folder, filename))
+
+def load_asset_manifest():
+    """Read dist/manifest.json (bundle name -> fingerprinted file); returns the number of bundles"""
+    try:
+        with open(os.path.join(asset_dist_dir(), 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    _asset_manifest.clear()
+    _asset_manifest.update(manifest)
+    return len(manifest)
+
+@app.template_global()
+def asset_url(filename):
+    """url_for('static', filename=...) that resolves bundle names to their fingerprinted build"""
+    if filename in _asset_manifest and not app.debug:
+        return url_for('static', filename=_asset_manifest[filename])
+    return url_for('static', filename=filename)
+
+@app.template_global()
+def asset_tags(name):
+    """<link>/<script> tags for a bundle: its built file, else (debug or not built) each source file"""
+    if name in _asset_manifest and not app.debug:
+        urls = [asset_url(name)]
+    else:
+        urls = [
+            url_for('static', filename=source) if static_file_exists(source) else VENDOR_ASSETS[source]
+            for source in ASSET_BUNDLES[name]
+        ]
+    tag = '<link rel="stylesheet" href="{}">' if name.endswith('.css') else '<script src="{}"></script>'
+    return Markup('\n'.join(tag.format(escape(url)) for url in urls))
+
+def absolutize_css_urls(css, source):
+    """Rewrite relative url()s in a stylesheet from static/<source> so they still resolve from dist/"""
+    def rewrite(match):
+        ref = match.group(2).strip()
+        if ref.startswith(('data:', '/', '#')) or urlparse(ref).scheme:
+            return match.group(0)
+        path = os.path.normpath(os.path.join(os.path.dirname(source), ref)).replace(os.sep, '/')
+        return f"url({app.static_url_path}/{path})"
+    return CSS_URL_PATTERN.sub(rewrite, css)
+
+def build_assets():
+    """Concatenate, minify, fingerprint and precompress every bundle into dist/
+
+    Returns (manifest, bundles skipped because a vendor file has not been fetched). Files from
+    earlier builds that the new manifest no longer references are removed.
+    """
+    dist = asset_dist_dir()
+    os.makedirs(dist, exist_ok=True)
+    manifest, skipped = {}, []
+    for name, sources in ASSET_BUNDLES.items():
+        if not all(static_file_exists(source) for source in sources):
+            skipped.append(name)
+            continue
+        is_css = name.endswith('.css')
+        parts = []
+        for source in sources:
+            with open(os.path.join(app.static_folder, source), encoding='utf-8') as f:
+                text = f.read()
+            if is_css:
+                text = absolutize_css_urls(text, source)
+            if '.min.' not in source:
+                if is_css and rcssmin:
+                    text = rcssmin.cssmin(text)
+                elif not is_css and rjsmin:
+                    text = rjsmin.jsmin(text)
+            parts.append(text)
+        content = ('\n' if is_css else ';\n').join(parts).encode('utf-8')
+        
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as f:
+            f.write(content)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+        manifest[name] = f"{app.config['ASSET_DIST_FOLDER']}/{filename}"
+    
+    with open(os.path.join(dist, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    keep = {os.path.basename(path) for path in manifest.values()}
+    for filename in os.listdir(dist):
+        built = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if filename != 'manifest.json' and built not in keep:
+            os.remove(os.path.join(dist, filename))
+    load_asset_manifest()
+    return manifest, skipped
+
+def fetch_vendor_asset(filename, url):
+    """Download one vendor file into static/; returns the files written
+
+    Stylesheets also get the fonts they reference, with the url()s rewritten to the local copies.
+    """
+    def download(source_url):
+        with urlopen(Request(source_url, headers={'User-Agent': VENDOR_USER_AGENT}), timeout=60) as response:
+            return response.read()
+    
+    target = os.path.join(app.static_folder, filename)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    written = [filename]
+    data = download(url)
+    if filename.endswith('.css'):
+        fetched = {}
+        
+        def localize(match):
+            ref = match.group(2).strip()
+            if ref.startswith('data:'):
+                return match.group(0)
+            absolute = urljoin(url, ref)
+            if urlparse(ref).scheme or ref.startswith('/'):
+                local_ref = os.path.basename(urlparse(absolute).path)  # other host (fonts.gstatic.com): keep beside the CSS
+            else:
+                local_ref = ref.split('?')[0].split('#')[0]
+            if absolute not in fetched:
+                local_path = os.path.normpath(os.path.join(os.path.dirname(target), local_ref))
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                with open(local_path, 'wb') as f:
+                    f.write(download(absolute))
+                fetched[absolute] = os.path.relpath(local_path, app.static_folder)
+            return f"url({local_ref})"
+        
+        data = CSS_URL_PATTERN.sub(localize, data.decode('utf-8')).encode('utf-8')
+        written.extend(sorted(set(fetched.values())))
+    with open(target, 'wb') as f:
+        f.write(data)
+    return written
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    """Built bundle, precompressed when the browser accepts it; the name changes with the content, so cache forever"""
+    dist = asset_dist_dir()
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Build fingerprinted, minified and precompressed CSS/JS bundles into static/dist"""
+    manifest, skipped = build_assets()
+    for name, path in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(app.static_folder, path))
+        print(f"✅ {name} -> {path} ({size:,} bytes)")
+    for name in skipped:
+        print(f"⚠️ {name}: vendor file missing, pages keep using the CDN (run flask vendor-assets)")
+    if rjsmin is None or brotli is None:
+        print("⚠️ Install rjsmin, rcssmin and Brotli for minified bundles and .br variants")
+
+@app.cli.command('vendor-assets')
+@click.option('--force', is_flag=True, help='Download again even if the file is already vendored')
+def vendor_assets_command(force):
+    """Download Font Awesome, SweetAlert2, Chart.js and Noto Sans Myanmar into static/vendor"""
+    for filename, url in VENDOR_ASSETS.items():
+        if static_file_exists(filename) and not force:
+            print(f"✔ {filename} (already vendored)")
+            continue
+        for path in fetch_vendor_asset(filename, url):
+            print(f"✅ {path}")
+    print("Run flask build-assets to bundle them")
+
+# ==================== ROUTES ====================
+
+@app.route('/')
 @login_required
 def index():
     return redirect(url_for('dashboard'))
@@ -359,7 +3779,6 @@ def login():
         cursor.execute("SELECT * FROM users WHERE username = ? AND password_hash = ?",
                       (username, password_hash))
         user = cursor.fetchone()
-        conn.close()
         
         if user:
             user_obj = User(dict(user))
@@ -368,6 +3787,7 @@ def login():
             session['username'] = user['username']
             session['full_name'] = user['full_name']
             session['role'] = user['role']
+            session['users_version'] = current_users_version()
             
             flash('လော့ဂ်အင် အောင်မြင်ပါသည်။', 'success')
             return redirect(url_for('dashboard'))
@@ -393,27 +3813,7 @@ def dashboard():
     conn = get_db()
     cursor = conn.cursor()
     
-    # Get today's sales
-    cursor.execute("""
-        SELECT COALESCE(SUM(total_amount), 0) as total_sales FROM sales
-        WHERE DATE(sale_date) = DATE('now')
-    """)
-    today_sales = cursor.fetchone()[0]
-    
-    # Get total rooms
-    cursor.execute("SELECT COUNT(*) FROM rooms")
-    total_rooms = cursor.fetchone()[0]
-    
-    # Get occupied rooms
-    cursor.execute("SELECT COUNT(*) FROM rooms WHERE status = 'occupied'")
-    occupied_rooms = cursor.fetchone()[0]
-    
-    # Get low stock items
-    cursor.execute("""
-        SELECT COUNT(*) FROM menu_items
-        WHERE stock <= min_stock AND status = 'active'
-    """)
-    low_stock_items = cursor.fetchone()[0]
+    stats = get_dashboard_stats(cursor)
     
     # Get recent sales
     cursor.execute("""
@@ -421,18 +3821,16 @@ def dashboard():
         FROM sales s
         LEFT JOIN rooms r ON s.room_id = r.id
         LEFT JOIN users u ON s.staff_id = u.id
-        ORDER BY s.sale_date DESC, s.sale_time DESC
+        ORDER BY s.sold_at DESC, s.id DESC
         LIMIT 10
     """)
     recent_sales = cursor.fetchall()
     
-    conn.close()
-    
     return render_template('dashboard.html',
-                         today_sales=today_sales,
-                         total_rooms=total_rooms,
-                         occupied_rooms=occupied_rooms,
-                         low_stock_items=low_stock_items,
+                         today_sales=stats['today_sales'],
+                         total_rooms=stats['total_rooms'],
+                         occupied_rooms=stats['occupied_rooms'],
+                         low_stock_items=stats['low_stock_items'],
                          recent_sales=recent_sales)
 
 #=========== SALE ROUTES ==========
@@ -465,8 +3863,6 @@ def sale():
     cursor.execute("SELECT * FROM categories ORDER BY sort_order")
     categories = cursor.fetchall()
     
-    conn.close()
-    
     # Get current datetime for template
     current_datetime = {
         'date': datetime.now().strftime('%d-%m-%Y'),
@@ -477,7 +3873,8 @@ def sale():
                          categories=categories,
                          selected_room=selected_room,
                          room_id=room_id,
-                         current_datetime=current_datetime)
+                         current_datetime=current_datetime,
+                         bootstrap=get_sale_bootstrap(cursor, selected_room))
 
 #=========== ROOMS ROUTES ==========
 
@@ -487,17 +3884,10 @@ def rooms():
     conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM rooms ORDER BY room_number")
-    rooms = cursor.fetchall()
-    
-    # Get pending orders count for each room
-    room_orders = {}
-    for room in rooms:
-        cursor.execute("SELECT COUNT(*) FROM room_orders WHERE room_id = ? AND status = 'pending'", (room['id'],))
-        pending_orders = cursor.fetchone()[0]
-        room_orders[room['id']] = pending_orders
+    rooms = get_room_board(cursor)
     
-    conn.close()
+    # Pending orders count for each room
+    room_orders = {room['id']: room['pending_orders'] for room in rooms}
     
     return render_template('rooms.html', rooms=rooms, room_orders=room_orders)
 
@@ -505,13 +3895,12 @@ def rooms():
 @login_required
 def select_room(room_id):
     """Select a room and redirect to sale page"""
-    print(f"DEBUG: Selecting room {room_id}")
+    app.logger.debug("Selecting room %s", room_id)
     
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM rooms WHERE id = ?", (room_id,))
     room = cursor.fetchone()
-    conn.close()
     
     if room:
         # Store room info in session
@@ -519,7 +3908,7 @@ def select_room(room_id):
         session['current_room_name'] = room['room_name']
         session['current_room_number'] = room['room_number']
         
-        print(f"DEBUG: Session set - room_id: {room_id}, room_name: {room['room_name']}")
+        app.logger.debug("Session set - room_id: %s, room_name: %s", room_id, room['room_name'])
         
         flash(f'"{room["room_name"]}" အခန်းကို ရွေးချယ်ပြီးပါပြီ', 'success')
         
@@ -557,8 +3946,9 @@ def api_update_room(room_id):
             room_id
         ))
         
+        emit_room_status(cursor, room_id, data.get('status'))
+        
         conn.commit()
-        conn.close()
         
         return jsonify({'success': True, 'message': 'Room updated successfully'})
         
@@ -580,21 +3970,22 @@ def api_delete_room(room_id):
         if pending_orders > 0:
             return jsonify({'success': False, 'error': 'Cannot delete room with pending orders'})
         
-        # Check if room has sales history
+        # Check if room has sales history, archived years included
         cursor.execute("SELECT COUNT(*) FROM sales WHERE room_id = ?", (room_id,))
         sales_history = cursor.fetchone()[0]
         
-        if sales_history > 0:
+        if sales_history > 0 or archived_row_exists(conn, 'sales', 'room_id', room_id):
             # Soft delete - mark as inactive instead
-            cursor.execute("UPDATE rooms SET status = 'inactive', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (room_id,))
+            cursor.execute("UPDATE rooms SET status = 'inactive' WHERE id = ?", (room_id,))
             message = 'Room marked as inactive (has sales history)'
         else:
             # Hard delete
             cursor.execute("DELETE FROM rooms WHERE id = ?", (room_id,))
             message = 'Room deleted successfully'
         
+        emit_event(cursor, 'rooms', {'room_id': room_id})
+        
         conn.commit()
-        conn.close()
         
         return jsonify({'success': True, 'message': message})
         
@@ -631,8 +4022,9 @@ def api_create_room():
         
         room_id = cursor.lastrowid
         
+        emit_event(cursor, 'rooms', {'room_id': room_id})
+        
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True, 
@@ -652,22 +4044,11 @@ def menu():
     conn = get_db()
     cursor = conn.cursor()
     
-    # Get all menu items with category info
-    cursor.execute("""
-        SELECT mi.*, c.name as category_name, c.display_name as category_display
-        FROM menu_items mi
-        LEFT JOIN categories c ON mi.category_id = c.id
-        ORDER BY c.sort_order, mi.name
-    """)
-    items = cursor.fetchall()
-    
-    # Get all categories
+    # Items are loaded page by page from /api/menu_search
     cursor.execute("SELECT * FROM categories WHERE name != 'all' ORDER BY sort_order")
     categories = cursor.fetchall()
     
-    conn.close()
-    
-    return render_template('menu.html', items=items, categories=categories)
+    return render_template('menu.html', categories=categories)
 
 # ==================== MENU MANAGEMENT APIs ====================
 
@@ -717,8 +4098,10 @@ def add_menu_item():
                 current_user.id, 'Initial stock'
             ))
         
+        bump_menu_version(cursor)
+        mark_stock_changed(cursor, [item_id])
+        
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -786,8 +4169,11 @@ def update_menu_item():
                 f'Manual adjustment from {current_stock} to {new_stock}'
             ))
         
+        bump_menu_version(cursor)
+        if stock_difference != 0:
+            mark_stock_changed(cursor, [data['item_id']])
+        
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -808,10 +4194,11 @@ def delete_item(item_id):
         # First check if item exists in any pending orders
         cursor.execute("""
             SELECT ro.id, ro.room_id, r.room_name
-            FROM room_orders ro
+            FROM room_order_items roi
+            JOIN room_orders ro ON ro.id = roi.room_order_id
             JOIN rooms r ON ro.room_id = r.id
-            WHERE ro.status = 'pending' AND ro.order_data LIKE ?
-        """, (f'%"id":{item_id}%',))
+            WHERE roi.menu_item_id = ? AND ro.status = 'pending'
+        """, (item_id,))
         
         pending_orders = cursor.fetchall()
         
@@ -822,14 +4209,14 @@ def delete_item(item_id):
             
             return jsonify({
                 'success': False,
-                'error': f'Cannot delete item. It exists in pending orders:\n' + '\n'.join(order_info)
+                'error': 'Cannot delete item. It exists in pending orders:\n' + '\n'.join(order_info)
             })
         
-        # Also check if item has been sold before
+        # Also check if item has been sold before, archived years included
         cursor.execute("SELECT COUNT(*) FROM sale_items WHERE menu_item_id = ?", (item_id,))
         sale_count = cursor.fetchone()[0]
         
-        if sale_count > 0:
+        if sale_count > 0 or archived_row_exists(conn, 'sale_items', 'menu_item_id', item_id):
             # Soft delete - set status to inactive instead of deleting
             cursor.execute("UPDATE menu_items SET status = 'inactive' WHERE id = ?", (item_id,))
             message = 'Item deactivated (has sales history)'
@@ -838,8 +4225,9 @@ def delete_item(item_id):
             cursor.execute("DELETE FROM menu_items WHERE id = ?", (item_id,))
             message = 'Item deleted successfully'
         
+        bump_menu_version(cursor)
+        
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -869,12 +4257,94 @@ def get_categories():
                 'color_code': category['color_code']
             })
         
-        conn.close()
         return jsonify(categories_list)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ==================== MENU IMPORT / EXPORT APIs ====================
+
+@app.route('/api/menu_import', methods=['POST'])
+@login_required
+def api_menu_import():
+    """Bulk create/update menu items from an uploaded CSV/JSON file or a JSON body; ?dry_run=1 only diffs"""
+    try:
+        dry_run = request.values.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        if 'file' in request.files:
+            upload = request.files['file']
+            rows = read_menu_file(upload.read(), menu_file_format(upload.filename))
+        else:
+            data = request.get_json(silent=True)
+            if data is None:
+                return jsonify({'success': False, 'error': 'Send a CSV/JSON file or {"items": [...]}'})
+            dry_run = dry_run or bool(isinstance(data, dict) and data.get('dry_run'))
+            rows = read_menu_file(json.dumps(data), 'json')
+        
+        plan, errors = import_menu(get_db(), rows, current_user.id, dry_run)
+        return jsonify({
+            'success': not errors,
+            'dry_run': dry_run,
+            'applied': not errors and not dry_run,
+            **menu_import_summary(plan, errors)
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/menu_export')
+@login_required
+def api_menu_export():
+    """The whole menu as csv (default), json or xlsx, in the columns /api/menu_import accepts"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'json', 'xlsx'):
+        return jsonify({'success': False, 'error': 'Unknown export'}), 404
+    
+    rows = iter_menu_export_rows(get_db().cursor())
+    if export_format == 'json':
+        response = Response(menu_export_json(rows), content_type='application/json; charset=utf-8')
+    else:
+        writer, mimetype = EXPORT_FORMATS[export_format]
+        response = Response(b''.join(writer(rows)), content_type=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="menu_{shop_now().date().isoformat()}.{export_format}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# ==================== STOCK APIs ====================
+
+@app.route('/api/update_stock', methods=['POST'])
+@login_required
+def api_update_stock():
+    """Receive, adjust or write off stock for one or many items in one transaction"""
+    try:
+        data = request.json or {}
+        lines = parse_stock_lines(data)
+        receipt = data.get('receipt')
+        if receipt is not None and not isinstance(receipt, dict):
+            return jsonify({'success': False, 'error': 'receipt must be an object'})
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            new_stock, receipt_id = apply_stock_movements(cursor, lines, current_user.id, receipt)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        response = {
+            'success': True,
+            'receipt_id': receipt_id,
+            'items': [{'item_id': item_id, 'new_stock': stock} for item_id, stock in new_stock.items()],
+            'message': 'Stock updated successfully'
+        }
+        if len(new_stock) == 1:
+            response['new_stock'] = next(iter(new_stock.values()))
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 # ==================== CATEGORY MANAGEMENT APIs ====================
 
 @app.route('/api/categories/add', methods=['POST'])
@@ -914,8 +4384,9 @@ def add_category():
         
         category_id = cursor.lastrowid
         
+        bump_menu_version(cursor)
+        
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -949,8 +4420,9 @@ def update_category(category_id):
             category_id
         ))
         
+        bump_menu_version(cursor)
+        
         conn.commit()
-        conn.close()
         
         return jsonify({'success': True, 'message': 'Category updated successfully'})
         
@@ -977,8 +4449,9 @@ def delete_category(category_id):
         
         cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
         
+        bump_menu_version(cursor)
+        
         conn.commit()
-        conn.close()
         
         return jsonify({'success': True, 'message': 'Category deleted successfully'})
         
@@ -1007,35 +4480,42 @@ def upload_item_image():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'File type not allowed'})
         
-        # Generate secure filename
-        filename = secure_filename(f"item_{item_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file.filename.rsplit('.', 1)[1].lower()}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # Save file
-        file.save(filepath)
-        
-        # Update database
         conn = get_db()
         cursor = conn.cursor()
         
-        # Remove old image if exists
-        cursor.execute("SELECT image_path FROM menu_items WHERE id = ?", (item_id,))
+        cursor.execute("SELECT image_path, image_variants FROM menu_items WHERE id = ?", (item_id,))
         old_image = cursor.fetchone()
+        if not old_image:
+            return jsonify({'success': False, 'error': 'Item not found'})
         
-        if old_image and old_image['image_path']:
-            old_path = os.path.join('static', old_image['image_path'])
-            if os.path.exists(old_path):
-                os.remove(old_path)
+        if Image is not None:
+            # Resized, content-hashed WebP/PNG variants; the original upload is not kept
+            try:
+                variants = save_image_variants(file.read())
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)})
+            relative_path = variants['detail']['png']
+            image_variants = json.dumps(variants)
+        else:
+            # Generate secure filename
+            filename = secure_filename(f"item_{item_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file.filename.rsplit('.', 1)[1].lower()}")
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            file.save(filepath)
+            relative_path = static_relative_path(filepath)
+            image_variants = None
         
-        # Update with new image path
-        relative_path = f"uploads/menu_images/{filename}"
-        cursor.execute("UPDATE menu_items SET image_path = ? WHERE id = ?", (relative_path, item_id))
+        # Update with new image, then drop the old files nobody else uses
+        cursor.execute("UPDATE menu_items SET image_path = ?, image_variants = ? WHERE id = ?",
+                       (relative_path, image_variants, item_id))
+        remove_unused_image_files(cursor, old_image['image_path'], old_image['image_variants'])
+        bump_menu_version(cursor)
         conn.commit()
-        conn.close()
         
+        item = apply_image_urls({'image_path': relative_path, 'image_variants': image_variants})
         return jsonify({
             'success': True,
-            'image_url': f"/static/{relative_path}",
+            'image_url': item['image_url'],
+            'images': item.get('images'),
             'message': 'Image uploaded successfully'
         })
         
@@ -1054,20 +4534,8 @@ def reports():
 @app.route('/stocks')
 @login_required
 def stocks():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT mi.*, c.display_name as category_display
-        FROM menu_items mi
-        LEFT JOIN categories c ON mi.category_id = c.id
-        ORDER BY c.sort_order, mi.name
-    """)
-    items = cursor.fetchall()
-    
-    conn.close()
-    
-    return render_template('stocks.html', items=items)
+    # Items are loaded page by page from /api/menu_search
+    return render_template('stocks.html')
 
 @app.route('/settings')
 @login_required
@@ -1080,57 +4548,44 @@ def settings():
 @app.route('/api/user_info')
 @login_required
 def api_user_info():
-    return jsonify({
-        'success': True,
-        'user': {
-            'id': current_user.id,
-            'username': current_user.username,
-            'full_name': current_user.full_name,
-            'role': current_user.role
-        }
-    })
+    return jsonify({'success': True, 'user': current_user_info()})
 
 # ==================== MENU ITEMS APIs ====================
 @app.route('/api/menu_items')
 @login_required
 def api_menu_items():
-    """Get all active menu items for sale page"""
+    """Get all active menu items for sale page (cached per menu version; stock via /api/menu_stock)"""
     conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT mi.id, mi.name, mi.sale_price as price, mi.stock, mi.unit,
-               c.name as category, c.display_name as category_display,
-               c.icon_class as category_icon, c.color_code as category_color,
-               mi.status, mi.image_path, mi.cost_price
-        FROM menu_items mi
-        LEFT JOIN categories c ON mi.category_id = c.id
-        WHERE mi.status = 'active'
-        ORDER BY c.sort_order, mi.name
-    """)
+    _, body, etag = get_menu_catalog(cursor)
+    
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/menu_stock')
+@login_required
+def api_menu_stock():
+    """Stock levels of active items, optionally only those changed since a stock version"""
+    since = request.args.get('since', type=int) or 0
     
-    items = []
-    for row in cursor.fetchall():
-        item = dict(row)
-        # Ensure all required fields exist with proper names for sale page
-        item['category'] = item.get('category', 'other')
-        item['category_name'] = item.get('category', 'other')  # Add category_name for compatibility
-        item['category_icon'] = item.get('category_icon', 'fas fa-box')
-        item['category_color'] = item.get('category_color', '#6c757d')
-        
-        # Fix image URL path
-        if item.get('image_path'):
-            item['image_url'] = f"/static/{item['image_path']}"
-        else:
-            item['image_url'] = "/static/images/default_food.png"
-        
-        # Ensure price field exists (some templates might use 'sale_price' instead of 'price')
-        item['sale_price'] = item.get('price', 0)
-        
-        items.append(item)
+    conn = get_db()
+    cursor = conn.cursor()
     
-    conn.close()
-    return jsonify({'success': True, 'items': items})
+    version = get_data_version(cursor, 'stock')
+    if since:
+        cursor.execute("SELECT id, stock, status FROM menu_items WHERE stock_version > ?", (since,))
+    else:
+        cursor.execute("SELECT id, stock, status FROM menu_items WHERE status = 'active'")
+    
+    stock = {row['id']: row['stock'] for row in cursor.fetchall()}
+    
+    return jsonify({'success': True, 'version': version, 'full': not since, 'stock': stock})
 
 @app.route('/api/menu_items_full')
 @login_required
@@ -1149,16 +4604,30 @@ def api_menu_items_full():
     
     items = []
     for row in cursor.fetchall():
-        item = dict(row)
-        if item.get('image_path'):
-            item['image_url'] = f"/static/{item['image_path']}"
-        else:
-            item['image_url'] = "/static/images/default_food.png"
-        items.append(item)
+        items.append(apply_image_urls(dict(row)))
     
-    conn.close()
     return jsonify({'success': True, 'items': items})
 
+@app.route('/api/menu_search')
+@login_required
+def api_menu_search():
+    """Filtered, keyset-paginated menu items for the menu and stocks pages (see parse_menu_search)"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        filters = parse_menu_search(cursor, request.args)
+        limit = min(max(int(request.args.get('limit', 50)), 1), MENU_SEARCH_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    items, next_cursor = menu_search_page(cursor, filters, limit)
+    result = {'success': True, 'items': items, 'next_cursor': next_cursor}
+    if filters['after'] is None:
+        result['stats'] = menu_stock_stats(cursor)
+    
+    return jsonify(result)
+
 @app.route('/api/menu_item/<int:item_id>')
 @login_required
 def api_menu_item(item_id):
@@ -1174,15 +4643,9 @@ def api_menu_item(item_id):
     """, (item_id,))
     
     item = cursor.fetchone()
-    conn.close()
     
     if item:
-        item_dict = dict(item)
-        if item_dict.get('image_path'):
-            item_dict['image_url'] = f"/static/{item_dict['image_path']}"
-        else:
-            item_dict['image_url'] = "/static/images/default_food.png"
-        return jsonify({'success': True, 'item': item_dict})
+        return jsonify({'success': True, 'item': apply_image_urls(dict(item))})
     return jsonify({'success': False, 'error': 'Item not found'})
 
 # ==================== ROOM APIs ====================
@@ -1201,9 +4664,28 @@ def api_rooms():
     for room in rooms:
         rooms_list.append(dict(room))
     
-    conn.close()
     return jsonify(rooms_list)
 
+@app.route('/api/room_board')
+@login_required
+def api_room_board():
+    """All rooms with pending order summaries and board counters"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    rooms = get_room_board(cursor)
+    
+    return jsonify({
+        'success': True,
+        'rooms': rooms,
+        'stats': {
+            'total_rooms': len(rooms),
+            'available_rooms': sum(1 for room in rooms if room['status'] == 'available'),
+            'occupied_rooms': sum(1 for room in rooms if room['status'] == 'occupied'),
+            'rooms_with_orders': sum(1 for room in rooms if room['pending_order'])
+        }
+    })
+
 @app.route('/api/room/<int:room_id>')
 @login_required
 def api_room_detail(room_id):
@@ -1212,7 +4694,6 @@ def api_room_detail(room_id):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM rooms WHERE id = ?", (room_id,))
     room = cursor.fetchone()
-    conn.close()
     
     if room:
         return jsonify({
@@ -1224,48 +4705,29 @@ def api_room_detail(room_id):
 @app.route('/api/save_room_order', methods=['POST'])
 @login_required
 def api_save_room_order():
-    """Save room order temporarily"""
+    """Save a whole cart as the room's pending order, written through
+
+    The sale page sends debounced per-item deltas to /api/room_order/<room_id>/items instead.
+    """
     try:
         data = request.json
         room_id = data.get('room_id')
-        order_items = data.get('order_items', [])
         
         if not room_id:
             return jsonify({'success': False, 'error': 'Room ID is required'})
         
+        order_items = normalize_order_items(data.get('order_items', []))
+        apply_tax = data.get('apply_tax', True)
+        apply_service = data.get('apply_service', True)
+        
+        # The cart replaces the order; edits this worker still has queued for the room are older
+        room_order_writes.take(int(room_id))
         conn = get_db()
         cursor = conn.cursor()
-        
-        # Calculate totals
-        subtotal = sum(item['price'] * item['quantity'] for item in order_items)
-        tax = data.get('apply_tax', True) and int(subtotal * 0.05) or 0
-        service = data.get('apply_service', True) and int(subtotal * 0.10) or 0
-        total = subtotal + tax + service
-        
-        # Check if order already exists for this room
-        cursor.execute("SELECT id FROM room_orders WHERE room_id = ? AND status = 'pending'", (room_id,))
-        existing_order = cursor.fetchone()
-        
-        if existing_order:
-            # Update existing order
-            cursor.execute("""
-                UPDATE room_orders SET 
-                    order_data = ?, subtotal = ?, tax = ?, service_charge = ?, total_amount = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (json.dumps(order_items), subtotal, tax, service, total, existing_order['id']))
-        else:
-            # Insert new order
-            cursor.execute("""
-                INSERT INTO room_orders (room_id, order_data, subtotal, tax, service_charge, total_amount, status)
-                VALUES (?, ?, ?, ?, ?, ?, 'pending')
-            """, (room_id, json.dumps(order_items), subtotal, tax, service, total))
-        
-        # Update room status to occupied
-        cursor.execute("UPDATE rooms SET status = 'occupied' WHERE id = ?", (room_id,))
-        
+        cursor.execute("BEGIN IMMEDIATE")
+        order_id = write_room_order(cursor, room_id, order_items, apply_tax, apply_service)
+        set_room_order_details(cursor, order_id, data.get('customer_count'), data.get('notes'))
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -1279,35 +4741,83 @@ def api_save_room_order():
 @login_required
 def api_get_room_order(room_id):
     """Get saved room order"""
+    room_order_writes.flush(room_id)
     conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM room_orders WHERE room_id = ? AND status = 'pending' ORDER BY created_at DESC LIMIT 1", (room_id,))
-    order = cursor.fetchone()
-    conn.close()
+    order = get_pending_room_order(cursor, room_id)
     
     if order:
-        try:
-            order_data = json.loads(order['order_data'])
-        except:
-            order_data = []
-        
-        return jsonify({
-            'success': True,
-            'order': {
-                'id': order['id'],
-                'room_id': order['room_id'],
-                'order_data': order_data,
-                'subtotal': order['subtotal'],
-                'tax': order['tax'],
-                'service_charge': order['service_charge'],
-                'total_amount': order['total_amount'],
-                'created_at': order['created_at']
-            }
-        })
+        return jsonify({'success': True, 'order': get_room_order_summary(cursor, order)})
     
     return jsonify({'success': False, 'error': 'No order found'})
 
+@app.route('/api/room_order/<int:room_id>/items', methods=['POST'])
+@login_required
+def api_room_order_edit_items(room_id):
+    """Add or subtract quantities (and optionally clear first) on the room's pending order
+
+    Takes the body described in parse_room_order_edit. With client_id and client_seq the edit is
+    checked against stock, queued and coalesced with the room's other edits (flush: true writes
+    it at once); the response carries the order_id to send next time, or stale: true with the
+    room's current order if the order the edits were made against is gone. Without them the
+    edit is written through and the response carries the updated order.
+    """
+    try:
+        edit = parse_room_order_edit(request.json or {})
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        if edit['client_id'] is None:
+            # Read-modify-write of the pending order: hold the write lock so concurrent taps serialize
+            cursor.execute("BEGIN IMMEDIATE")
+            edit['order_id'] = get_or_create_pending_room_order(
+                cursor, room_id,
+                True if edit['apply_tax'] is None else edit['apply_tax'],
+                True if edit['apply_service'] is None else edit['apply_service']
+            )
+            check_room_order_edit_stock(cursor, edit['order_id'], edit)
+            apply_room_order_edit(cursor, room_id, edit)
+            conn.commit()
+            return jsonify({'success': True, 'order': room_order_summary(cursor, edit['order_id'])})
+        
+        order = get_pending_room_order(cursor, room_id)
+        if edit['order_id'] is not None and (not order or order['id'] != edit['order_id']):
+            return jsonify({
+                'success': False,
+                'stale': True,
+                'error': 'This order was checked out or cleared on another device',
+                'order': get_room_order_summary(cursor, order) if order else None
+            })
+        if order is None:
+            # Open the order now so the page knows its id before any edit is written
+            cursor.execute("BEGIN IMMEDIATE")
+            edit['order_id'] = get_or_create_pending_room_order(
+                cursor, room_id,
+                True if edit['apply_tax'] is None else edit['apply_tax'],
+                True if edit['apply_service'] is None else edit['apply_service']
+            )
+            conn.commit()
+        else:
+            edit['order_id'] = order['id']
+        
+        check_room_order_edit_stock(cursor, edit['order_id'], edit, room_order_writes.queued_changes(room_id, edit['order_id']))
+        room_order_writes.submit(room_id, edit)
+        
+        result = {'success': True, 'queued': True, 'stale': False, 'order_id': edit['order_id']}
+        if request.json.get('flush'):
+            result['queued'] = False
+            if not room_order_writes.flush(room_id):
+                result.update(success=False, queued=True, error='Order could not be saved yet; it will be retried')
+        return jsonify(result)
+        
+    except ValueError as e:
+        get_db().rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        get_db().rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
 # ==================== SALE CHECKOUT APIs ====================
 
 @app.route('/api/checkout_sale', methods=['POST'])
@@ -1333,15 +4843,44 @@ def checkout_sale():
         totals = calculate_order_totals(order_items, apply_tax, apply_service)
         
         # Generate bill number
-        bill_number = f"SW-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+        sold_at = shop_now()
+        bill_number = f"SW-{sold_at.strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+        
+        # Aggregate requested quantities per menu item
+        requested = {}
+        for item in order_items:
+            requested[item['id']] = requested.get(item['id'], 0) + item.get('quantity', 1)
+        
+        # The checked-out cart supersedes any autosave still queued for the room; edits queued
+        # on other workers name the order this closes, so they are dropped as stale when written
+        room_order_writes.take(int(room_id))
         
         conn = get_db()
         cursor = conn.cursor()
         
+        # Take the write lock up front so stock checks and decrements are atomic across workers
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # Fetch every referenced item in one query and validate in memory
+        item_ids = list(requested)
+        cursor.execute(
+            f"SELECT id, name, stock, cost_price FROM menu_items WHERE id IN ({','.join('?' * len(item_ids))})",
+            item_ids
+        )
+        menu_items = {row['id']: row for row in cursor.fetchall()}
+        
+        for item in order_items:
+            menu_item = menu_items.get(item['id'])
+            if not menu_item:
+                raise ValueError(f"Menu item {item['id']} not found")
+            if menu_item['stock'] < requested[item['id']]:
+                raise ValueError(f"Insufficient stock for item {item.get('name')}. Available: {menu_item['stock']}, Requested: {requested[item['id']]}")
+        
         # Create sale record
         cursor.execute("""
-            INSERT INTO sales (bill_number, room_id, customer_count, subtotal, tax_amount, service_charge, total_amount, staff_id, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO sales (bill_number, room_id, customer_count, subtotal, tax_amount, service_charge, total_amount, staff_id, notes,
+                               sale_date, sale_time, sold_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             bill_number,
             room_id,
@@ -1351,62 +4890,66 @@ def checkout_sale():
             totals['service_charge'],
             totals['total'],
             current_user.id,
-            notes
+            notes,
+            sold_at.strftime('%Y-%m-%d'),
+            sold_at.strftime('%H:%M:%S'),
+            int(sold_at.timestamp())
         ))
         
         sale_id = cursor.lastrowid
         
-        # Insert sale items and update stock
+        sale_item_rows = []
+        ledger_rows = []
+        rollup_lines = []
         for item in order_items:
-            # Check stock availability
-            cursor.execute("SELECT stock FROM menu_items WHERE id = ?", (item['id'],))
-            menu_item = cursor.fetchone()
-            
-            if not menu_item:
-                raise Exception(f"Menu item {item['id']} not found")
-            
-            if menu_item['stock'] < item.get('quantity', 1):
-                raise Exception(f"Insufficient stock for item {item.get('name')}. Available: {menu_item['stock']}, Requested: {item.get('quantity', 1)}")
-            
-            # Insert sale item
-            cursor.execute("""
-                INSERT INTO sale_items (sale_id, menu_item_id, item_name, quantity, unit_price, total_price)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                sale_id,
-                item['id'],
-                item.get('name', 'Unknown'),
-                item.get('quantity', 1),
-                item.get('price', 0),
-                item.get('quantity', 1) * item.get('price', 0)
-            ))
-            
-            # Update stock
-            cursor.execute("""
-                UPDATE menu_items SET stock = stock - ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (item.get('quantity', 1), item['id']))
-            
-            # Record stock transaction
-            cursor.execute("""
-                INSERT INTO stock_transactions (menu_item_id, transaction_type, quantity, unit_price, total_amount, reference_id, staff_id, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                item['id'], 'sale', item.get('quantity', 1),
-                item.get('price', 0),
-                item.get('quantity', 1) * item.get('price', 0),
-                sale_id, current_user.id,
-                f'Sale #{bill_number}'
-            ))
+            quantity = item.get('quantity', 1)
+            price = item.get('price', 0)
+            name = item.get('name', 'Unknown')
+            unit_cost = menu_items[item['id']]['cost_price'] or 0
+            sale_item_rows.append((sale_id, item['id'], name, quantity, price, quantity * price, unit_cost))
+            ledger_rows.append((item['id'], 'sale', quantity, price, quantity * price, sale_id, current_user.id, f'Sale #{bill_number}'))
+            rollup_lines.append((item['id'], name, quantity, quantity * price, quantity * unit_cost))
+        
+        # Insert sale items
+        cursor.executemany("""
+            INSERT INTO sale_items (sale_id, menu_item_id, item_name, quantity, unit_price, total_price, unit_cost)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, sale_item_rows)
+        
+        # Conditional stock decrement; any row that no longer has enough stock rejects the sale
+        cursor.executemany("""
+            UPDATE menu_items SET stock = stock - ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND stock >= ?
+        """, [(quantity, item_id, quantity) for item_id, quantity in requested.items()])
+        
+        if cursor.rowcount != len(requested):
+            raise ValueError("Stock changed during checkout. Please try again.")
+        
+        mark_stock_changed(cursor, list(requested))
+        
+        # Record stock transactions
+        cursor.executemany("""
+            INSERT INTO stock_transactions (menu_item_id, transaction_type, quantity, unit_price, total_amount, reference_id, staff_id, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, ledger_rows)
+        
+        # Update daily report rollups in the same transaction
+        record_sale_rollup(
+            cursor,
+            sold_at.strftime('%Y-%m-%d'),
+            dict(totals, customer_count=customer_count, room_id=room_id),
+            rollup_lines
+        )
         
         # Clear room order
-        cursor.execute("DELETE FROM room_orders WHERE room_id = ? AND status = 'pending'", (room_id,))
+        clear_pending_room_orders(cursor, room_id)
         
         # Update room status to available
         cursor.execute("UPDATE rooms SET status = 'available' WHERE id = ?", (room_id,))
+        emit_room_status(cursor, room_id, 'available')
+        emit_room_order(cursor, room_id)
         
         conn.commit()
-        conn.close()
         
         # Clear session room data
         if 'current_room_id' in session and session['current_room_id'] == room_id:
@@ -1422,66 +4965,472 @@ def checkout_sale():
             'message': 'Checkout successful'
         })
         
+    except ValueError as e:
+        get_db().rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
+        get_db().rollback()
         return jsonify({'success': False, 'error': str(e)})
 
 # ==================== DASHBOARD APIs ====================
 @app.route('/api/dashboard_stats')
 @login_required
 def api_dashboard_stats():
-    """Get dashboard statistics"""
+    """Get dashboard statistics (see get_dashboard_stats)"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    return jsonify(dict(get_dashboard_stats(cursor), success=True))
+
+# ==================== LIVE EVENTS API ====================
+
+_event_streams = {'open': 0}
+_event_streams_lock = threading.Lock()
+
+def acquire_event_stream():
+    """Claim one of this worker's MAX_EVENT_STREAMS stream slots; False when all are taken"""
+    with _event_streams_lock:
+        if _event_streams['open'] >= app.config['MAX_EVENT_STREAMS']:
+            return False
+        _event_streams['open'] += 1
+        return True
+
+def release_event_stream():
+    with _event_streams_lock:
+        _event_streams['open'] -= 1
+
+def latest_event_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_events").fetchone()[0]
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """Server-Sent Events stream of room, order, stock and menu changes
+
+    A stream holds a server thread for as long as the page is open, so each worker serves at most
+    MAX_EVENT_STREAMS. Beyond that the page gets a 503 and falls back to /api/events/poll.
+    """
+    if not acquire_event_stream():
+        metrics.inc('ktv_event_streams_refused_total')
+        retry = app.config['EVENT_STREAM_RETRY']
+        response = Response(f"retry: {retry * 1000}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(retry)
+        return response
+    
+    pool = get_pool()
+    try:
+        last_id = request.headers.get('Last-Event-ID', type=int)
+        if last_id is None:
+            last_id = request.args.get('since', type=int)
+        if last_id is None:
+            conn = pool.acquire()
+            try:
+                last_id = latest_event_id(conn)
+            finally:
+                pool.release(conn)
+    except Exception:
+        release_event_stream()
+        raise
+    
+    # The stream outlives the view; don't hold the request's pooled connection for its lifetime
+    close_db()
+    
+    def stream(last_id):
+        seq = change_feed.seq
+        last_write = time.monotonic()
+        yield "retry: 3000\n\n"
+        while True:
+            conn = pool.acquire()
+            try:
+                rows = conn.execute(
+                    "SELECT id, event_type, payload FROM change_events WHERE id > ? ORDER BY id LIMIT 200",
+                    (last_id,)
+                ).fetchall()
+            finally:
+                pool.release(conn)
+            
+            for row in rows:
+                last_id = row['id']
+                yield f"id: {row['id']}\nevent: {row['event_type']}\ndata: {row['payload']}\n\n"
+            
+            if rows:
+                last_write = time.monotonic()
+                if len(rows) == 200:
+                    continue
+            elif time.monotonic() - last_write >= app.config['EVENT_KEEPALIVE']:
+                last_write = time.monotonic()
+                yield ": keep-alive\n\n"
+            
+            seq = change_feed.wait(seq, app.config['EVENT_POLL_INTERVAL'])
+    
+    response = Response(stream_with_context(stream(last_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the server closes the response, even if the client left before the first event
+    response.call_on_close(release_event_stream)
+    return response
+
+@app.route('/api/events/poll')
+@login_required
+def api_events_poll():
+    """Change events after `since`, for pages without a stream (no EventSource, or all slots taken)"""
+    conn = get_db()
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'success': True, 'events': [], 'last_id': latest_event_id(conn), 'more': False})
+    
+    rows = conn.execute(
+        "SELECT id, event_type, payload FROM change_events WHERE id > ? ORDER BY id LIMIT 200",
+        (since,)
+    ).fetchall()
+    return jsonify({
+        'success': True,
+        'events': [{'id': row['id'], 'type': row['event_type'], 'data': json.loads(row['payload'])} for row in rows],
+        'last_id': rows[-1]['id'] if rows else since,
+        'more': len(rows) == 200
+    })
+
+# ==================== SALES HISTORY APIs ====================
+
+@app.route('/api/sales')
+@login_required
+def api_sales():
+    """Sales history, newest first, filtered by query args (see parse_sales_filters) and paged with before=next_cursor"""
+    try:
+        filters = parse_sales_filters(request.args)
+        limit = min(max(int(request.args.get('limit', 50)), 1), SALES_HISTORY_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    sales, next_cursor = sales_history_page(get_db(), filters, limit)
+    
+    return jsonify({'success': True, 'sales': sales, 'next_cursor': next_cursor})
+
+@app.route('/api/sales/<int:sale_id>')
+@login_required
+def api_sale_detail(sale_id):
+    """One sale with its line items, for an expanded history row"""
+    sale = find_sale(get_db(), sale_id)
+    if sale is None:
+        return jsonify({'success': False, 'error': 'Sale not found'}), 404
+    
+    return jsonify({'success': True, 'sale': sale})
+
+# ==================== REPORT APIs ====================
+
+def _parse_report_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return shop_now().date()
+
+@app.route('/api/daily_report')
+@login_required
+def api_daily_report():
+    """Bills and rollup totals for one shop-local day"""
+    report_day = _parse_report_day(request.args.get('date'))
+    day_key = report_day.strftime('%Y-%m-%d')
+    day_start, day_end = shop_day_bounds(report_day)
+    
     conn = get_db()
     cursor = conn.cursor()
     
-    # Get today's sales
+    cursor.execute("SELECT * FROM daily_sales_summary WHERE sale_day = ?", (day_key,))
+    summary = cursor.fetchone()
+    
+    rows = []
+    for tables in sales_partitions(conn, day_start, day_end):
+        cursor.execute("""
+            SELECT s.id, s.bill_number, s.sale_time, s.sold_at, s.payment_method, s.payment_status,
+                   s.subtotal, s.tax_amount, s.service_charge, s.total_amount, s.customer_count,
+                   r.room_name, u.full_name as staff_name,
+                   (SELECT GROUP_CONCAT(si.item_name || '(' || si.quantity || ')', ', ')
+                    FROM {sale_items} si WHERE si.sale_id = s.id) as items,
+                   (SELECT COALESCE(SUM(si.quantity * si.unit_cost), 0)
+                    FROM {sale_items} si WHERE si.sale_id = s.id) as cost
+            FROM {sales} s
+            LEFT JOIN rooms r ON s.room_id = r.id
+            LEFT JOIN users u ON s.staff_id = u.id
+            WHERE s.sold_at >= ? AND s.sold_at < ?
+            ORDER BY s.sold_at, s.id
+        """.format(**tables), (day_start, day_end))
+        rows.extend(cursor.fetchall())  # partitions come oldest first, so rows stay in time order
+    
+    sales = []
+    for row in rows:
+        sale = dict(row)
+        sale['profit'] = sale['total_amount'] - sale['cost']
+        sales.append(sale)
+    
     cursor.execute("""
-        SELECT COALESCE(SUM(total_amount), 0) as total_sales FROM sales
-        WHERE DATE(sale_date) = DATE('now')
-    """)
-    today_sales = cursor.fetchone()[0]
+        SELECT menu_item_id, item_name, quantity, sales_amount, cost_amount,
+               sales_amount - cost_amount as profit
+        FROM daily_item_sales
+        WHERE sale_day = ?
+        ORDER BY sales_amount DESC
+    """, (day_key,))
+    items = [dict(row) for row in cursor.fetchall()]
     
-    # Get total rooms
-    cursor.execute("SELECT COUNT(*) FROM rooms")
-    total_rooms = cursor.fetchone()[0]
+    total_amount = summary['total_amount'] if summary else 0
+    cost_amount = summary['cost_amount'] if summary else 0
+    
+    return jsonify({
+        'success': True,
+        'date': day_key,
+        'totals': {
+            'sales_count': summary['sales_count'] if summary else 0,
+            'subtotal': summary['subtotal'] if summary else 0,
+            'tax_amount': summary['tax_amount'] if summary else 0,
+            'service_charge': summary['service_charge'] if summary else 0,
+            'total_amount': total_amount,
+            'total_customers': summary['customer_count'] if summary else 0,
+            'total_cost': cost_amount,
+            'total_profit': total_amount - cost_amount
+        },
+        'sales': sales,
+        'items': items
+    })
+
+@app.route('/api/monthly_stats')
+@login_required
+def api_monthly_stats():
+    """Per-day rollup rows and headline figures for one month"""
+    today = shop_now().date()
+    year = request.args.get('year', type=int) or today.year
+    month = request.args.get('month', type=int) or today.month
+    if not 1 <= month <= 12:
+        return jsonify({'success': False, 'error': 'Invalid month'})
     
-    # Get occupied rooms
-    cursor.execute("SELECT COUNT(*) FROM rooms WHERE status = 'occupied'")
-    occupied_rooms = cursor.fetchone()[0]
+    first_day = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    month_from, month_to = first_day.strftime('%Y-%m-%d'), next_month.strftime('%Y-%m-%d')
+    
+    conn = get_db()
+    cursor = conn.cursor()
     
-    # Get low stock items
     cursor.execute("""
-        SELECT COUNT(*) FROM menu_items
-        WHERE stock <= min_stock AND status = 'active'
-    """)
-    low_stock_items = cursor.fetchone()[0]
+        SELECT * FROM daily_sales_summary
+        WHERE sale_day >= ? AND sale_day < ?
+        ORDER BY sale_day DESC
+    """, (month_from, month_to))
+    
+    monthly_stats = []
+    totals = {'sales_count': 0, 'total_sales': 0, 'total_cost': 0, 'total_profit': 0,
+              'service_charge': 0, 'tax_amount': 0, 'total_customers': 0}
+    max_bill = 0
+    room_sessions = 0
+    for row in cursor.fetchall():
+        day = {
+            'date': row['sale_day'],
+            'month': row['sale_day'],
+            'sales_count': row['sales_count'],
+            'total_sales': row['total_amount'],
+            'total_cost': row['cost_amount'],
+            'total_profit': row['total_amount'] - row['cost_amount'],
+            'service_charge': row['service_charge'],
+            'tax_amount': row['tax_amount'],
+            'total_customers': row['customer_count']
+        }
+        monthly_stats.append(day)
+        for key in totals:
+            totals[key] += day[key]
+        max_bill = max(max_bill, row['max_bill'])
+        room_sessions += row['room_sessions']
     
-    # Get today's customers
     cursor.execute("""
-        SELECT COALESCE(SUM(customer_count), 0) as total_customers FROM sales
-        WHERE DATE(sale_date) = DATE('now')
-    """)
-    today_customers = cursor.fetchone()[0] or 0
+        SELECT item_name as name, SUM(quantity) as total_quantity, SUM(sales_amount) as total_sales
+        FROM daily_item_sales
+        WHERE sale_day >= ? AND sale_day < ?
+        GROUP BY menu_item_id
+        ORDER BY total_quantity DESC
+        LIMIT 1
+    """, (month_from, month_to))
+    top_item = cursor.fetchone()
     
-    conn.close()
+    cursor.execute("SELECT COUNT(*) FROM rooms WHERE status != 'inactive'")
+    room_count = cursor.fetchone()[0]
+    days_elapsed = ((min(today, next_month - timedelta(days=1)) - first_day).days + 1) if today >= first_day else 0
+    room_capacity = room_count * days_elapsed
+    
+    return jsonify({
+        'success': True,
+        'year': year,
+        'month': month,
+        'monthly_stats': monthly_stats,
+        'totals': totals,
+        'stats': {
+            'monthly_sales': totals['total_sales'],
+            'monthly_profit': totals['total_profit'],
+            'top_item': dict(top_item) if top_item else {'name': '-', 'total_quantity': 0, 'total_sales': 0},
+            'avg_bill': totals['total_sales'] / totals['sales_count'] if totals['sales_count'] else 0,
+            'max_bill': max_bill,
+            'room_usage': min(100, round(room_sessions * 100 / room_capacity)) if room_capacity else 0,
+            'avg_wait_time': 0
+        }
+    })
+
+# ==================== STOCK SNAPSHOT APIs ====================
+
+@app.route('/api/stock_at')
+@login_required
+def api_stock_at():
+    """Stock and cost value per item at ?at=YYYY-MM-DD[THH:MM[:SS]] (shop time; a bare date means opening)"""
+    try:
+        moment = parse_shop_timestamp(request.args.get('at', ''))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    items, snapshot = stock_at(cursor, moment)
     
     return jsonify({
         'success': True,
-        'today_sales': today_sales,
-        'total_rooms': total_rooms,
-        'occupied_rooms': occupied_rooms,
-        'low_stock_items': low_stock_items,
-        'today_customers': today_customers
+        'at': moment.isoformat(),
+        'snapshot': snapshot,
+        'items': items,
+        'totals': {
+            'items': len(items),
+            'stock': sum(item['stock'] for item in items),
+            'value': sum(item['value'] for item in items)
+        }
     })
 
+@app.route('/api/stock_snapshots', methods=['GET'])
+@login_required
+def api_stock_snapshots():
+    """Most recent stock snapshots"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM stock_snapshots ORDER BY id DESC LIMIT ?", (request.args.get('limit', 30, type=int),))
+    
+    return jsonify({'success': True, 'snapshots': [dict(row) for row in cursor.fetchall()]})
+
+@app.route('/api/stock_snapshots', methods=['POST'])
+@login_required
+def api_take_stock_snapshot():
+    """Take a stock snapshot now"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        snapshot = take_stock_snapshot(cursor, data.get('note') or f'Manual ({current_user.username})')
+        conn.commit()
+        
+        return jsonify({'success': True, 'snapshot': snapshot})
+        
+    except Exception as e:
+        get_db().rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/stock_reconciliation')
+@login_required
+def api_stock_reconciliation():
+    """Items whose stock disagrees with the latest snapshot plus the ledger since"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    snapshot, drift = reconcile_stock(cursor)
+    
+    return jsonify({'success': True, 'snapshot': snapshot, 'drift': drift, 'balanced': snapshot is not None and not drift})
+
+# ==================== EXPORT APIs ====================
+
+@app.route('/api/export/<dataset>')
+@login_required
+def api_export(dataset):
+    """Stream sales or stock_transactions for ?start=&end= as csv (default) or xlsx"""
+    export_format = request.args.get('format', 'csv')
+    if dataset not in EXPORTS or export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'Unknown export'}), 404
+    try:
+        start_day, end_day = parse_export_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    # The stream reads on its own connection; release the request's one now
+    close_db()
+    
+    writer, mimetype = EXPORT_FORMATS[export_format]
+    response = Response(
+        stream_with_context(writer(iter_export_rows(dataset, start_day, end_day))),
+        content_type=mimetype
+    )
+    filename = f"{dataset}_{start_day.isoformat()}_{end_day.isoformat()}.{export_format}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # ==================== STATUS API ====================
+def metrics_authorized():
+    """Logged-in staff, or a scraper presenting METRICS_TOKEN as a bearer token"""
+    if current_user.is_authenticated:
+        return True
+    token = app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token)
+
 @app.route('/api/status', methods=['GET'])
 def status():
-    """Server status check"""
-    return jsonify({
+    """Server status check with live DB latency; authorized callers also get totals across workers
+
+    Write-lock contention is reported from the lock waits recorded on real writes, not probed:
+    a BEGIN IMMEDIATE here would queue anonymous pollers behind (and ahead of) checkouts.
+    """
+    try:
+        conn = get_db()
+        
+        started = time.perf_counter()
+        conn.execute("SELECT 1").fetchone()
+        db_latency = time.perf_counter() - started
+    except sqlite3.Error as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 503
+    
+    result = {
         'status': 'ok',
         'message': 'ဆာဗာ အလုပ်လုပ်နေပါသည်',
-        'timestamp': datetime.now().isoformat()
-    })
+        'timestamp': datetime.now().isoformat(),
+        'database': {
+            'latency_ms': round(db_latency * 1000, 3),
+            'busy_timeout_ms': app.config['DB_BUSY_TIMEOUT_MS']
+        }
+    }
+    if not metrics_authorized():
+        return jsonify(result)
+    
+    counters, _ = metrics.collect()
+    totals = {}
+    for (name, _), value in counters.items():
+        totals[name] = totals.get(name, 0) + value
+    requests_total = totals.get('ktv_http_requests_total', 0)
+    lock_waits = totals.get('ktv_db_lock_waits_total', 0)
+    
+    result['totals'] = {
+        'requests': requests_total,
+        'sql_statements': totals.get('ktv_sql_statements_total', 0),
+        'sql_ms_per_request': round(totals.get('ktv_sql_duration_seconds_total', 0) * 1000 / requests_total, 3) if requests_total else 0,
+        'slow_statements': totals.get('ktv_sql_slow_statements_total', 0),
+        'lock_waits': lock_waits,
+        'lock_wait_ms_avg': round(totals.get('ktv_db_lock_wait_seconds_total', 0) * 1000 / lock_waits, 3) if lock_waits else 0,
+        'busy_errors': totals.get('ktv_db_busy_errors_total', 0)
+    }
+    return jsonify(result)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (summed over every worker's latest snapshot)"""
+    if not metrics_authorized():
+        return Response('Unauthorized\n', status=401, headers={'WWW-Authenticate': 'Bearer'},
+                        content_type='text/plain; charset=utf-8')
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # ==================== ERROR HANDLING ====================
 @app.errorhandler(404)
@@ -1492,6 +5441,40 @@ def page_not_found(e):
 def internal_server_error(e):
     return render_template('500.html'), 500
 
+# ==================== SERVER STARTUP ====================
+
+def prepare_app():
+    """One-time startup for a server process (gunicorn runs it in the master, before forking)
+
+    Creates or migrates the schema, then compiles every template through a bytecode cache so
+    restarts skip Jinja parsing and forked workers inherit the compiled templates, and loads the
+    asset manifest. Returns the startup report:
+    {'created', 'migrations', 'schema_ms', 'templates', 'templates_ms', 'asset_bundles'}.
+    """
+    report = {'created': not os.path.exists(app.config['DATABASE']), 'migrations': []}
+    started = time.perf_counter()
+    if report['created']:
+        init_db()
+    else:
+        conn = get_pool().connect()
+        try:
+            report['migrations'] = run_migrations(conn)
+        finally:
+            conn.close()
+    report['schema_ms'] = (time.perf_counter() - started) * 1000
+    
+    started = time.perf_counter()
+    cache_dir = app.config['TEMPLATE_CACHE_DIR'] or app.config['DATABASE'] + '-jinja'
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    templates = app.jinja_env.list_templates(extensions=['html'])
+    for name in templates:
+        app.jinja_env.get_template(name)
+    report['templates'] = len(templates)
+    report['templates_ms'] = (time.perf_counter() - started) * 1000
+    report['asset_bundles'] = load_asset_manifest()
+    return report
+
 # ========== MAIN ENTRY POINT ==========
 
 if __name__ == '__main__':
@@ -1499,11 +5482,13 @@ if __name__ == '__main__':
     print("KTV စားသောက်ဆိုင်စီမံခန့်ခွဲမှုစနစ်")
     print("=" * 60)
     
-    # Initialize database if it doesn't exist
-    if not os.path.exists(app.config['DATABASE']):
-        init_db()
-    else:
+    # Create or migrate the database, warm the template cache
+    startup = prepare_app()
+    if not startup['created']:
         print("✅ Database ရှိပြီးသားဖြစ်ပါသည်။")
+    for version, description in startup['migrations']:
+        print(f"✅ Migration {version}: {description}")
+    print(f"✅ Startup: schema {startup['schema_ms']:.0f} ms, {startup['templates']} templates {startup['templates_ms']:.0f} ms")
     
     print("=" * 60)
     print("ဆာဗာစတင်နေပါပြီ...")
@@ -1514,4 +5499,5 @@ if __name__ == '__main__':
     print("ဆာဗာကို ရပ်တန့်ရန် Ctrl+C နှိပ်ပါ")
     print("=" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server; production runs gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(debug=os.environ.get('KTV_POS_DEBUG') == '1', host='0.0.0.0', port=5000)
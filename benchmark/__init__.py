@@ -0,0 +1,13 @@
+""" KTV POS benchmark suite
+
+Seeds a synthetic shop and replays a busy-night mix of POS endpoints against
+the Flask test client or a local gunicorn, reporting per-endpoint throughput,
+p50/p95/p99 latency and SQL statements per request (read from the app's
+Server-Timing header).
+
+    python -m benchmark seed --db /tmp/ktv_bench.db --rooms 30 --menu-items 400 --years 2
+    python -m benchmark run --db /tmp/ktv_bench.db --target flask --clients 16 --duration 30
+    python -m benchmark run --db /tmp/ktv_bench.db --target gunicorn --workers 2 --threads 4
+    python -m benchmark run ... --save-baseline     # record benchmark/baseline.json
+    python -m benchmark run ... --compare           # exit 1 on regression vs the baseline
+"""
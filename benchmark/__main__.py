@@ -0,0 +1,150 @@
+""" python -m benchmark seed|run """
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ktv  # noqa: E402
+from benchmark import report, workload  # noqa: E402
+from benchmark.seed import seed_shop  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@click.group()
+def cli():
+    """KTV POS load test and benchmark suite"""
+
+
+def seed_options(command):
+    command = click.option('--rooms', default=20, show_default=True, help='Rooms in the synthetic shop')(command)
+    command = click.option('--menu-items', default=200, show_default=True, help='Menu items in the catalog')(command)
+    command = click.option('--years', default=1, show_default=True, help='Years of sales history')(command)
+    command = click.option('--sales-per-day', default=40, show_default=True, help='Average checkouts per day of history')(command)
+    command = click.option('--seed', default=42, show_default=True, help='Random seed for data and traffic')(command)
+    return command
+
+
+@cli.command('seed')
+@click.option('--db', 'db_path', default='ktv_bench.db', show_default=True, help='Database file to (re)create')
+@seed_options
+def seed_command(db_path, rooms, menu_items, years, sales_per_day, seed):
+    """Create a synthetic shop database"""
+    started = time.perf_counter()
+    seed_shop(db_path, rooms, menu_items, years, sales_per_day, seed)
+    print(f"✅ Seeded {db_path} in {time.perf_counter() - started:.1f}s")
+
+
+@cli.command('run')
+@click.option('--db', 'db_path', default='ktv_bench.db', show_default=True, help='Benchmark database (seeded if missing)')
+@click.option('--reseed', is_flag=True, help='Recreate the database first so every run starts from identical data')
+@click.option('--target', type=click.Choice(['flask', 'gunicorn']), default='flask', show_default=True)
+@click.option('--clients', default=8, show_default=True, help='Concurrent simulated tablets')
+@click.option('--duration', default=20.0, show_default=True, help='Seconds of traffic')
+@click.option('--workers', default=2, show_default=True, help='gunicorn workers')
+@click.option('--threads', default=4, show_default=True, help='gunicorn threads per worker')
+@click.option('--output', default=None, help='Also write the full result JSON here')
+@click.option('--save-baseline', is_flag=True, help='Store this run as the baseline for its target')
+@click.option('--compare', 'compare_baseline', is_flag=True, help='Exit 1 if this run regressed against the baseline')
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed relative p95/throughput change')
+@seed_options
+def run_command(db_path, reseed, target, clients, duration, workers, threads, output, save_baseline, compare_baseline,
+                tolerance, rooms, menu_items, years, sales_per_day, seed):
+    """Replay the endpoint mix and report latency, throughput and SQL per request"""
+    shop = {'rooms': rooms, 'menu_items': menu_items, 'years': years, 'sales_per_day': sales_per_day, 'seed': seed}
+    if reseed or not os.path.exists(db_path):
+        print(f"Seeding {db_path} ...")
+        seed_shop(db_path, **shop)
+    db_path = os.path.abspath(db_path)
+
+    ktv.app.config['DATABASE'] = db_path
+    conn = ktv.get_pool().connect()
+    room_ids = [row[0] for row in conn.execute("SELECT id FROM rooms ORDER BY id")]
+    menu_item_ids = [row[0] for row in conn.execute("SELECT id FROM menu_items WHERE status = 'active' AND stock > 1000")]
+    conn.close()
+
+    if target == 'flask':
+        samples, wall = workload.replay(workload.FlaskClient, room_ids, menu_item_ids, clients, duration, seed)
+    else:
+        port = _free_port()
+        server = _start_gunicorn(db_path, port, workers, threads)
+        try:
+            samples, wall = workload.replay(lambda: workload.HttpClient('127.0.0.1', port),
+                                            room_ids, menu_item_ids, clients, duration, seed)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result = {
+        'meta': {
+            'target': target,
+            'clients': clients,
+            'duration_s': round(wall, 2),
+            'workers': workers if target == 'gunicorn' else None,
+            'threads': threads if target == 'gunicorn' else None,
+            'shop': shop,
+            'python': platform.python_version(),
+            'sqlite': ktv.sqlite3.sqlite_version,
+            'recorded_at': datetime.now().isoformat(timespec='seconds')
+        },
+        'endpoints': report.summarize(samples, wall)
+    }
+
+    print(report.format_table(result['endpoints']))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    baseline = report.load_baseline().get(target)
+    if compare_baseline:
+        if not baseline:
+            print(f"⚠️ No {target} baseline in {report.BASELINE_PATH}")
+        else:
+            regressions = report.compare(result, baseline, tolerance)
+            for line in regressions:
+                print(f"❌ {line}")
+            if regressions:
+                raise SystemExit(1)
+            print(f"✅ No regressions against the {baseline['meta']['recorded_at']} {target} baseline")
+    if save_baseline:
+        report.save_baseline(result)
+        print(f"✅ Baseline saved to {report.BASELINE_PATH}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_gunicorn(db_path, port, workers, threads):
+    env = dict(os.environ, KTV_POS_DATABASE=db_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+         '--bind', f"127.0.0.1:{port}", '--log-level', 'warning', 'wsgi:app'],
+        cwd=REPO_ROOT, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start listening within 30s')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,90 @@
+""" Latency summaries and run-to-run baseline comparison """
+
+import json
+import os
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples, wall_seconds):
+    """Per-endpoint count, errors, throughput, p50/p95/p99 and SQL statements per request"""
+    by_label = {}
+    for label, latency, ok, sql in samples:
+        by_label.setdefault(label, []).append((latency, ok, sql))
+    by_label['ALL'] = [(latency, ok, sql) for _, latency, ok, sql in samples]
+
+    endpoints = {}
+    for label, rows in by_label.items():
+        latencies = sorted(row[0] for row in rows)
+        sql_counts = [row[2] for row in rows if row[2] is not None]
+        endpoints[label] = {
+            'count': len(rows),
+            'errors': sum(1 for row in rows if not row[1]),
+            'throughput_rps': round(len(rows) / wall_seconds, 2) if wall_seconds else 0,
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+            'sql_per_request': round(sum(sql_counts) / len(sql_counts), 2) if sql_counts else None
+        }
+    return endpoints
+
+
+def format_table(endpoints):
+    header = f"{'endpoint':34} {'count':>7} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql/req':>8}"
+    lines = [header, '-' * len(header)]
+    for label, stats in sorted(endpoints.items(), key=lambda kv: (kv[0] == 'ALL', kv[0])):
+        sql = '-' if stats['sql_per_request'] is None else f"{stats['sql_per_request']:.1f}"
+        lines.append(
+            f"{label:34} {stats['count']:>7} {stats['errors']:>5} {stats['throughput_rps']:>9.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {sql:>8}"
+        )
+    return '\n'.join(lines)
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(result, path=BASELINE_PATH):
+    """Store the run under its target name so flask and gunicorn baselines live side by side"""
+    baseline = load_baseline(path)
+    baseline[result['meta']['target']] = result
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(result, baseline, tolerance=0.2, noise_ms=1.0):
+    """Return human-readable regressions of result against a baseline run of the same target
+
+    Latency regresses when p95 grows by more than `tolerance` and `noise_ms`; throughput when it
+    drops by more than `tolerance`; SQL when an endpoint issues noticeably more statements per request
+    (carts vary in size, so checkout counts wobble slightly between runs).
+    """
+    regressions = []
+    for label, stats in result['endpoints'].items():
+        before = baseline['endpoints'].get(label)
+        if not before:
+            continue
+        if stats['p95_ms'] > before['p95_ms'] * (1 + tolerance) and stats['p95_ms'] - before['p95_ms'] > noise_ms:
+            regressions.append(f"{label}: p95 {before['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+        if stats['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {before['throughput_rps']:.1f} -> {stats['throughput_rps']:.1f} req/s")
+        if (stats['sql_per_request'] is not None and before.get('sql_per_request') is not None
+                and stats['sql_per_request'] > before['sql_per_request'] + max(0.5, before['sql_per_request'] * 0.1)):
+            regressions.append(f"{label}: SQL {before['sql_per_request']:.1f} -> {stats['sql_per_request']:.1f} statements/request")
+        if stats['errors'] > before['errors']:
+            regressions.append(f"{label}: errors {before['errors']} -> {stats['errors']}")
+    return regressions
@@ -0,0 +1,125 @@
+""" Synthetic shop data: rooms, menu, and years of checked-out sales """
+
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import app as ktv
+
+
+def seed_shop(db_path, rooms=20, menu_items=200, years=1, sales_per_day=40, seed=42):
+    """Create (or replace) db_path with a migrated schema and synthetic history"""
+    rng = random.Random(seed)
+    
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    ktv.app.config['DATABASE'] = db_path
+    ktv.init_db()
+    
+    conn = ktv.get_pool().connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        
+        # Rooms on top of the defaults
+        cursor.execute("SELECT COUNT(*) FROM rooms")
+        existing_rooms = cursor.fetchone()[0]
+        cursor.executemany("""
+            INSERT INTO rooms (room_number, room_name, room_type, hourly_rate, capacity)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (f"B{n:03d}", f"Bench Room {n}", rng.choice(['standard', 'vip']), rng.choice([10000, 15000, 30000]), rng.randint(2, 12))
+            for n in range(existing_rooms + 1, rooms + 1)
+        ])
+        
+        # Menu items spread over the seeded categories, with stock that never runs out
+        cursor.execute("SELECT id, name FROM categories WHERE name != 'all'")
+        categories = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM menu_items")
+        existing_items = cursor.fetchone()[0]
+        new_items = []
+        for n in range(existing_items + 1, menu_items + 1):
+            category = rng.choice(categories)
+            price = rng.randint(2, 60) * 500
+            new_items.append((
+                f"{category['name'].title()} {n}", category['id'], price,
+                int(price * rng.uniform(0.4, 0.7)), 1000000, 5
+            ))
+        cursor.executemany("""
+            INSERT INTO menu_items (name, category_id, sale_price, cost_price, stock, min_stock)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, new_items)
+        cursor.execute("UPDATE menu_items SET stock = 1000000, status = 'active'")
+        
+        cursor.execute("SELECT id, name, sale_price, COALESCE(cost_price, 0) FROM menu_items")
+        catalog = [tuple(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM rooms")
+        room_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM users")
+        staff_ids = [row[0] for row in cursor.fetchall()]
+        
+        _seed_sales(cursor, rng, catalog, room_ids, staff_ids, years, sales_per_day)
+        ktv.rebuild_sales_rollups(cursor)
+        cursor.execute("UPDATE data_versions SET version = version + 1")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return {
+        'rooms': rooms,
+        'menu_items': menu_items,
+        'years': years,
+        'sales_per_day': sales_per_day,
+        'seed': seed
+    }
+
+
+def _seed_sales(cursor, rng, catalog, room_ids, staff_ids, years, sales_per_day):
+    """Insert sales the way checkout_sale writes them, one day per executemany batch"""
+    tz = ktv.app.config['SHOP_TIMEZONE']
+    today = ktv.shop_now().date()
+    day = today - timedelta(days=365 * years)
+    
+    while day < today:
+        opening = datetime.combine(day, datetime.min.time(), tzinfo=tz) + timedelta(hours=17)
+        lines_by_sale = []
+        for _ in range(max(0, int(rng.gauss(sales_per_day, sales_per_day / 5)))):
+            sold_at = opening + timedelta(seconds=rng.randint(0, 9 * 3600))
+            lines = []
+            for menu_item_id, name, price, cost in rng.sample(catalog, rng.randint(1, min(6, len(catalog)))):
+                quantity = rng.randint(1, 5)
+                lines.append((menu_item_id, name, quantity, price, quantity * price, cost))
+            totals = ktv.calculate_order_totals([{'quantity': l[2], 'price': l[3]} for l in lines])
+            cursor.execute("""
+                INSERT INTO sales (bill_number, room_id, customer_count, subtotal, tax_amount, service_charge,
+                                   total_amount, staff_id, sale_date, sale_time, sold_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                f"SW-{sold_at.strftime('%Y%m%d')}-{uuid.UUID(int=rng.getrandbits(128)).hex[:8].upper()}",
+                rng.choice(room_ids), rng.randint(1, 10),
+                totals['subtotal'], totals['tax'], totals['service_charge'], totals['total'],
+                rng.choice(staff_ids),
+                sold_at.strftime('%Y-%m-%d'), sold_at.strftime('%H:%M:%S'), int(sold_at.timestamp())
+            ))
+            lines_by_sale.append((cursor.lastrowid, sold_at, lines))
+        
+        cursor.executemany("""
+            INSERT INTO sale_items (sale_id, menu_item_id, item_name, quantity, unit_price, total_price, unit_cost)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (sale_id, l[0], l[1], l[2], l[3], l[4], l[5])
+            for sale_id, _, lines in lines_by_sale for l in lines
+        ])
+        cursor.executemany("""
+            INSERT INTO stock_transactions (menu_item_id, transaction_type, quantity, unit_price, total_amount,
+                                            reference_id, notes, transaction_date)
+            VALUES (?, 'sale', ?, ?, ?, ?, 'Benchmark history', ?)
+        """, [
+            (l[0], l[2], l[3], l[4], sale_id, sold_at.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+            for sale_id, sold_at, lines in lines_by_sale for l in lines
+        ])
+        day += timedelta(days=1)
@@ -0,0 +1,225 @@
+""" Endpoint mix replayed by each simulated tablet, and the clients that send it """
+
+import http.client
+import json
+import random
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import app as ktv
+
+# (label, weight, Tablet action) - roughly what a busy night of sale pages, room boards and dashboards sends
+ENDPOINT_MIX = [
+    ('GET /api/menu_items', 20, 'menu_items'),
+    ('POST /api/room_order/<id>/items', 25, 'edit_room_order'),
+    ('GET /api/get_room_order/<id>', 20, 'get_room_order'),
+    ('POST /api/checkout_sale', 5, 'checkout_sale'),
+    ('GET /api/dashboard_stats', 15, 'dashboard_stats'),
+    ('GET /rooms', 8, 'rooms'),
+    ('GET /dashboard', 7, 'dashboard'),
+]
+
+_SQL_TIMING = re.compile(r'sql;[^,]*desc="(\d+) statements"')
+
+
+def sql_statements(headers):
+    """Statements the app reports for one request in its Server-Timing header"""
+    match = _SQL_TIMING.search(headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+class FlaskClient:
+    """In-process client: one Flask test client per simulated tablet"""
+
+    def __init__(self):
+        self.client = ktv.app.test_client()
+
+    def login(self, username, password):
+        self.client.post('/login', data={'username': username, 'password': password})
+
+    def request(self, method, path, payload=None, headers=None):
+        response = self.client.open(path, method=method, json=payload, headers=headers or {})
+        return response.status_code, response.get_data(), response.headers, sql_statements(response.headers)
+
+
+class HttpClient:
+    """Keep-alive HTTP client with a session cookie, for a real gunicorn"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = None
+        self.cookies = SimpleCookie()
+
+    def login(self, username, password):
+        self._send('POST', '/login', urlencode({'username': username, 'password': password}).encode(),
+                   {'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def request(self, method, path, payload=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        status, data, response_headers = self._send(method, path, body, headers)
+        return status, data, response_headers, sql_statements(response_headers)
+
+    def _send(self, method, path, body, headers):
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={morsel.value}" for name, morsel in self.cookies.items())
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for value in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(value)
+        return response.status, data, response.headers
+
+
+class Tablet:
+    """One staff tablet working a room: browse the menu, build the order, check out"""
+
+    def __init__(self, client, room_id, menu_item_ids, rng):
+        self.client = client
+        self.room_id = room_id
+        self.menu_item_ids = menu_item_ids
+        self.rng = rng
+        self.menu_etag = None
+        self.cart = {}
+        self.prices = {}
+        self.client_id = f"bench-{room_id}-{rng.random():.12f}"
+        self.order_id = None
+        self.order_seq = 0
+
+    def step(self, action):
+        """Send one request for an ENDPOINT_MIX action; returns (ok, sql statements or None)"""
+        return getattr(self, '_' + action)()
+
+    def _ok(self, status, data, sql, expect_success=True):
+        if status not in (200, 304):
+            return False, sql
+        if expect_success and status == 200:
+            return bool(json.loads(data).get('success')), sql
+        return True, sql
+
+    def _menu_items(self):
+        headers = {'If-None-Match': self.menu_etag} if self.menu_etag else {}
+        status, data, headers, sql = self.client.request('GET', '/api/menu_items', headers=headers)
+        if status == 200:
+            self.menu_etag = headers.get('ETag')
+            for item in json.loads(data)['items']:
+                self.prices[item['id']] = item['price']
+        return self._ok(status, data, sql)
+
+    def _order_items(self):
+        return [
+            {'id': item_id, 'name': f"Item {item_id}", 'price': self.prices.get(item_id, 1000), 'quantity': quantity}
+            for item_id, quantity in self.cart.items()
+        ]
+
+    def _edit_room_order(self):
+        # Same protocol as sale.js: a batch of deltas against the order, numbered per page
+        item_id = self.rng.choice(self.menu_item_ids)
+        quantity = self.rng.randint(1, 3)
+        self.cart[item_id] = self.cart.get(item_id, 0) + quantity
+        self.order_seq += 1
+        status, data, _, sql = self.client.request('POST', f"/api/room_order/{self.room_id}/items", {
+            'order_id': self.order_id,
+            'client_id': self.client_id,
+            'client_seq': self.order_seq,
+            'changes': [{'id': item_id, 'quantity': quantity}]
+        })
+        if status == 200:
+            self.order_id = json.loads(data).get('order_id')
+        return self._ok(status, data, sql)
+
+    def _get_room_order(self):
+        status, data, _, sql = self.client.request('GET', f"/api/get_room_order/{self.room_id}")
+        return self._ok(status, data, sql, expect_success=False)
+
+    def _checkout_sale(self):
+        if not self.cart:
+            self._edit_room_order()
+        status, data, _, sql = self.client.request('POST', '/api/checkout_sale', {
+            'room_id': self.room_id,
+            'order_items': self._order_items(),
+            'customer_count': self.rng.randint(1, 8)
+        })
+        self.cart = {}
+        self.order_id = None
+        return self._ok(status, data, sql)
+
+    def _dashboard_stats(self):
+        status, data, _, sql = self.client.request('GET', '/api/dashboard_stats')
+        return self._ok(status, data, sql)
+
+    def _rooms(self):
+        status, data, _, sql = self.client.request('GET', '/rooms')
+        return self._ok(status, data, sql, expect_success=False)
+
+    def _dashboard(self):
+        status, data, _, sql = self.client.request('GET', '/dashboard')
+        return self._ok(status, data, sql, expect_success=False)
+
+
+def replay(make_client, room_ids, menu_item_ids, clients, duration, seed=42):
+    """Run `clients` tablets for `duration` seconds; returns (samples, wall seconds)
+
+    samples: list of (label, latency ms, ok, sql statements or None)
+    """
+    weights = [weight for _, weight, _ in ENDPOINT_MIX]
+    samples = []
+    samples_lock = threading.Lock()
+    errors = []
+    state = {}
+    start_barrier = threading.Barrier(
+        clients + 1, action=lambda: state.update(started=time.perf_counter(), deadline=time.perf_counter() + duration)
+    )
+
+    def run_tablet(index):
+        try:
+            rng = random.Random(seed + index)
+            client = make_client()
+            client.login('admin', 'admin123')
+            tablet = Tablet(client, room_ids[index % len(room_ids)], menu_item_ids, rng)
+            tablet.step('menu_items')
+        except Exception as e:
+            errors.append(e)
+            start_barrier.abort()
+            return
+        start_barrier.wait()
+
+        local = []
+        while time.perf_counter() < state['deadline']:
+            label, _, action = rng.choices(ENDPOINT_MIX, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok, sql = tablet.step(action)
+            except Exception:
+                ok, sql = False, None
+            local.append((label, (time.perf_counter() - started) * 1000, ok, sql))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=run_tablet, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        start_barrier.wait()
+    except threading.BrokenBarrierError as e:
+        raise RuntimeError(f"Client setup failed: {errors[0] if errors else 'unknown error'}") from e
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - state['started']
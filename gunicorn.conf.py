@@ -0,0 +1,45 @@
+""" Production gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app """
+
+import multiprocessing
+import os
+import sys
+import time
+
+_started = time.perf_counter()
+
+bind = os.environ.get('KTV_POS_BIND', '0.0.0.0:5000')
+
+# SQLite takes one writer at a time, so extra processes only queue on the write lock.
+# Keep a couple of workers and let threads absorb I/O waits. Each open /api/events stream
+# (sale page or room board) holds a thread, so every worker gets REQUEST_THREADS for ordinary
+# requests on top of its KTV_POS_MAX_EVENT_STREAMS stream slots (same default as app.py);
+# pages beyond that poll instead.
+REQUEST_THREADS = 12
+workers = int(os.environ.get('KTV_POS_WORKERS', min(2, multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.environ.get('KTV_POS_THREADS', REQUEST_THREADS + int(os.environ.get('KTV_POS_MAX_EVENT_STREAMS', 8))))
+
+# Import the app once in the master: schema check/migration and template compilation
+# happen before fork, and workers start with everything already loaded
+preload_app = True
+
+keepalive = 5
+timeout = 30
+graceful_timeout = 10
+accesslog = os.environ.get('KTV_POS_ACCESS_LOG')  # e.g. '-' for stdout; off by default
+
+
+def when_ready(server):
+    startup = getattr(sys.modules.get('wsgi'), 'startup_timings', None)
+    if startup:
+        for version, description in startup['migrations']:
+            server.log.info("Migration %s: %s", version, description)
+        server.log.info("KTV POS ready in %.0f ms (schema %.0f ms, %d templates %.0f ms); %d workers x %d threads",
+                        (time.perf_counter() - _started) * 1000, startup['schema_ms'], startup['templates'],
+                        startup['templates_ms'], server.cfg.workers, server.cfg.threads)
+
+
+def worker_exit(_server, _worker):
+    # Write any coalesced room order autosaves before the worker goes away
+    from app import room_order_writes
+    room_order_writes.flush()
@@ -0,0 +1,55 @@
+// Live change feed shared by the sale page and the room board
+// Streams /api/events; when the server has no stream slot free (503) or the browser has no
+// EventSource, polls /api/events/poll and tries the stream again later.
+
+const EVENT_POLL_MS = 5000;
+const EVENT_STREAM_RETRY_MS = 30000;
+
+// handlers: { event_type: function(data) }; since: last change event id already applied, or null
+function subscribeChanges(handlers, since = null) {
+    let lastId = since;
+    
+    function dispatch(type, id, data) {
+        lastId = id;
+        if (handlers[type]) handlers[type](data);
+    }
+    
+    function openStream() {
+        const events = new EventSource(lastId === null ? '/api/events' : `/api/events?since=${lastId}`);
+        Object.keys(handlers).forEach(type => {
+            events.addEventListener(type, (e) => dispatch(type, parseInt(e.lastEventId), JSON.parse(e.data)));
+        });
+        events.onerror = () => {
+            // Transient drops reconnect on their own; a refused stream is closed for good
+            if (events.readyState === EventSource.CLOSED) {
+                pollUntil(Date.now() + EVENT_STREAM_RETRY_MS);
+            }
+        };
+    }
+    
+    function pollUntil(retryStreamAt) {
+        const url = lastId === null ? '/api/events/poll' : `/api/events/poll?since=${lastId}`;
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) return false;
+                data.events.forEach(event => dispatch(event.type, event.id, event.data));
+                lastId = data.last_id;
+                return data.more;
+            })
+            .catch(() => false)
+            .then(more => {
+                if (!more && window.EventSource && Date.now() >= retryStreamAt) {
+                    openStream();
+                } else {
+                    setTimeout(() => pollUntil(retryStreamAt), more ? 0 : EVENT_POLL_MS);
+                }
+            });
+    }
+    
+    if (window.EventSource) {
+        openStream();
+    } else {
+        pollUntil(Infinity);
+    }
+}
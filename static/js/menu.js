@@ -5,9 +5,13 @@
 // Global Variables
 // ===========================
 let allMenuItems = [];
-let filteredItems = [];
 let currentFilter = 'all';
 let currentStatusFilter = 'all';
+let menuCursor = null;       // next_cursor of the last loaded page, null when everything is loaded
+let menuRequestId = 0;       // ignore responses to superseded searches
+let menuLoading = false;
+let loadMoreObserver = null;
+const MENU_PAGE_SIZE = 50;
 
 // ===========================
 // Initialization
@@ -18,12 +22,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize filters and search
     setupEventListeners();
     
-    // Load initial data
+    // Load the first page (and the header stats)
     loadMenuData();
     
-    // Update stats
-    updateStats();
-    
     console.log('Menu page initialization complete');
 });
 
@@ -49,9 +50,7 @@ function setupEventListeners() {
     // Search input
     const searchInput = document.getElementById('menu-search');
     if (searchInput) {
-        searchInput.addEventListener('input', function() {
-            filterMenuItems();
-        });
+        searchInput.addEventListener('input', debounce(filterMenuItems, 250));
     }
     
     // Category filter
@@ -93,33 +92,71 @@ function setupEventListeners() {
 // ===========================
 // Data Loading Functions
 // ===========================
-function loadMenuData() {
+// Search, category and status filters as /api/menu_search query args
+function menuSearchParams() {
+    const params = new URLSearchParams({ limit: MENU_PAGE_SIZE });
+    const searchText = document.getElementById('menu-search').value.trim();
+    if (searchText) params.set('q', searchText);
+    if (currentFilter !== 'all') params.set('category', currentFilter);
+    
+    switch (currentStatusFilter) {
+        case 'active':
+        case 'inactive':
+            params.set('status', currentStatusFilter);
+            break;
+        case 'out_of_stock':
+            params.set('stock', 'out');
+            break;
+        case 'low_stock':
+            params.set('status', 'active');
+            params.set('stock', 'low');
+            break;
+    }
+    return params;
+}
+
+// First page for the current filters, or the next page when append is true
+function loadMenuData(append = false) {
     const menuBody = document.getElementById('menu-items-body');
+    if (append && (!menuCursor || menuLoading)) return;
     
-    // Show loading
-    menuBody.innerHTML = `
-        <tr>
-            <td colspan="8" class="text-center">
-                <div class="loading-message">
-                    <i class="fas fa-spinner fa-spin"></i>
-                    <p>Menu items တင်နေပါသည်...</p>
-                </div>
-            </td>
-        </tr>
-    `;
+    const params = menuSearchParams();
+    if (append) {
+        params.set('after', menuCursor);
+    } else {
+        // Show loading
+        menuBody.innerHTML = `
+            <tr>
+                <td colspan="8" class="text-center">
+                    <div class="loading-message">
+                        <i class="fas fa-spinner fa-spin"></i>
+                        <p>Menu items တင်နေပါသည်...</p>
+                    </div>
+                </td>
+            </tr>
+        `;
+    }
     
-    fetch('/api/menu_items_full')
+    const requestId = ++menuRequestId;
+    menuLoading = true;
+    
+    fetch(`/api/menu_search?${params}`)
         .then(response => response.json())
         .then(data => {
+            if (requestId !== menuRequestId) return;
             if (data.success && data.items) {
-                allMenuItems = data.items;
-                renderMenuItems(allMenuItems);
-                updateStats();
+                allMenuItems = append ? allMenuItems.concat(data.items) : data.items;
+                menuCursor = data.next_cursor;
+                renderMenuItems(data.items, append);
+                if (data.stats) {
+                    updateStats(data.stats);
+                }
             } else {
                 throw new Error(data.error || 'Failed to load menu items');
             }
         })
         .catch(error => {
+            if (requestId !== menuRequestId) return;
             console.error('Error loading menu items:', error);
             menuBody.innerHTML = `
                 <tr>
@@ -135,16 +172,21 @@ function loadMenuData() {
                 </tr>
             `;
             showToast('Menu items တင်ရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
+        })
+        .finally(() => {
+            if (requestId === menuRequestId) menuLoading = false;
         });
 }
 
 // ===========================
 // Rendering Functions
 // ===========================
-function renderMenuItems(items) {
+function renderMenuItems(items, append = false) {
     const menuBody = document.getElementById('menu-items-body');
+    const loadMoreRow = document.getElementById('menu-load-more');
+    if (loadMoreRow) loadMoreRow.remove();
     
-    if (!items || items.length === 0) {
+    if (!append && (!items || items.length === 0)) {
         menuBody.innerHTML = `
             <tr>
                 <td colspan="8" class="text-center">
@@ -162,6 +204,7 @@ function renderMenuItems(items) {
         return;
     }
     
+    const offset = append ? menuBody.querySelectorAll('tr[data-item-id]').length : 0;
     let html = '';
     items.forEach((item, index) => {
         const isLowStock = item.stock > 0 && item.stock <= (item.min_stock || 5);
@@ -190,13 +233,12 @@ function renderMenuItems(items) {
                 data-status="${item.status}"
                 data-stock="${item.stock}">
                 
-                <td>${index + 1}</td>
+                <td>${offset + index + 1}</td>
                 
                 <td>
                     <div class="item-image">
                         ${item.image_url ? 
-                            `<img src="${item.image_url}" alt="${item.name}" 
-                                  onerror="this.src='https://via.placeholder.com/60x60/1a237e/ffffff?text=No+Image'">` :
+                            itemThumbnailTag(item.images, item.image_url, item.name) :
                             `<div class="no-image">
                                 <i class="fas fa-utensils"></i>
                              </div>`
@@ -262,67 +304,83 @@ function renderMenuItems(items) {
         `;
     });
     
-    menuBody.innerHTML = html;
+    if (menuCursor) {
+        html += `
+            <tr id="menu-load-more">
+                <td colspan="8" class="text-center">
+                    <button onclick="loadMenuData(true)" class="btn btn-sm btn-info">
+                        <i class="fas fa-chevron-down"></i> ထပ်ပြရန်
+                    </button>
+                </td>
+            </tr>
+        `;
+    }
+    
+    if (append) {
+        menuBody.insertAdjacentHTML('beforeend', html);
+    } else {
+        menuBody.innerHTML = html;
+    }
+    observeLoadMore();
+}
+
+// Fetch the next page as soon as the "load more" row scrolls into view
+function observeLoadMore() {
+    const loadMoreRow = document.getElementById('menu-load-more');
+    if (!loadMoreRow || !window.IntersectionObserver) return;
+    
+    if (!loadMoreObserver) {
+        loadMoreObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMenuData(true);
+            }
+        }, { rootMargin: '200px' });
+    }
+    loadMoreObserver.disconnect();
+    loadMoreObserver.observe(loadMoreRow);
+}
+
+// Table thumbnail: WebP with PNG fallback when resized variants exist
+function itemThumbnailTag(images, imageUrl, alt) {
+    const thumb = images && images.thumb;
+    if (!thumb) {
+        return `<img src="${imageUrl}" alt="${alt}" 
+                     onerror="this.src='https://via.placeholder.com/60x60/1a237e/ffffff?text=No+Image'">`;
+    }
+    return `<picture>
+        <source srcset="${thumb.webp}" type="image/webp">
+        <img src="${thumb.png}" alt="${alt}" loading="lazy">
+    </picture>`;
 }
 
 // ===========================
 // Filter Functions
 // ===========================
 function filterMenuItems() {
-    const searchText = document.getElementById('menu-search').value.toLowerCase();
-    
-    filteredItems = allMenuItems.filter(item => {
-        // Search filter
-        const matchesSearch = !searchText || 
-            item.name.toLowerCase().includes(searchText) ||
-            (item.description && item.description.toLowerCase().includes(searchText));
-        
-        // Category filter
-        const matchesCategory = currentFilter === 'all' || 
-            item.category_name === currentFilter;
-        
-        // Status filter
-        const isOutOfStock = item.stock <= 0;
-        const isLowStock = item.stock > 0 && item.stock <= (item.min_stock || 5);
-        
-        let matchesStatus = true;
-        if (currentStatusFilter !== 'all') {
-            switch(currentStatusFilter) {
-                case 'active':
-                    matchesStatus = item.status === 'active';
-                    break;
-                case 'inactive':
-                    matchesStatus = item.status === 'inactive';
-                    break;
-                case 'out_of_stock':
-                    matchesStatus = isOutOfStock;
-                    break;
-                case 'low_stock':
-                    matchesStatus = isLowStock && item.status === 'active';
-                    break;
-            }
-        }
-        
-        return matchesSearch && matchesCategory && matchesStatus;
-    });
-    
-    renderMenuItems(filteredItems);
-    updateStats();
+    // Filtering and search run on the server; start again from the first page
+    loadMenuData();
 }
 
 // ===========================
 // Stats Functions
 // ===========================
-function updateStats() {
-    const activeCount = allMenuItems.filter(item => item.status === 'active').length;
-    const lowStockCount = allMenuItems.filter(item => 
-        item.stock > 0 && item.stock <= (item.min_stock || 5) && item.status === 'active'
-    ).length;
-    const outOfStockCount = allMenuItems.filter(item => item.stock <= 0 && item.status === 'active').length;
-    
-    document.getElementById('active-count').textContent = activeCount;
-    document.getElementById('low-stock-count').textContent = lowStockCount;
-    document.getElementById('out-of-stock-count').textContent = outOfStockCount;
+function updateStats(stats) {
+    document.getElementById('active-count').textContent = stats.active;
+    document.getElementById('low-stock-count').textContent = stats.low_stock;
+    document.getElementById('out-of-stock-count').textContent = stats.out_of_stock;
+    document.getElementById('total-count').textContent = stats.total;
+}
+
+// Header counts after a single item changed, without reloading the table
+function refreshStats() {
+    fetch('/api/menu_search?limit=1')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success && data.stats) {
+                updateStats(data.stats);
+            }
+        })
+        .catch(error => console.error('Error refreshing stats:', error));
 }
 
 // ===========================
@@ -468,7 +526,7 @@ function deleteItem(itemId) {
             const itemRow = document.querySelector(`tr[data-item-id="${itemId}"]`);
             if (itemRow) {
                 itemRow.remove();
-                updateStats();
+                refreshStats();
             }
         } else {
             showToast(data.error || 'ဖျက်ရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
@@ -532,7 +590,7 @@ function updateStock(itemId) {
                 }
             }
             
-            updateStats();
+            refreshStats();
         } else {
             showToast(data.error || 'လက်ကျန်ပြင်ဆင်ရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
         }
@@ -581,7 +639,7 @@ function uploadImage(itemId) {
                 if (row && data.image_url) {
                     const imgContainer = row.querySelector('.item-image');
                     if (imgContainer) {
-                        imgContainer.innerHTML = `<img src="${data.image_url}" alt="Menu item image">`;
+                        imgContainer.innerHTML = itemThumbnailTag(data.images, data.image_url, 'Menu item image');
                     }
                 }
             } else {
@@ -146,15 +146,12 @@ function updateSummaryStats(dashboardData, dailyData, monthlyData) {
     document.getElementById('today-customers').textContent = todayCustomers + ' ဦး';
     
     // Monthly sales
-    let monthlyTotal = 0;
-    if (monthlyData.success && monthlyData.monthly_stats.length > 0) {
-        monthlyTotal = monthlyData.monthly_stats[0].total_sales || 0;
-    }
+    const monthlyTotal = monthlyData.success ? monthlyData.totals.total_sales : 0;
     document.getElementById('monthly-sales').textContent = formatCurrency(monthlyTotal);
     
-    // Calculate profits (simplified - in real app, you'd fetch cost data)
-    const todayProfit = Math.round(todaySales * 0.6); // Assuming 60% profit margin
-    const monthlyProfit = Math.round(monthlyTotal * 0.6);
+    // Profits from recorded item costs
+    const todayProfit = dailyData.success ? dailyData.totals.total_profit : 0;
+    const monthlyProfit = monthlyData.success ? monthlyData.totals.total_profit : 0;
     
     document.getElementById('today-profit').textContent = 'အမြတ်: ' + formatCurrency(todayProfit);
     document.getElementById('monthly-profit').textContent = 'အမြတ်: ' + formatCurrency(monthlyProfit);
@@ -197,11 +194,11 @@ function updateDailyReport(data) {
         data.sales.forEach(sale => {
             const row = document.createElement('tr');
             
-            // Calculate cost and profit (simplified)
+            // Cost and profit from recorded item costs
             const salesAmount = sale.total_amount || 0;
             const serviceCharge = sale.service_charge || 0;
             const taxAmount = sale.tax_amount || 0;
-            const cost = Math.round(salesAmount * 0.4); // Assuming 40% cost
+            const cost = sale.cost || 0;
             const profit = salesAmount - cost;
             
             totalSales += salesAmount;
@@ -281,16 +278,16 @@ function updateMonthlyReport(data, month, year) {
     let monthlyTotalTax = 0;
     let monthlyTotalCustomers = 0;
     
-    // For demo, use the monthly_stats data
+    // One row per day from the daily sales rollup
     if (data.monthly_stats && data.monthly_stats.length > 0) {
         data.monthly_stats.forEach(stat => {
             const sales = stat.total_sales || 0;
             const customers = stat.total_customers || 0;
             const count = stat.sales_count || 0;
-            const cost = Math.round(sales * 0.4); // Assuming 40% cost
+            const cost = stat.total_cost || 0;
             const profit = sales - cost;
-            const service = Math.round(sales * 0.1); // Assuming 10% service
-            const tax = Math.round(sales * 0.05); // Assuming 5% tax
+            const service = stat.service_charge || 0;
+            const tax = stat.tax_amount || 0;
             
             monthlyCount += count;
             monthlyTotalSales += sales;
@@ -302,7 +299,7 @@ function updateMonthlyReport(data, month, year) {
             
             const row = document.createElement('tr');
             row.innerHTML = `
-                <td>${stat.month}</td>
+                <td>${stat.date}</td>
                 <td>${count}</td>
                 <td>${formatCurrency(sales)}</td>
                 <td>${formatCurrency(cost)}</td>
@@ -344,9 +341,9 @@ function updateMonthlyChart(monthlyStats) {
         monthlyChart.destroy();
     }
     
-    const labels = monthlyStats.map(stat => stat.month).reverse();
+    const labels = monthlyStats.map(stat => stat.date).reverse();
     const salesData = monthlyStats.map(stat => stat.total_sales || 0).reverse();
-    const profitData = monthlyStats.map(stat => Math.round((stat.total_sales || 0) * 0.6)).reverse(); // 60% profit
+    const profitData = monthlyStats.map(stat => stat.total_profit || 0).reverse();
     
     monthlyChart = new Chart(ctx, {
         type: 'line',
@@ -976,15 +973,15 @@ function hideLoading() {
 
 // Export functions
 function exportReport() {
+    const startDate = document.getElementById('start-date').value;
+    const endDate = document.getElementById('end-date').value;
+    
     if (window.ktvUtils) {
         window.ktvUtils.showToast('Excel ထုတ်ယူနေပါသည်...', 'info');
     }
-    // In real app, you'd implement actual export functionality
-    setTimeout(() => {
-        if (window.ktvUtils) {
-            window.ktvUtils.showToast('Excel ဖိုင်ထုတ်ယူပြီးပါပြီ', 'success');
-        }
-    }, 2000);
+    // Streamed by the server; the browser saves it as a download
+    const params = new URLSearchParams({ format: 'xlsx', start: startDate, end: endDate });
+    window.location.href = `/api/export/sales?${params}`;
 }
 
 function printReport() {
@@ -31,6 +31,7 @@ document.addEventListener('DOMContentLoaded', function() {
             setupEventListeners();
             updateStats();
             updateDateTime();
+            subscribeRoomEvents();
         } catch (error) {
             console.error('Error initializing rooms app:', error);
             showNotification('စနစ်စတင်ရာတွင် အမှားဖြစ်ခဲ့သည်', 'error');
@@ -109,10 +110,11 @@ document.addEventListener('DOMContentLoaded', function() {
     
     async function loadRooms() {
         try {
-            // Load rooms from API
-            const response = await fetch('/api/rooms');
+            // Load rooms with their pending order summaries in one request
+            const response = await fetch('/api/room_board');
             if (response.ok) {
-                allRooms = await response.json();
+                const data = await response.json();
+                allRooms = data.rooms || [];
                 displayRooms(allRooms);
                 showNotification(`အခန်း ${allRooms.length} ခု ရယူပြီးပါပြီ`, 'success');
             } else {
@@ -136,25 +138,47 @@ document.addEventListener('DOMContentLoaded', function() {
         if (availableRoomsElement) availableRoomsElement.textContent = availableRooms;
         if (occupiedRoomsElement) occupiedRoomsElement.textContent = occupiedRooms;
         
-        // Get rooms with pending orders
-        fetch('/api/rooms')
-            .then(response => response.json())
-            .then(rooms => {
-                let roomsWithOrders = 0;
-                rooms.forEach(room => {
-                    // Check if room has pending orders
-                    fetch(`/api/get_room_order/${room.id}`)
-                        .then(res => res.json())
-                        .then(data => {
-                            if (data.success && data.order) {
-                                roomsWithOrders++;
-                                if (roomsWithOrdersElement) {
-                                    roomsWithOrdersElement.textContent = roomsWithOrders;
-                                }
-                            }
-                        });
-                });
-            });
+        // Rooms with pending orders (summaries come with the room board)
+        const roomsWithOrders = allRooms.filter(room => room.pending_order).length;
+        if (roomsWithOrdersElement) roomsWithOrdersElement.textContent = roomsWithOrders;
+    }
+    
+    // Apply live room and order changes pushed by the server instead of polling
+    function subscribeRoomEvents() {
+        subscribeChanges({
+            room_status: (data) => {
+                const room = allRooms.find(r => r.id === data.room_id);
+                if (room && data.status) {
+                    room.status = data.status;
+                    refreshRoomGrid();
+                }
+            },
+            room_order: (data) => {
+                const room = allRooms.find(r => r.id === data.room_id);
+                if (!room) return;
+                
+                room.pending_order = data.pending_order;
+                if (room.pending_order) {
+                    const openedAt = Date.parse(room.pending_order.opened_at.replace(' ', 'T') + 'Z');
+                    room.pending_order.elapsed_minutes = Math.max(0, Math.floor((Date.now() - openedAt) / 60000));
+                }
+                refreshRoomGrid();
+            },
+            rooms: async () => {
+                await loadRooms();
+                updateStats();
+            }
+        });
+    }
+    
+    function refreshRoomGrid() {
+        const activeFilter = document.querySelector('.filter-btn.active');
+        if (roomSearchInput && roomSearchInput.value.trim()) {
+            searchRooms();
+        } else {
+            filterRooms(activeFilter ? activeFilter.getAttribute('data-type') : 'all');
+        }
+        updateStats();
     }
     
     function displayRooms(rooms) {
@@ -201,19 +225,8 @@ document.addEventListener('DOMContentLoaded', function() {
         roomElement.className = roomClass;
         roomElement.dataset.id = room.id;
         
-        // Get pending orders count for this room
-        let orderCount = 0;
-        fetch(`/api/get_room_order/${room.id}`)
-            .then(response => response.json())
-            .then(data => {
-                if (data.success && data.order) {
-                    orderCount = 1;
-                    const orderBadge = roomElement.querySelector('.order-count-badge');
-                    if (orderBadge) {
-                        orderBadge.textContent = `📦 မှာစာရှိ`;
-                    }
-                }
-            });
+        // Pending order summary from the room board
+        const pendingOrder = room.pending_order;
         
         roomElement.innerHTML = `
             <div class="room-header">
@@ -238,10 +251,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     <span>${room.hourly_rate.toLocaleString()} ကျပ်</span>
                 </div>
             </div>
-            ${orderCount > 0 ? `
+            ${pendingOrder ? `
                 <div class="room-order-info">
                     <div class="order-count-badge">
-                        <i class="fas fa-shopping-cart"></i> မှာစာရှိ
+                        <i class="fas fa-shopping-cart"></i> မှာစာရှိ (${pendingOrder.item_count})
+                    </div>
+                    <div class="order-total">
+                        ${pendingOrder.total_amount.toLocaleString()} ကျပ်
+                        ${pendingOrder.elapsed_minutes !== null ? ` · ${pendingOrder.elapsed_minutes} မိနစ်` : ''}
                     </div>
                 </div>
             ` : ''}
@@ -340,34 +357,31 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('view-room-created').textContent = room.created_at ? new Date(room.created_at).toLocaleDateString('my-MM') : '-';
         document.getElementById('view-room-description').textContent = room.notes || 'အချက်အလက်မရှိပါ';
         
-        // Check for pending orders
-        fetch(`/api/get_room_order/${room.id}`)
-            .then(response => response.json())
-            .then(data => {
-                const ordersList = document.getElementById('room-orders-list');
-                if (data.success && data.order) {
-                    ordersList.innerHTML = `
-                        <div class="order-item">
-                            <div class="order-header">
-                                <span>Pending Order</span>
-                                <span>${new Date(data.order.created_at).toLocaleDateString('my-MM')}</span>
-                            </div>
-                            <div class="order-details">
-                                <span>${data.order.order_data ? JSON.parse(data.order.order_data).length : 0} items</span>
-                                <span class="order-total">${data.order.total_amount ? data.order.total_amount.toLocaleString() : '0'} ကျပ်</span>
-                            </div>
-                        </div>
-                    `;
-                    document.getElementById('room-orders-section').style.display = 'block';
-                } else {
-                    ordersList.innerHTML = `
-                        <p style="text-align: center; color: #999; padding: 20px;">
-                            ယခင်အမှာစာများ မရှိပါ
-                        </p>
-                    `;
-                    document.getElementById('room-orders-section').style.display = 'none';
-                }
-            });
+        // Pending order summary from the room board
+        const ordersList = document.getElementById('room-orders-list');
+        const pendingOrder = room.pending_order;
+        if (pendingOrder) {
+            ordersList.innerHTML = `
+                <div class="order-item">
+                    <div class="order-header">
+                        <span>Pending Order</span>
+                        <span>${new Date(pendingOrder.opened_at.replace(' ', 'T') + 'Z').toLocaleDateString('my-MM')}</span>
+                    </div>
+                    <div class="order-details">
+                        <span>${pendingOrder.item_count} items</span>
+                        <span class="order-total">${pendingOrder.total_amount.toLocaleString()} ကျပ်</span>
+                    </div>
+                </div>
+            `;
+            document.getElementById('room-orders-section').style.display = 'block';
+        } else {
+            ordersList.innerHTML = `
+                <p style="text-align: center; color: #999; padding: 20px;">
+                    ယခင်အမှာစာများ မရှိပါ
+                </p>
+            `;
+            document.getElementById('room-orders-section').style.display = 'none';
+        }
         
         // Open view modal
         openModal(document.getElementById('room-view-modal'));
@@ -455,11 +469,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 filteredRooms = allRooms.filter(room => room.status === 'available');
                 break;
             case 'has-orders':
-                // We'll filter dynamically
-                filteredRooms = allRooms.filter(room => {
-                    // This would need async checking, so for now show all
-                    return true;
-                });
+                filteredRooms = allRooms.filter(room => room.pending_order);
                 break;
             default:
                 filteredRooms = allRooms;
@@ -10,6 +10,22 @@ let menuItems = [];
 let currentRoomId = null;
 let currentRoomName = 'မရွေးရသေးပါ';
 let currentRoomData = null;
+let stockVersion = 0;
+let currentOrderId = null;  // the room's pending order these cart edits apply to
+let orderSyncTimer = null;
+let orderSyncDirty = false;  // edits or tax/service changes made since the last batch
+let orderSyncInFlight = null;  // promise of the edit batch being sent
+let orderSeq = 0;
+let pendingOrderChanges = {};  // menu item id -> quantity delta not yet sent
+let pendingOrderClear = false;
+const ORDER_SYNC_DELAY_MS = 400;  // cart edits within this window are saved as one request
+const ORDER_SYNC_RETRY_MS = 2000;
+// Identifies this page's edits, so a retried batch is applied once and two tablets never collide
+const ORDER_CLIENT_ID = Math.random().toString(36).slice(2) + Date.now().toString(36);
+const MENU_CACHE_KEY = 'ktv_menu_catalog';
+
+// Room, pending order, user, stock and catalog version rendered into the page by the sale view
+const saleBootstrap = readSaleBootstrap();
 
 // ===========================
 // Initialization
@@ -34,18 +50,35 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize all components
     setupEventListeners();
-    loadMenuItems();
+    initMenuItems().then(() => {
+        subscribeMenuEvents(saleBootstrap ? saleBootstrap.events_since : null);
+    });
     
     // Update date/time initially
     updateDateTime();
     setInterval(updateDateTime, 60000);
     
     // Load user info
-    loadUserInfo();
+    if (saleBootstrap) {
+        showUserInfo(saleBootstrap.user);
+    } else {
+        loadUserInfo();
+    }
     
     console.log('Sale page initialization complete');
 });
 
+function readSaleBootstrap() {
+    const element = document.getElementById('sale-bootstrap');
+    if (!element) return null;
+    try {
+        return JSON.parse(element.textContent);
+    } catch (error) {
+        console.log('Sale bootstrap data not readable, loading from the API');
+        return null;
+    }
+}
+
 // ===========================
 // Room Functions
 // ===========================
@@ -54,6 +87,15 @@ function initRoomFromTemplate() {
     const roomInfoCard = document.querySelector('.room-info-card');
     if (!roomInfoCard) return;
     
+    // Room and pending order came with the page
+    if (saleBootstrap && saleBootstrap.room) {
+        setCurrentRoom(saleBootstrap.room);
+        if (saleBootstrap.order) {
+            restoreOrder(saleBootstrap.order);
+        }
+        return;
+    }
+    
     // Try to get room info from various sources
     currentRoomId = getRoomIdFromSession();
     
@@ -107,16 +149,7 @@ function loadRoomDetails(roomId) {
         })
         .then(data => {
             if (data.success && data.room) {
-                currentRoomData = data.room;
-                currentRoomId = data.room.id;
-                currentRoomName = data.room.room_name || data.room.room_number;
-                
-                // Save to localStorage
-                localStorage.setItem('ktv_current_room_id', currentRoomId);
-                localStorage.setItem('ktv_current_room_name', currentRoomName);
-                
-                updateRoomDisplay();
-                enableOrderActions();
+                setCurrentRoom(data.room);
                 loadExistingOrder();
             }
         })
@@ -131,7 +164,20 @@ function loadRoomDetails(roomId) {
         });
 }
 
-function loadExistingOrder() {
+function setCurrentRoom(room) {
+    currentRoomData = room;
+    currentRoomId = room.id;
+    currentRoomName = room.room_name || room.room_number;
+    
+    // Save to localStorage
+    localStorage.setItem('ktv_current_room_id', currentRoomId);
+    localStorage.setItem('ktv_current_room_name', currentRoomName);
+    
+    updateRoomDisplay();
+    enableOrderActions();
+}
+
+function loadExistingOrder(reload = false) {
     if (!currentRoomId) return;
     
     // Try to load saved order from server
@@ -144,11 +190,10 @@ function loadExistingOrder() {
         })
         .then(data => {
             if (data.success && data.order) {
-                // Load existing order items
-                orderItems = data.order.order_data || [];
-                updateOrderDisplay();
-                updatePaymentSummary();
-                showToast('အရင်သိမ်းဆည်းထားသော Order ကို ပြန်လည်ထည့်သွင်းပြီးပါပြီ', 'info');
+                restoreOrder(data.order);
+            } else if (reload) {
+                // The order was checked out or cleared elsewhere: start from an empty cart
+                restoreOrder(null);
             }
         })
         .catch(error => {
@@ -156,6 +201,24 @@ function loadExistingOrder() {
         });
 }
 
+function restoreOrder(order) {
+    // Load existing order items; the server's order replaces anything not yet sent
+    currentOrderId = order ? order.id : null;
+    orderItems = order ? (order.order_data || []) : [];
+    pendingOrderChanges = {};
+    pendingOrderClear = false;
+    orderSyncDirty = false;
+    const customerCount = document.getElementById('customer-count');
+    const notes = document.getElementById('order-notes');
+    if (customerCount) customerCount.value = order ? (order.customer_count || 1) : 1;
+    if (notes) notes.value = order ? (order.notes || '') : '';
+    updateOrderDisplay();
+    updatePaymentSummary();
+    if (order) {
+        showToast('အရင်သိမ်းဆည်းထားသော Order ကို ပြန်လည်ထည့်သွင်းပြီးပါပြီ', 'info');
+    }
+}
+
 function updateRoomDisplay() {
     const roomDisplay = document.getElementById('current-room-display');
     if (roomDisplay) {
@@ -280,9 +343,9 @@ function setupEventListeners() {
     const menuSearch = document.getElementById('menu-search');
     const searchBtn = document.getElementById('search-btn');
     if (menuSearch) {
-        menuSearch.addEventListener('input', function() {
-            filterMenuItems(this.value);
-        });
+        menuSearch.addEventListener('input', debounce(function() {
+            filterMenuItems(menuSearch.value);
+        }, 150));
     }
     if (searchBtn) {
         searchBtn.addEventListener('click', function() {
@@ -308,14 +371,25 @@ function setupEventListeners() {
     document.getElementById('print-bill-btn')?.addEventListener('click', printBill);
     
     // Tax and service checkboxes
-    document.getElementById('tax-checkbox')?.addEventListener('change', updatePaymentSummary);
-    document.getElementById('service-checkbox')?.addEventListener('change', updatePaymentSummary);
+    document.getElementById('tax-checkbox')?.addEventListener('change', function() {
+        updatePaymentSummary();
+        if (orderItems.length > 0) scheduleOrderSync();
+    });
+    document.getElementById('service-checkbox')?.addEventListener('change', function() {
+        updatePaymentSummary();
+        if (orderItems.length > 0) scheduleOrderSync();
+    });
+    window.addEventListener('pagehide', () => flushOrderSync(true));
     
     // Customer count
     document.getElementById('customer-count')?.addEventListener('change', function() {
         const value = parseInt(this.value);
         if (value < 1) this.value = 1;
         if (value > 50) this.value = 50;
+        if (orderItems.length > 0) scheduleOrderSync();
+    });
+    document.getElementById('order-notes')?.addEventListener('change', function() {
+        if (orderItems.length > 0) scheduleOrderSync();
     });
 }
 
@@ -355,26 +429,7 @@ function loadUserInfo() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                // Update sidebar user name
-                const sidebarUserName = document.getElementById('sidebar-user-name');
-                if (sidebarUserName) {
-                    sidebarUserName.textContent = data.user.full_name || 'အက်မင်';
-                }
-                
-                // Update staff name in info bar
-                const staffName = document.getElementById('staff-name');
-                if (staffName) {
-                    staffName.textContent = data.user.full_name || 'အက်မင်';
-                }
-                
-                // Update login time
-                const loginTime = document.getElementById('login-time');
-                if (loginTime) {
-                    const now = new Date();
-                    const timeStr = now.getHours().toString().padStart(2, '0') + ':' + 
-                                   now.getMinutes().toString().padStart(2, '0');
-                    loginTime.textContent = `လော့ဂ်အင်: ${timeStr}`;
-                }
+                showUserInfo(data.user);
             }
         })
         .catch(error => {
@@ -382,12 +437,70 @@ function loadUserInfo() {
         });
 }
 
+function showUserInfo(user) {
+    // Update sidebar user name
+    const sidebarUserName = document.getElementById('sidebar-user-name');
+    if (sidebarUserName) {
+        sidebarUserName.textContent = user.full_name || 'အက်မင်';
+    }
+    
+    // Update staff name in info bar
+    const staffName = document.getElementById('staff-name');
+    if (staffName) {
+        staffName.textContent = user.full_name || 'အက်မင်';
+    }
+    
+    // Update login time
+    const loginTime = document.getElementById('login-time');
+    if (loginTime) {
+        const now = new Date();
+        const timeStr = now.getHours().toString().padStart(2, '0') + ':' + 
+                       now.getMinutes().toString().padStart(2, '0');
+        loginTime.textContent = `လော့ဂ်အင်: ${timeStr}`;
+    }
+}
+
 // ===========================
 // Menu Functions
 // ===========================
-function loadMenuItems() {
+// First load: reuse the catalog cached by an earlier visit when the page says it is still current
+function initMenuItems() {
+    if (!saleBootstrap) {
+        return loadMenuItems();
+    }
+    
+    const cached = readCachedCatalog();
+    if (cached && cached.etag === saleBootstrap.menu.etag) {
+        menuItems = cached.items;
+        indexMenuItems();
+        applyStockLevels(saleBootstrap.stock);
+        loadMenuItemsByCategory(currentCategory);
+        return Promise.resolve();
+    }
+    return loadMenuItems(saleBootstrap.stock);
+}
+
+function readCachedCatalog() {
+    try {
+        return JSON.parse(localStorage.getItem(MENU_CACHE_KEY));
+    } catch (error) {
+        return null;
+    }
+}
+
+function cacheCatalog(etag, items) {
+    if (!etag) return;
+    try {
+        localStorage.setItem(MENU_CACHE_KEY, JSON.stringify({ etag: etag, items: items }));
+    } catch (error) {
+        localStorage.removeItem(MENU_CACHE_KEY);  // over quota: just refetch next time
+    }
+}
+
+// Fetch the catalog; stock levels come from `stock` when the page already has them
+function loadMenuItems(stock = null) {
     const menuGrid = document.getElementById('menu-items-grid');
-    if (!menuGrid) return;
+    if (!menuGrid) return Promise.resolve();
     
     // Show loading state
     menuGrid.innerHTML = `
@@ -397,28 +510,85 @@ function loadMenuItems() {
         </div>
     `;
     
-    // Fetch menu items from API
-    fetch('/api/menu_items')
+    // Fetch the menu catalog (revalidated with its ETag), then current stock levels
+    let etag = null;
+    return fetch('/api/menu_items')
         .then(response => {
             if (!response.ok) {
                 throw new Error('API not available');
             }
+            etag = (response.headers.get('ETag') || '').replace(/^W\//, '').replace(/"/g, '');
             return response.json();
         })
         .then(data => {
             if (data.success && data.items) {
+                cacheCatalog(etag, data.items);
                 menuItems = data.items;
-                loadMenuItemsByCategory(currentCategory);
+                indexMenuItems();
+                if (stock) {
+                    applyStockLevels(stock);
+                    return true;
+                }
+                return loadStockLevels(true);
             } else {
                 throw new Error('No items data');
             }
         })
+        .then(() => {
+            loadMenuItemsByCategory(currentCategory);
+        })
         .catch(error => {
             console.log('Using sample menu data');
             loadSampleMenuData();
         });
 }
 
+// Merge stock levels into the catalog; full reload or only changes since the last stock version
+function loadStockLevels(full = false) {
+    const url = (!full && stockVersion) ? `/api/menu_stock?since=${stockVersion}` : '/api/menu_stock';
+    
+    return fetch(url)
+        .then(response => response.json())
+        .then(data => data.success ? applyStockLevels(data) : false);
+}
+
+// Merge a /api/menu_stock payload into menuItems; returns whether any level changed
+function applyStockLevels(data) {
+    let changed = false;
+    menuItems.forEach(item => {
+        if (item.id in data.stock) {
+            changed = changed || item.stock !== data.stock[item.id];
+            item.stock = data.stock[item.id];
+        } else if (data.full) {
+            item.stock = 0;
+        }
+    });
+    stockVersion = data.version;
+    return changed;
+}
+
+// Apply live stock and menu changes pushed by the server, starting after event `since` when given
+function subscribeMenuEvents(since = null) {
+    subscribeChanges({
+        stock: (data) => {
+            let changed = false;
+            menuItems.forEach(item => {
+                if (item.id in data.stock) {
+                    changed = changed || item.stock !== data.stock[item.id];
+                    item.stock = data.stock[item.id];
+                }
+            });
+            stockVersion = Math.max(stockVersion, data.version);
+            if (changed) {
+                loadMenuItemsByCategory(currentCategory);
+            }
+        },
+        menu: () => {
+            loadMenuItems();
+        }
+    }, since);
+}
+
 function loadSampleMenuData() {
     menuItems = [
         { id: 1, name: 'VIP Room', category_name: 'room', sale_price: 50000, stock: 10, image_url: null },
@@ -437,6 +607,7 @@ function loadSampleMenuData() {
         { id: 14, name: 'အမဲသား', category_name: 'pork', sale_price: 15000, stock: 12, image_url: null },
         { id: 15, name: 'ပုစွန်ကြော်', category_name: 'prawn', sale_price: 18000, stock: 8, image_url: null }
     ];
+    indexMenuItems();
     
     loadMenuItemsByCategory(currentCategory);
 }
@@ -475,7 +646,7 @@ function loadMenuItemsByCategory(category) {
                  data-stock="${item.stock}"
                  title="${item.name} - ${formatCurrency(item.sale_price)} (လက်ကျန်: ${item.stock})">
                 ${item.image_url ? 
-                    `<img src="${item.image_url}" alt="${item.name}" class="item-image">` : 
+                    itemImageTag(item, 'item-image') : 
                     `<div class="item-icon">
                         <i class="fas fa-${getIconForCategory(item.category_name)}"></i>
                     </div>`
@@ -497,6 +668,18 @@ function loadMenuItemsByCategory(category) {
     attachMenuItemsEvents();
 }
 
+// Grid thumbnail: WebP with PNG fallback when resized variants exist
+function itemImageTag(item, className) {
+    const thumb = item.images && item.images.thumb;
+    if (!thumb) {
+        return `<img src="${item.image_url}" alt="${item.name}" class="${className}" loading="lazy">`;
+    }
+    return `<picture>
+        <source srcset="${thumb.webp}" type="image/webp">
+        <img src="${thumb.png}" alt="${item.name}" class="${className}" width="${thumb.width}" height="${thumb.height}" loading="lazy">
+    </picture>`;
+}
+
 function getIconForCategory(category) {
     const icons = {
         'room': 'door-closed',
@@ -517,6 +700,13 @@ function getIconForCategory(category) {
     return icons[category] || 'box';
 }
 
+// Lower-cased name + category per item, built once per catalog load instead of on every keystroke
+function indexMenuItems() {
+    menuItems.forEach(item => {
+        item.searchKey = `${item.name} ${item.category_name || ''}`.toLowerCase();
+    });
+}
+
 function filterMenuItems(searchText) {
     const menuGrid = document.getElementById('menu-items-grid');
     if (!menuGrid) return;
@@ -531,10 +721,7 @@ function filterMenuItems(searchText) {
     
     // Then filter by search text
     if (searchText) {
-        filteredItems = filteredItems.filter(item => 
-            item.name.toLowerCase().includes(searchText) ||
-            (item.category_name && item.category_name.toLowerCase().includes(searchText))
-        );
+        filteredItems = filteredItems.filter(item => item.searchKey.includes(searchText));
     }
     
     if (filteredItems.length === 0) {
@@ -560,7 +747,7 @@ function filterMenuItems(searchText) {
                  data-category="${item.category_name}"
                  data-stock="${item.stock}">
                 ${item.image_url ? 
-                    `<img src="${item.image_url}" alt="${item.name}" class="item-image">` : 
+                    itemImageTag(item, 'item-image') : 
                     `<div class="item-icon">
                         <i class="fas fa-${getIconForCategory(item.category_name)}"></i>
                     </div>`
@@ -629,6 +816,7 @@ function addToOrder(itemId, itemName, itemPrice, itemStock) {
         
         orderItems[existingIndex].quantity = newQuantity;
         orderItems[existingIndex].total = newQuantity * itemPrice;
+        recordOrderChange(itemId, 1);
     } else {
         // Check stock before adding new item
         if (itemStock < 1) {
@@ -644,6 +832,7 @@ function addToOrder(itemId, itemName, itemPrice, itemStock) {
             total: itemPrice,
             stock: itemStock
         });
+        recordOrderChange(itemId, 1);
     }
     
     updateOrderDisplay();
@@ -733,6 +922,7 @@ function updateOrderQuantity(itemId, change, customValue = null) {
         return;
     }
     
+    recordOrderChange(itemId, newQuantity - item.quantity);
     item.quantity = newQuantity;
     item.total = newQuantity * item.price;
     
@@ -745,6 +935,7 @@ function removeFromOrder(itemId) {
     if (itemIndex === -1) return;
     
     const itemName = orderItems[itemIndex].name;
+    recordOrderChange(itemId, -orderItems[itemIndex].quantity);
     orderItems.splice(itemIndex, 1);
     
     updateOrderDisplay();
@@ -769,6 +960,9 @@ function clearOrder() {
     }).then((result) => {
         if (result.isConfirmed) {
             orderItems = [];
+            pendingOrderChanges = {};
+            pendingOrderClear = true;
+            scheduleOrderSync();
             updateOrderDisplay();
             updatePaymentSummary();
             showToast('Order အားလုံးကို ဖျက်လိုက်ပါပြီ', 'success');
@@ -776,6 +970,100 @@ function clearOrder() {
     });
 }
 
+// Cart edits are sent as per-item deltas, so tablets sharing a room add to one order
+function recordOrderChange(itemId, delta) {
+    if (delta === 0) return;
+    pendingOrderChanges[itemId] = (pendingOrderChanges[itemId] || 0) + delta;
+    scheduleOrderSync();
+}
+
+// Debounced autosave: a burst of taps becomes one batch of deltas
+function scheduleOrderSync() {
+    if (currentRoomId === null) return;
+    orderSyncDirty = true;
+    clearTimeout(orderSyncTimer);
+    orderSyncTimer = setTimeout(() => flushOrderSync(), ORDER_SYNC_DELAY_MS);
+}
+
+function cancelOrderSync() {
+    clearTimeout(orderSyncTimer);
+    orderSyncTimer = null;
+}
+
+// Send the edits made since the last batch; resolves with the server's reply (null if there was nothing to send)
+function flushOrderSync(keepalive = false, flush = false) {
+    if (currentRoomId === null) return Promise.resolve(null);
+    cancelOrderSync();
+    if (!orderSyncDirty && !flush) return Promise.resolve(null);
+    
+    if (orderSyncInFlight && !keepalive) {
+        // One batch at a time, so this page's batches reach the server in order
+        return orderSyncInFlight.then(() => flushOrderSync(false, flush));
+    }
+    
+    const changes = Object.keys(pendingOrderChanges)
+        .filter(id => pendingOrderChanges[id] !== 0)
+        .map(id => ({ id: parseInt(id), quantity: pendingOrderChanges[id] }));
+    const batch = {
+        room_id: currentRoomId,
+        order_id: currentOrderId,
+        client_id: ORDER_CLIENT_ID,
+        client_seq: ++orderSeq,
+        clear: pendingOrderClear,
+        changes: changes,
+        apply_tax: document.getElementById('tax-checkbox')?.checked || false,
+        apply_service: document.getElementById('service-checkbox')?.checked || false,
+        customer_count: parseInt(document.getElementById('customer-count')?.value) || 1,
+        notes: document.getElementById('order-notes')?.value || '',
+        flush: flush
+    };
+    pendingOrderChanges = {};
+    pendingOrderClear = false;
+    orderSyncDirty = false;
+    
+    const request = sendOrderBatch(batch, keepalive).finally(() => {
+        if (orderSyncInFlight === request) orderSyncInFlight = null;
+    });
+    if (!keepalive) orderSyncInFlight = request;
+    return request;
+}
+
+// A batch that never got an answer is resent as is: the server applies each client_seq once
+function sendOrderBatch(batch, keepalive = false) {
+    return fetch('/api/room_order/' + batch.room_id + '/items', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(batch),
+        keepalive: keepalive
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.stale) {
+            showToast('ဤ Order ကို အခြားစက်မှ ပြောင်းလဲထားပါသည်။ ပြန်လည်ဖွင့်နေပါသည်', 'warning');
+            restoreOrder(data.order);
+        } else if (data.order_id) {
+            currentOrderId = data.order_id;
+        }
+        if (!data.success && !data.stale) {
+            console.error('Order sync failed:', data.error);
+            if (!data.queued) {
+                // Rejected (e.g. not enough stock): show what the server actually holds
+                showToast(data.error || 'Order သိမ်းဆည်းရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
+                loadExistingOrder(true);
+            }
+        }
+        return data;
+    })
+    .catch(error => {
+        console.error('Error syncing order:', error);
+        if (keepalive) return null;
+        return new Promise(resolve => setTimeout(resolve, ORDER_SYNC_RETRY_MS))
+            .then(() => sendOrderBatch(batch));
+    });
+}
+
 // ===========================
 // Checkout Functions
 // ===========================
@@ -817,11 +1105,6 @@ function saveOrder() {
         return;
     }
     
-    const applyTax = document.getElementById('tax-checkbox')?.checked || false;
-    const applyService = document.getElementById('service-checkbox')?.checked || false;
-    const customerCount = document.getElementById('customer-count')?.value || 1;
-    const notes = document.getElementById('order-notes')?.value || '';
-    
     // Show loading
     Swal.fire({
         title: 'သိမ်းဆည်းနေသည်...',
@@ -832,34 +1115,20 @@ function saveOrder() {
         }
     });
     
-    // Save order to server
-    fetch('/api/save_room_order', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            room_id: currentRoomId,
-            order_items: orderItems,
-            apply_tax: applyTax,
-            apply_service: applyService,
-            customer_count: customerCount,
-            notes: notes
-        })
-    })
-    .then(response => response.json())
+    // Send any edits not yet saved and have the server write them now
+    flushOrderSync(false, true)
     .then(data => {
         Swal.close();
-        if (data.success) {
+        if (data && data.success) {
             showToast('Order သိမ်းဆည်းပြီးပါပြီ', 'success');
-        } else {
+        } else if (data && !data.stale) {
             Swal.fire('အမှား', data.error || 'Order သိမ်းဆည်းရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
         }
     })
     .catch(error => {
         Swal.close();
         console.error('Error saving order:', error);
-        Swal.fire('အမှား', 'ဆာဗာနှင့်ချိတ်ဆက်ရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
+        Swal.fire('အမှား', 'ဆာဗာနှင့်ချိတ်ဆက်ရာတွင် အမှားတစ်ခုဖြစ်နေသည်', 'error');
     });
 }
 
@@ -939,7 +1208,13 @@ function processCheckout() {
                 }
             });
             
-            fetch('/api/checkout_sale', {
+            // The checkout carries the whole cart, so unsent edits are dropped; a batch already
+            // on its way may open the order, so let it land before the order is closed
+            cancelOrderSync();
+            pendingOrderChanges = {};
+            pendingOrderClear = false;
+            orderSyncDirty = false;
+            (orderSyncInFlight || Promise.resolve(null)).then(() => fetch('/api/checkout_sale', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -952,7 +1227,7 @@ function processCheckout() {
                     customer_count: customerCount,
                     notes: notes
                 })
-            })
+            }))
             .then(response => response.json())
             .then(data => {
                 Swal.close();
@@ -0,0 +1,233 @@
+// Stocks Page JavaScript
+// Items are searched, filtered and sorted on the server and loaded page by page
+
+// ===========================
+// Global Variables
+// ===========================
+let stockCursor = null;      // next_cursor of the last loaded page, null when everything is loaded
+let stockRequestId = 0;      // ignore responses to superseded searches
+let stockLoading = false;
+let stockObserver = null;
+const STOCK_PAGE_SIZE = 50;
+
+// ===========================
+// Initialization
+// ===========================
+document.addEventListener('DOMContentLoaded', function() {
+    loadStocks();
+});
+
+// ===========================
+// Data Loading Functions
+// ===========================
+function stockSearchParams() {
+    const params = new URLSearchParams({
+        limit: STOCK_PAGE_SIZE,
+        sort: document.getElementById('sort-by').value
+    });
+    const searchText = document.getElementById('stock-search').value.trim();
+    if (searchText) params.set('q', searchText);
+    
+    switch (document.getElementById('category-filter').value) {
+        case 'low':
+            params.set('stock', 'low');
+            break;
+        case 'out':
+            params.set('stock', 'out');
+            break;
+        case 'active':
+            params.set('status', 'active');
+            break;
+        case 'inactive':
+            params.set('status', 'inactive');
+            break;
+    }
+    return params;
+}
+
+// First page for the current search/filter/sort, or the next page when append is true
+function loadStocks(append = false) {
+    const tbody = document.getElementById('stocks-body');
+    if (append && (!stockCursor || stockLoading)) return;
+    
+    const params = stockSearchParams();
+    if (append) {
+        params.set('after', stockCursor);
+    } else {
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="8" class="text-center">
+                    <i class="fas fa-spinner fa-spin"></i> ပစ္စည်းများ တင်နေပါသည်...
+                </td>
+            </tr>
+        `;
+    }
+    
+    const requestId = ++stockRequestId;
+    stockLoading = true;
+    
+    fetch(`/api/menu_search?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (requestId !== stockRequestId) return;
+            if (!data.success) {
+                throw new Error(data.error || 'Failed to load stocks');
+            }
+            stockCursor = data.next_cursor;
+            renderStockRows(data.items, append);
+            if (data.stats) {
+                updateStockStats(data.stats);
+            }
+        })
+        .catch(error => {
+            if (requestId !== stockRequestId) return;
+            console.error('Error loading stocks:', error);
+            tbody.innerHTML = `
+                <tr>
+                    <td colspan="8" class="text-center">
+                        ပစ္စည်းများ တင်ရာတွင် အမှားတစ်ခုဖြစ်နေသည်
+                        <button onclick="loadStocks()" class="btn btn-sm btn-primary">
+                            <i class="fas fa-redo"></i> ပြန်လည်တင်ရန်
+                        </button>
+                    </td>
+                </tr>
+            `;
+        })
+        .finally(() => {
+            if (requestId === stockRequestId) stockLoading = false;
+        });
+}
+
+// ===========================
+// Rendering Functions
+// ===========================
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
+}
+
+function renderStockRows(items, append = false) {
+    const tbody = document.getElementById('stocks-body');
+    const loadMoreRow = document.getElementById('stocks-load-more');
+    if (loadMoreRow) loadMoreRow.remove();
+    
+    const offset = append ? tbody.querySelectorAll('tr[data-item-id]').length : 0;
+    document.getElementById('stocks-empty').style.display = (!append && items.length === 0) ? '' : 'none';
+    
+    let html = '';
+    items.forEach((item, index) => {
+        const minStock = item.min_stock || 5;
+        const disabled = item.status === 'inactive' ? 'disabled' : '';
+        // Item name as a quoted JS string inside a double-quoted attribute
+        const nameArg = escapeHtml(JSON.stringify(item.name));
+        
+        let statusBadge;
+        if (item.status === 'inactive') {
+            statusBadge = '<span class="status-badge inactive">ရောင်းမရ</span>';
+        } else if (item.stock <= 0) {
+            statusBadge = '<span class="status-badge out-of-stock">ပစ္စည်းကုန်</span>';
+        } else if (item.stock <= minStock) {
+            statusBadge = '<span class="status-badge low-stock">လက်ကျန်နည်း</span>';
+        } else {
+            statusBadge = '<span class="status-badge available">ရောင်းနိုင်</span>';
+        }
+        
+        html += `
+            <tr data-item-id="${item.id}"
+                data-stock="${item.stock}"
+                data-min-stock="${item.min_stock}"
+                data-status="${item.status}">
+                <td>${offset + index + 1}</td>
+                <td class="item-name">${escapeHtml(item.name)}</td>
+                <td>${escapeHtml(item.category_display || '')}</td>
+                <td class="item-price">${(item.sale_price || 0).toLocaleString()} Ks</td>
+                <td>
+                    <span class="stock-quantity">${item.stock}</span> ${escapeHtml(item.unit || '')}
+                </td>
+                <td class="item-value">${((item.sale_price || 0) * item.stock).toLocaleString()} Ks</td>
+                <td>${statusBadge}</td>
+                <td class="actions">
+                    <button class="btn btn-success btn-sm" onclick="addStock(${item.id}, ${nameArg})" ${disabled}>
+                        <i class="fas fa-plus"></i> ထည့်ရန်
+                    </button>
+                    <button class="btn btn-warning btn-sm" onclick="adjustStock(${item.id}, ${nameArg})" ${disabled}>
+                        <i class="fas fa-edit"></i> ပြင်ရန်
+                    </button>
+                    <button class="btn btn-info btn-sm" onclick="viewHistory(${item.id}, ${nameArg})">
+                        <i class="fas fa-history"></i> မှတ်တမ်း
+                    </button>
+                </td>
+            </tr>
+        `;
+    });
+    
+    if (stockCursor) {
+        html += `
+            <tr id="stocks-load-more">
+                <td colspan="8" class="text-center">
+                    <button onclick="loadStocks(true)" class="btn btn-sm btn-info">
+                        <i class="fas fa-chevron-down"></i> ထပ်ပြရန်
+                    </button>
+                </td>
+            </tr>
+        `;
+    }
+    
+    if (append) {
+        tbody.insertAdjacentHTML('beforeend', html);
+    } else {
+        tbody.innerHTML = html;
+    }
+    observeStockLoadMore();
+}
+
+// Fetch the next page as soon as the "load more" row scrolls into view
+function observeStockLoadMore() {
+    const loadMoreRow = document.getElementById('stocks-load-more');
+    if (!loadMoreRow || !window.IntersectionObserver) return;
+    
+    if (!stockObserver) {
+        stockObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadStocks(true);
+            }
+        }, { rootMargin: '200px' });
+    }
+    stockObserver.disconnect();
+    stockObserver.observe(loadMoreRow);
+}
+
+// Header totals across the whole menu, not just the loaded pages
+function updateStockStats(stats) {
+    document.getElementById('total-items').textContent = stats.total;
+    document.getElementById('low-stock-items').textContent = stats.low_stock;
+    document.getElementById('out-of-stock-items').textContent = stats.out_of_stock;
+    document.getElementById('total-value').textContent = stats.stock_value.toLocaleString() + ' Ks';
+}
+
+// ===========================
+// Search / Filter / Sort
+// ===========================
+const searchStocks = debounce(() => loadStocks(), 250);
+
+function filterStocks() {
+    loadStocks();
+}
+
+function sortStocks() {
+    loadStocks();
+}
+
+function refreshStocks() {
+    loadStocks();
+}
+
+// ===========================
+// Global Function Exports
+// ===========================
+window.loadStocks = loadStocks;
+window.searchStocks = searchStocks;
+window.filterStocks = filterStocks;
+window.sortStocks = sortStocks;
+window.refreshStocks = refreshStocks;
@@ -0,0 +1,41 @@
+"""Fixtures: a fresh migrated database per test and a logged-in client"""
+# pylint: disable=redefined-outer-name,unused-argument
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ktv  # noqa: E402  pylint: disable=wrong-import-position,import-error
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A fresh, fully migrated and seeded database for one test"""
+    path = str(tmp_path / 'ktv_pos.db')
+    ktv.app.config['DATABASE'] = path
+    ktv.app.config['TESTING'] = True
+    ktv.init_db()
+    yield path
+    # Write what is still queued before the next test points the app at another database
+    ktv.room_order_writes.flush()
+    ktv.get_pool().close_all()
+    ktv._users_version = (None, 0.0)  # pylint: disable=protected-access
+
+
+@pytest.fixture
+def conn(db_path):
+    """A pooled connection to the test database"""
+    connection = ktv.get_pool().connect()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def client(db_path):
+    """A test client logged in as the default admin"""
+    test_client = ktv.app.test_client()
+    response = test_client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 302
+    return test_client
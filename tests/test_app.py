@@ -0,0 +1,198 @@
+"""Query plans, checkout, room order autosave and sales rollups against a migrated database"""
+# pylint: disable=missing-function-docstring
+import app as ktv  # pylint: disable=import-error
+
+
+def stocked_items(conn, count):
+    """Ids and prices of the first count menu items with stock to sell"""
+    rows = conn.execute(
+        "SELECT id, sale_price FROM menu_items WHERE stock >= 10 ORDER BY id LIMIT ?", (count,)
+    ).fetchall()
+    assert len(rows) == count
+    return [(row['id'], row['sale_price']) for row in rows]
+
+
+def stock_of(conn, item_id):
+    return conn.execute("SELECT stock FROM menu_items WHERE id = ?", (item_id,)).fetchone()[0]
+
+
+def checkout(client, room_id, lines):
+    return client.post('/api/checkout_sale', json={
+        'room_id': room_id,
+        'order_items': [{'id': item_id, 'name': 'item', 'price': price, 'quantity': quantity}
+                        for item_id, price, quantity in lines]
+    })
+
+
+def pending_lines(conn, room_id):
+    return [tuple(row) for row in conn.execute("""
+        SELECT roi.menu_item_id, roi.quantity
+        FROM room_order_items roi
+        JOIN room_orders ro ON ro.id = roi.room_order_id
+        WHERE ro.room_id = ? AND ro.status = 'pending'
+        ORDER BY roi.id
+    """, (room_id,))]
+
+
+def rollups(conn):
+    return (
+        [tuple(row) for row in conn.execute("SELECT * FROM daily_sales_summary ORDER BY sale_day")],
+        [tuple(row) for row in conn.execute(
+            "SELECT * FROM daily_item_sales ORDER BY sale_day, menu_item_id")],
+    )
+
+
+# ==================== SCHEMA ====================
+
+def test_migrations_reach_latest_version(conn):
+    assert ktv.get_schema_version(conn) == ktv.MIGRATIONS[-1][0]
+
+
+def test_hot_queries_use_their_indexes(conn):
+    assert ktv.check_query_plans(conn) == []
+
+
+# ==================== CHECKOUT ====================
+
+def test_checkout_takes_stock_and_clears_the_room_order(client, conn):
+    (item_id, price), = stocked_items(conn, 1)
+    before = stock_of(conn, item_id)
+    client.post('/api/save_room_order', json={
+        'room_id': 1,
+        'order_items': [{'id': item_id, 'name': 'item', 'price': price, 'quantity': 2}]
+    })
+    assert pending_lines(conn, 1) == [(item_id, 2)]
+
+    response = checkout(client, 1, [(item_id, price, 2)])
+    assert response.status_code == 200
+    assert response.get_json()['success']
+    assert stock_of(conn, item_id) == before - 2
+    assert pending_lines(conn, 1) == []
+    sold = conn.execute(
+        "SELECT quantity FROM sale_items WHERE sale_id = ?", (response.get_json()['sale_id'],)
+    ).fetchall()
+    assert [row['quantity'] for row in sold] == [2]
+
+
+def test_checkout_rejects_insufficient_stock(client, conn):
+    (item_id, price), = stocked_items(conn, 1)
+    before = stock_of(conn, item_id)
+    sales = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+
+    response = checkout(client, 1, [(item_id, price, before + 1)])
+    assert response.status_code == 400
+    assert 'Insufficient stock' in response.get_json()['error']
+    assert stock_of(conn, item_id) == before
+    assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == sales
+
+
+def test_checkout_rejects_unknown_items(client):
+    response = checkout(client, 1, [(10 ** 9, 100, 1)])
+    assert response.status_code == 400
+    assert 'not found' in response.get_json()['error']
+
+
+# ==================== ROOM ORDER AUTOSAVE ====================
+
+def edit(client, room_id, **body):
+    response = client.post(f'/api/room_order/{room_id}/items', json=body)
+    return response.status_code, response.get_json()
+
+
+def test_queued_edits_coalesce_into_one_order(client, conn):
+    (first, _), (second, _) = stocked_items(conn, 2)
+    status, result = edit(client, 3, order_id=None, client_id='tablet-a', client_seq=1,
+                          changes=[{'id': first, 'quantity': 1}])
+    assert status == 200 and result['queued']
+    order_id = result['order_id']
+    for seq in range(2, 6):
+        edit(client, 3, order_id=order_id, client_id='tablet-a', client_seq=seq,
+             changes=[{'id': first, 'quantity': 1}])
+    # A second tablet joins the same order rather than opening another
+    _, result = edit(client, 3, order_id=None, client_id='tablet-b', client_seq=1,
+                     changes=[{'id': second, 'quantity': 2}])
+    assert result['order_id'] == order_id
+    assert pending_lines(conn, 3) == []
+
+    assert ktv.room_order_writes.flush(3)
+    assert pending_lines(conn, 3) == [(first, 5), (second, 2)]
+
+
+def test_resent_batch_counts_once(client, conn):
+    (item_id, _), = stocked_items(conn, 1)
+    _, result = edit(client, 3, order_id=None, client_id='tablet-a', client_seq=1,
+                     changes=[{'id': item_id, 'quantity': 1}])
+    order_id = result['order_id']
+    edit(client, 3, order_id=order_id, client_id='tablet-a', client_seq=2,
+         changes=[{'id': item_id, 'quantity': 1}])
+    edit(client, 3, order_id=order_id, client_id='tablet-a', client_seq=2,
+         changes=[{'id': item_id, 'quantity': 1}])
+    assert ktv.room_order_writes.flush(3)
+    # Written edits are remembered too, so a batch resent after the write is still dropped
+    edit(client, 3, order_id=order_id, client_id='tablet-a', client_seq=2,
+         changes=[{'id': item_id, 'quantity': 1}])
+    assert ktv.room_order_writes.flush(3)
+    assert pending_lines(conn, 3) == [(item_id, 2)]
+
+
+def test_flush_saves_customer_count_and_notes(client, conn):
+    (item_id, _), = stocked_items(conn, 1)
+    _, result = edit(client, 3, order_id=None, client_id='tablet-a', client_seq=1,
+                     changes=[{'id': item_id, 'quantity': 1}], customer_count=4, notes='birthday',
+                     flush=True)
+    assert result['success'] and not result['queued']
+    order = client.get('/api/get_room_order/3').get_json()['order']
+    assert order['customer_count'] == 4
+    assert order['notes'] == 'birthday'
+
+
+def test_edit_against_checked_out_order_is_stale(client, conn):
+    (item_id, price), = stocked_items(conn, 1)
+    _, result = edit(client, 3, order_id=None, client_id='tablet-a', client_seq=1,
+                     changes=[{'id': item_id, 'quantity': 1}], flush=True)
+    order_id = result['order_id']
+    assert checkout(client, 3, [(item_id, price, 1)]).status_code == 200
+
+    _, result = edit(client, 3, order_id=order_id, client_id='tablet-b', client_seq=1,
+                     changes=[{'id': item_id, 'quantity': 1}])
+    assert result['stale'] and not result['success']
+    assert result['order'] is None
+    assert pending_lines(conn, 3) == []
+
+
+def test_queued_edit_is_checked_against_stock(client, conn):
+    (item_id, _), = stocked_items(conn, 1)
+    status, result = edit(client, 3, order_id=None, client_id='tablet-a', client_seq=1,
+                          changes=[{'id': item_id, 'quantity': stock_of(conn, item_id) + 1}])
+    assert status == 400
+    assert 'Insufficient stock' in result['error']
+
+
+# ==================== SALES ROLLUPS ====================
+
+def test_rollups_follow_checkouts(client, conn):
+    (first, first_price), (second, second_price) = stocked_items(conn, 2)
+    lines = [(first, first_price, 2), (second, second_price, 1)]
+    assert checkout(client, 1, lines).status_code == 200
+    assert checkout(client, 2, [(first, first_price, 1)]).status_code == 200
+
+    summary = conn.execute("SELECT sales_count, total_amount FROM daily_sales_summary").fetchall()
+    assert [tuple(row) for row in summary] == [
+        tuple(conn.execute("SELECT COUNT(*), SUM(total_amount) FROM sales").fetchone())
+    ]
+    assert summary[0]['sales_count'] == 2
+    items = conn.execute("SELECT menu_item_id, quantity FROM daily_item_sales").fetchall()
+    assert {row['menu_item_id']: row['quantity'] for row in items} == {first: 3, second: 1}
+
+
+def test_rollups_match_a_rebuild_from_raw_sales(client, conn):
+    (first, first_price), (second, second_price) = stocked_items(conn, 2)
+    checkout(client, 1, [(first, first_price, 2), (second, second_price, 3)])
+    checkout(client, 2, [(second, second_price, 1)])
+    recorded = rollups(conn)
+    assert recorded[0]
+
+    conn.execute("BEGIN IMMEDIATE")
+    ktv.rebuild_sales_rollups(conn.cursor())
+    conn.commit()
+    assert rollups(conn) == recorded
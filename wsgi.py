@@ -1,4 +1,9 @@
-from app import app
+""" WSGI entry point for production: gunicorn -c gunicorn.conf.py wsgi:app """
+
+from app import app, prepare_app
+
+# With preload_app this runs once in the gunicorn master, before workers fork
+startup_timings = prepare_app()
 
 if __name__ == "__main__":
-    app.run()
+    app.run(host='0.0.0.0', port=5000)